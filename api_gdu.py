@@ -0,0 +1,213 @@
+import json
+
+import numpy as np
+
+from gdu_engine import ALVO_ATINGIDO, ALVO_NAO_ATINGIDO, calcular_gdu_colunas, converter_datas
+
+# Registros por bloco vetorizado na entrada NDJSON (limita a memória por requisição)
+TAMANHO_BLOCO_NDJSON = 10000
+
+class EntradaInvalida(ValueError):
+    """Corpo da requisição fora do formato esperado pela API"""
+
+def _para_lista(valores, inteiro=False):
+    """Converte um array de resultado para lista JSON (NaN vira null)"""
+    if inteiro:
+        return [None if v != v else int(v) for v in valores.tolist()]
+    return [None if v != v else v for v in valores.tolist()]
+
+def _escalar(valor):
+    """Datas e estações chegam como texto, número ou null: listas e objetos JSON não são valores"""
+    return valor is None or isinstance(valor, (str, int, float))
+
+# Campos de cada registro da API; todos devem ser escalares (_escalar)
+CAMPOS_PARES = ('plantio', 'sfwd', 'pfwd', 'estacao')
+
+def calcular_pares(clima_index, plantio, sfwd, pfwd=None, estacao=None):
+    """
+    Calcula dias e GDU acumulado para listas de datas em uma única chamada vetorizada
+    (mesmo motor do processamento de planilhas e de calcular_gdu_rapido).
+    estacao é a lista opcional com a estação climática de cada par (sem ela, a estação padrão).
+    Retorna um dicionário com as colunas de resultado e os contadores.
+    """
+    datas_pfwd = None if pfwd is None else converter_datas(pfwd)
+    estacoes = None if estacao is None else clima_index.codigos_estacoes(estacao)
+    colunas, mascaras = calcular_gdu_colunas(
+        clima_index, converter_datas(plantio), converter_datas(sfwd), datas_pfwd, estacoes
+    )
+    resultado = {nome: _para_lista(valores, inteiro=nome.startswith('dias')) for nome, valores in colunas.items()}
+    resultado['linhas_validas'] = int(mascaras['sfwd'].sum())
+    resultado['erros'] = len(mascaras['sfwd']) - resultado['linhas_validas']
+    return resultado
+
+def ler_json_colunar(dados, max_pares):
+    """
+    Valida o corpo JSON {"plantio": [...], "sfwd": [...], "pfwd": [...] e "estacao": [...] (opcionais)}.
+    Retorna (plantio, sfwd, pfwd, estacao) ou levanta EntradaInvalida.
+    """
+    if not isinstance(dados, dict):
+        raise EntradaInvalida('Envie um objeto JSON com as listas "plantio" e "sfwd".')
+
+    listas = {}
+    for chave in CAMPOS_PARES:
+        valores = dados.get(chave)
+        if valores is None and chave in ('pfwd', 'estacao'):
+            continue
+        if not isinstance(valores, list):
+            tipo = 'estações' if chave == 'estacao' else 'datas'
+            raise EntradaInvalida(f'O campo "{chave}" deve ser uma lista de {tipo}.')
+        listas[chave] = valores
+
+    for chave, valores in listas.items():
+        if not all(_escalar(valor) for valor in valores):
+            tipo = 'nomes ou códigos de estação' if chave == 'estacao' else 'datas'
+            raise EntradaInvalida(f'A lista "{chave}" deve ter {tipo} (texto ou número).')
+
+    tamanho = len(listas['plantio'])
+    if any(len(valores) != tamanho for valores in listas.values()):
+        raise EntradaInvalida('As listas devem ter o mesmo tamanho.')
+    if tamanho > max_pares:
+        raise EntradaInvalida(f'Máximo de {max_pares} pares por requisição JSON; use NDJSON para lotes maiores.')
+
+    return listas['plantio'], listas['sfwd'], listas.get('pfwd'), listas.get('estacao')
+
+def calcular_datas_alvo(clima_index, plantio, alvo, estacao=None):
+    """
+    Consulta inversa em lote: data em que o GDU acumulado desde cada plantio atinge alvo (um
+    número ou uma lista). situacao é 'atingido', 'nao_atingido' (o alvo cai depois do último dia
+    da base climática) ou 'invalido'.
+    """
+    estacoes = None if estacao is None else clima_index.codigos_estacoes(estacao)
+    inicio = converter_datas(plantio)
+    datas, situacao = clima_index.data_para_gdu(inicio, alvo, estacoes)
+    atingido = situacao == ALVO_ATINGIDO
+    dias = np.zeros(len(datas), dtype=np.int64)
+    dias[atingido] = (datas[atingido] - inicio[atingido].astype('datetime64[D]')) // np.timedelta64(1, 'D')
+    nomes = {ALVO_ATINGIDO: 'atingido', ALVO_NAO_ATINGIDO: 'nao_atingido'}
+    return {
+        'data_alvo': [str(data) if ok else None for data, ok in zip(datas.tolist(), atingido)],
+        'dias': [int(valor) if ok else None for valor, ok in zip(dias.tolist(), atingido)],
+        'situacao': [nomes.get(valor, 'invalido') for valor in situacao.tolist()],
+        'atingidos': int(atingido.sum()),
+        'nao_atingidos': int((situacao == ALVO_NAO_ATINGIDO).sum()),
+        'erros': int((~atingido & (situacao != ALVO_NAO_ATINGIDO)).sum()),
+    }
+
+def ler_json_alvo(dados, max_pares):
+    """
+    Valida o corpo JSON {"plantio": [...], "alvo": número ou [...], "estacao": [...] (opcional)}.
+    Retorna (plantio, alvo, estacao) ou levanta EntradaInvalida.
+    """
+    if not isinstance(dados, dict) or not isinstance(dados.get('plantio'), list):
+        raise EntradaInvalida('Envie um objeto JSON com a lista "plantio" e o "alvo" de GDU.')
+    plantio = dados['plantio']
+    if not all(_escalar(valor) for valor in plantio):
+        raise EntradaInvalida('A lista "plantio" deve ter datas (texto ou número).')
+    alvo = dados.get('alvo')
+    if isinstance(alvo, list):
+        # true/false também são int no Python, mas não são alvos de GDU
+        numeros = all(valor is None or isinstance(valor, (int, float)) and not isinstance(valor, bool)
+                      for valor in alvo)
+        if len(alvo) != len(plantio) or not numeros:
+            raise EntradaInvalida('A lista "alvo" deve ter um número por data de plantio.')
+        alvo = [float('nan') if valor is None else valor for valor in alvo]
+    elif not isinstance(alvo, (int, float)) or isinstance(alvo, bool):
+        raise EntradaInvalida('O campo "alvo" deve ser um número ou uma lista de números.')
+    estacao = dados.get('estacao')
+    if estacao is not None and (not isinstance(estacao, list) or len(estacao) != len(plantio)):
+        raise EntradaInvalida('A lista "estacao" deve ter uma estação por data de plantio.')
+    if estacao is not None and not all(_escalar(valor) for valor in estacao):
+        raise EntradaInvalida('A lista "estacao" deve ter nomes ou códigos de estação (texto ou número).')
+    if len(plantio) > max_pares:
+        raise EntradaInvalida(f'Máximo de {max_pares} datas por requisição.')
+    return plantio, alvo, estacao
+
+def _valor_json(valor):
+    return 'null' if valor is None else repr(valor)
+
+def _linhas_ndjson(resultado, registros_validos=None):
+    """Serializa um resultado colunar como uma linha JSON por par de datas"""
+    nomes = [nome for nome in resultado if nome not in ('linhas_validas', 'erros')]
+    # Os valores são só números ou null: montar o texto direto evita um json.dumps por linha
+    modelo = '{' + ', '.join(f'"{nome}": %s' for nome in nomes) + '}'
+    linha_invalida = json.dumps({'erro': 'Linha JSON inválida.'}, ensure_ascii=False)
+    linhas = []
+    for i, valores in enumerate(zip(*(resultado[nome] for nome in nomes))):
+        if registros_validos is not None and not registros_validos[i]:
+            linhas.append(linha_invalida)
+        else:
+            linhas.append(modelo % tuple(_valor_json(valor) for valor in valores))
+    return '\n'.join(linhas) + '\n' if linhas else ''
+
+def iter_resultado_ndjson(resultado, tamanho_bloco=TAMANHO_BLOCO_NDJSON):
+    """Produz um resultado já calculado como NDJSON, em partes de tamanho_bloco linhas"""
+    total = len(resultado['dias'])
+    for inicio in range(0, total, tamanho_bloco):
+        parte = {
+            nome: valores[inicio:inicio + tamanho_bloco]
+            for nome, valores in resultado.items() if isinstance(valores, list)
+        }
+        yield _linhas_ndjson(parte)
+
+def _calcular_bloco_ndjson(clima_index, registros):
+    # Registros que não são objetos ou com listas/objetos nos campos recebem {"erro": ...}
+    validos = [isinstance(registro, dict) and all(_escalar(registro.get(campo)) for campo in CAMPOS_PARES)
+               for registro in registros]
+    registros = [registro if valido else {} for registro, valido in zip(registros, validos)]
+    incluir_pfwd = any('pfwd' in registro for registro in registros)
+    incluir_estacao = any('estacao' in registro for registro in registros)
+    resultado = calcular_pares(
+        clima_index,
+        [registro.get('plantio') for registro in registros],
+        [registro.get('sfwd') for registro in registros],
+        [registro.get('pfwd') for registro in registros] if incluir_pfwd else None,
+        [registro.get('estacao') for registro in registros] if incluir_estacao else None,
+    )
+    return _linhas_ndjson(resultado, validos)
+
+_decodificador = json.JSONDecoder()
+
+def _decodificar_bloco(linhas):
+    """
+    Decodifica um bloco de linhas NDJSON, uma linha por vez: linhas que não são um único
+    valor JSON viram None. Juntar o bloco em uma lista JSON seria mais rápido, mas uma linha
+    com dois valores e um valor partido em duas linhas manteriam a contagem e trocariam os
+    registros de linha sem nenhum erro.
+    """
+    registros = []
+    for linha in linhas:
+        try:
+            registros.append(_decodificador.decode(linha))
+        except ValueError:
+            registros.append(None)
+    return registros
+
+def iter_linhas_stream(stream, tamanho_leitura=1024 * 1024):
+    """Lê um stream binário em partes grandes e produz suas linhas (readline por linha é lento)"""
+    resto = b''
+    for parte in iter(lambda: stream.read(tamanho_leitura), b''):
+        linhas = (resto + parte).split(b'\n')
+        resto = linhas.pop()
+        yield from linhas
+    if resto:
+        yield resto
+
+def iter_ndjson(clima_index, linhas, tamanho_bloco=TAMANHO_BLOCO_NDJSON):
+    """
+    Consome linhas NDJSON {"plantio": ..., "sfwd": ..., "pfwd": ..., "estacao": ...} e produz a resposta
+    NDJSON (uma linha por registro, na mesma ordem), calculando um bloco por vez.
+    Linhas que não são um objeto JSON recebem {"erro": ...} na posição correspondente.
+    """
+    bloco = []
+    for linha in linhas:
+        if isinstance(linha, bytes):
+            linha = linha.decode('utf-8', errors='replace')
+        linha = linha.strip()
+        if not linha:
+            continue
+        bloco.append(linha)
+        if len(bloco) >= tamanho_bloco:
+            yield _calcular_bloco_ndjson(clima_index, _decodificar_bloco(bloco))
+            bloco = []
+    if bloco:
+        yield _calcular_bloco_ndjson(clima_index, _decodificar_bloco(bloco))
@@ -0,0 +1,257 @@
+"""
+Armazém dos arquivos de resultado dos jobs, com prazo de validade (TTL) e limite de disco.
+
+Cada job grava seus resultados em uma pasta própria (<pasta>/<job_id>/), então arquivos com o
+mesmo nome enviados por usuários diferentes não se sobrescrevem, e um resultado pode ser baixado
+quantas vezes for preciso enquanto vale. Os vencimentos ficam em um heap servido por uma única
+thread, que dorme até o próximo vencimento (sem varrer diretórios nem uma thread por download).
+
+O heap fica na memória de cada processo: resultados de outro worker do gunicorn são servidos
+pelo disco e removidos pelo worker que os gerou. O limite de disco (max_bytes), por outro lado,
+vale para a pasta inteira, compartilhada pelos workers. O tamanho de cada job é medido uma vez,
+ao registrá-lo, e gravado ao lado da pasta (<pasta>/<job_id>.tamanho); cada processo mantém um
+índice desses tamanhos com o total corrente e, a cada registro, só lista a pasta para incluir
+os jobs de outros workers e tirar os removidos (sem percorrer os arquivos). Acima do limite, os
+registrados há mais tempo (que venceriam primeiro) são removidos antes do prazo. Na
+inicialização, uma varredura única remove o que já venceu e agenda o que ainda vale
+(resultados de uma execução anterior).
+"""
+import heapq
+import os
+import re
+import shutil
+import threading
+import time
+
+_CHAVE_RE = re.compile(r'^[0-9a-f]{32}$')
+# Arquivo com "registrado_em bytes" de cada job, ao lado da sua pasta
+SUFIXO_TAMANHO = '.tamanho'
+
+def _tamanho_pasta(caminho):
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        for nome in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, nome))
+            except OSError:
+                pass
+    return total
+
+class ArmazemResultados:
+    """Pastas de resultado por job (chave), removidas ttl segundos depois de registradas"""
+
+    def __init__(self, pasta, ttl=3600, max_bytes=500 * 1024 * 1024):
+        self.pasta = pasta
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.removidos = 0
+        # chave -> vence_em dos jobs deste processo; o heap pode ter entradas antigas de uma chave re-registrada
+        self._entradas = {}
+        self._heap = []
+        # chave -> (registrado_em, bytes) dos jobs de todos os processos, com o total corrente
+        self._tamanhos = {}
+        self.bytes = 0
+        self._condicao = threading.Condition()
+        # Threads não sobrevivem ao fork do gunicorn --preload: cada worker inicia a sua (iniciar,
+        # chamado em post_worker_init), e o mestre, que só importa a aplicação, não tem nenhuma
+        self._thread = None
+        os.register_at_fork(after_in_child=self._apos_fork)
+        os.makedirs(pasta, exist_ok=True)
+
+    def _apos_fork(self):
+        self._condicao = threading.Condition()
+        self._thread = None
+
+    def pasta_job(self, chave):
+        """Pasta onde o job grava seus resultados (criada se preciso)"""
+        caminho = os.path.join(self.pasta, chave)
+        os.makedirs(caminho, exist_ok=True)
+        return caminho
+
+    def caminho(self, chave, nome):
+        """Caminho de um resultado ainda disponível, ou None (chave/nome inválidos, vencido ou removido)"""
+        if not _CHAVE_RE.match(chave) or os.path.basename(nome) != nome or nome in ('', '.', '..'):
+            return None
+        caminho = os.path.join(self.pasta, chave, nome)
+        return caminho if os.path.isfile(caminho) else None
+
+    def _arquivo_tamanho(self, chave):
+        return os.path.join(self.pasta, chave + SUFIXO_TAMANHO)
+
+    def _gravar_tamanho(self, chave, registrado_em, tamanho):
+        """Grava o tamanho do job para os outros processos (troca atômica do arquivo)"""
+        temporario = f"{self._arquivo_tamanho(chave)}.{os.getpid()}"
+        try:
+            with open(temporario, 'w') as f:
+                f.write(f"{registrado_em} {tamanho}")
+            os.replace(temporario, self._arquivo_tamanho(chave))
+        except OSError as e:
+            print(f"Erro ao gravar o tamanho dos resultados {chave}: {e}")
+
+    def _ler_tamanho(self, chave):
+        try:
+            with open(self._arquivo_tamanho(chave), 'r') as f:
+                registrado_em, tamanho = f.read().split()
+            return float(registrado_em), int(tamanho)
+        except (OSError, ValueError):
+            return None
+
+    def _indexar(self, chave, registrado_em, tamanho):
+        """Inclui ou atualiza o tamanho de um job no índice (com a condição adquirida)"""
+        anterior = self._tamanhos.get(chave)
+        if anterior is not None:
+            self.bytes -= anterior[1]
+        self._tamanhos[chave] = (registrado_em, tamanho)
+        self.bytes += tamanho
+
+    def _desindexar(self, chave):
+        """Tira um job do índice e do total (com a condição adquirida)"""
+        anterior = self._tamanhos.pop(chave, None)
+        if anterior is not None:
+            self.bytes -= anterior[1]
+
+    def _sincronizar(self):
+        """Acrescenta ao índice os jobs registrados por outros processos e tira os já removidos"""
+        no_disco = {
+            nome[:-len(SUFIXO_TAMANHO)] for nome in os.listdir(self.pasta)
+            if nome.endswith(SUFIXO_TAMANHO) and _CHAVE_RE.match(nome[:-len(SUFIXO_TAMANHO)])
+        }
+        with self._condicao:
+            novos = no_disco - self._tamanhos.keys()
+            for chave in self._tamanhos.keys() - no_disco:
+                self._desindexar(chave)
+        for chave in novos:
+            registro = self._ler_tamanho(chave)
+            if registro is not None:
+                with self._condicao:
+                    self._indexar(chave, *registro)
+
+    def registrar(self, chave, vence_em=None):
+        """
+        Agenda a remoção da pasta do job em ttl segundos, guarda seu tamanho no índice e aplica o
+        limite de disco aos jobs de todos os processos, removendo antes do prazo os registrados
+        há mais tempo (nunca o recém-registrado).
+        """
+        agora = time.time()
+        vence_em = agora + self.ttl if vence_em is None else vence_em
+        registrado_em = vence_em - self.ttl
+        # Só a pasta deste job é percorrida; ela não muda mais depois de registrada
+        tamanho = _tamanho_pasta(os.path.join(self.pasta, chave))
+        self._gravar_tamanho(chave, registrado_em, tamanho)
+        with self._condicao:
+            self._indexar(chave, registrado_em, tamanho)
+            self._entradas[chave] = vence_em
+            heapq.heappush(self._heap, (vence_em, chave))
+            self._condicao.notify()
+        self._sincronizar()
+        self._aplicar_limite(chave)
+
+    def _aplicar_limite(self, chave):
+        """Remove os jobs registrados há mais tempo enquanto o total do índice passar de max_bytes"""
+        while True:
+            with self._condicao:
+                if self.bytes <= self.max_bytes:
+                    return
+                candidatos = [(registro[0], outra) for outra, registro in self._tamanhos.items() if outra != chave]
+                if not candidatos:
+                    return
+                # Todos os jobs vencem ttl depois de registrados: o mais antigo é o que venceria primeiro
+                chave_excedente = min(candidatos)[1]
+                self._entradas.pop(chave_excedente, None)
+            print(f"Resultado {chave_excedente} removido antes do prazo (limite de {self.max_bytes} bytes)")
+            self._remover(chave_excedente)
+
+    def _descartar(self, entrada):
+        """Tira do controle a entrada do heap se ela ainda for a vigente da chave (com a condição adquirida)"""
+        vence_em, chave = entrada
+        if self._entradas.get(chave) != vence_em:
+            return False
+        del self._entradas[chave]
+        return True
+
+    def _remover(self, chave):
+        with self._condicao:
+            self._desindexar(chave)
+        try:
+            shutil.rmtree(os.path.join(self.pasta, chave))
+            self.removidos += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Erro ao remover resultados {chave}: {e}")
+        try:
+            os.remove(self._arquivo_tamanho(chave))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Erro ao remover o tamanho dos resultados {chave}: {e}")
+
+    def iniciar(self):
+        """Inicia a thread de vencimentos deste processo, se ainda não estiver rodando"""
+        with self._condicao:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._vencer, name='gdu-resultados', daemon=True)
+                self._thread.start()
+
+    def _vencer(self):
+        """Dorme até o próximo vencimento do heap e remove a pasta vencida"""
+        while True:
+            with self._condicao:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._condicao.wait(None if not self._heap else self._heap[0][0] - time.time())
+                entrada = heapq.heappop(self._heap)
+                if not self._descartar(entrada):
+                    continue
+            self._remover(entrada[1])
+
+    def varrer_inicial(self, pastas_uploads=()):
+        """
+        Uma varredura na inicialização: pastas de resultado vencidas (pelo registro gravado, ou
+        pelo mtime se não houver) são removidas e as demais agendadas e indexadas; uploads esquecidos em pastas_uploads há mais de ttl também saem.
+        Não inicia a thread de vencimentos: roda na importação, que no gunicorn é feita pelo mestre.
+        """
+        limite = time.time() - self.ttl
+        nomes = set(os.listdir(self.pasta))
+        for nome in nomes:
+            caminho = os.path.join(self.pasta, nome)
+            if nome.endswith(SUFIXO_TAMANHO) and nome[:-len(SUFIXO_TAMANHO)] not in nomes:
+                # Tamanho de um job cuja pasta já não existe
+                self._remover(nome[:-len(SUFIXO_TAMANHO)])
+                continue
+            if not _CHAVE_RE.match(nome) or not os.path.isdir(caminho):
+                continue
+            registro = self._ler_tamanho(nome)
+            if registro is None:
+                # Pasta de uma versão sem o arquivo de tamanho: medida uma única vez, aqui
+                try:
+                    registro = (os.path.getmtime(caminho), _tamanho_pasta(caminho))
+                except OSError:
+                    continue
+                self._gravar_tamanho(nome, *registro)
+            if registro[0] < limite:
+                self._remover(nome)
+            else:
+                with self._condicao:
+                    self._indexar(nome, *registro)
+                    self._entradas[nome] = registro[0] + self.ttl
+                    heapq.heappush(self._heap, (registro[0] + self.ttl, nome))
+        self._aplicar_limite(None)
+
+        for pasta in pastas_uploads:
+            for nome in os.listdir(pasta):
+                caminho = os.path.join(pasta, nome)
+                try:
+                    if nome != '.gitkeep' and os.path.isfile(caminho) and os.path.getmtime(caminho) < limite:
+                        os.remove(caminho)
+                        print(f"Upload antigo removido: {caminho}")
+                except OSError as e:
+                    print(f"Erro ao remover upload antigo {caminho}: {e}")
+
+    def estatisticas(self):
+        """
+        Resultados agendados neste processo e bytes de todos os processos pelo índice (atualizado
+        a cada registro, sem ler o disco)
+        """
+        with self._condicao:
+            return {'resultados': len(self._entradas), 'bytes': self.bytes, 'max_bytes': self.max_bytes,
+                    'removidos': self.removidos, 'ttl_s': self.ttl}
@@ -0,0 +1,325 @@
+"""
+Benchmarks reprodutíveis dos caminhos de processamento com planilhas sintéticas.
+
+Cada caso roda em um subprocesso próprio, para que o pico de memória (RSS) de um caso não
+contamine o seguinte. São medidos separadamente leitura, conversão de datas, cálculo do GDU
+e escrita, no caminho do servidor (processamento.py) e no de chunk_processor.py, além do
+tempo ponta a ponta de cada um. O resultado é um JSON estável, para comparar entre commits.
+
+Uso:
+    python benchmark.py                                   # 1k, 100k e 1M linhas
+    python benchmark.py --escalas 1000 100000 --largura 50 --saida bench_atual.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Planilhas sintéticas geradas são reaproveitadas entre execuções
+PASTA_DADOS = 'benchmark_dados'
+ESCALAS_PADRAO = (1000, 100000, 1000000)
+CAMINHOS = ('processamento', 'chunk_processor')
+COLUNAS = ('Data de Plantio', '05. SFWD', '06. PFWD')
+CHAMADAS_ESCALARES = 1000
+
+def _status_memoria():
+    """RSS atual e pico (VmHWM) do processo em MB, lidos de /proc/self/status"""
+    valores = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for linha in f:
+                if linha.startswith(('VmRSS:', 'VmHWM:')):
+                    chave, valor = linha.split(':', 1)
+                    valores[chave] = int(valor.split()[0]) / 1024
+    except OSError:
+        pass
+    return valores.get('VmRSS'), valores.get('VmHWM')
+
+def _reiniciar_pico():
+    """Zera o pico de RSS do processo (Linux 4.0+); retorna False se não for possível"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+class Medidor:
+    """Acumula tempo e pico de RSS por fase; uma fase pode ser medida várias vezes (blocos)"""
+
+    def __init__(self):
+        self.fases = {}
+        self.pico_reinicializavel = True
+
+    @contextlib.contextmanager
+    def fase(self, nome):
+        self.pico_reinicializavel = _reiniciar_pico() and self.pico_reinicializavel
+        rss_inicio, _ = _status_memoria()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            rss_fim, pico = _status_memoria()
+            fase = self.fases.setdefault(nome, {'s': 0.0, 'pico_rss_mb': 0.0, 'delta_rss_mb': 0.0})
+            fase['s'] += duracao
+            if pico is not None:
+                fase['pico_rss_mb'] = max(fase['pico_rss_mb'], pico)
+            if rss_inicio is not None and rss_fim is not None:
+                fase['delta_rss_mb'] += rss_fim - rss_inicio
+
+    def resultado(self):
+        return {
+            nome: {chave: round(valor, 4) for chave, valor in fase.items()}
+            for nome, fase in self.fases.items()
+        }
+
+def gerar_planilha(linhas, largura=10, inicio='2025-01-01', span_dias=120, fracao_invalidas=0.02,
+                   semente=42, formato='xlsx', pasta=PASTA_DADOS):
+    """
+    Gera (ou reaproveita) uma planilha de ensaio sintética: datas de plantio espalhadas por
+    span_dias a partir de inicio, SFWD 40 a 90 dias depois, PFWD perto do SFWD, uma fração
+    de SFWD inválidos ('n/d') e largura colunas de características (números e textos).
+    """
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"sintetico_{linhas}l_{largura}c_{inicio}_{span_dias}d_{fracao_invalidas}inv_{semente}.{formato}"
+    caminho = os.path.join(pasta, nome)
+    if os.path.exists(caminho):
+        return caminho
+
+    rng = np.random.default_rng(semente)
+    plantio = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, span_dias, linhas), unit='D')
+    sfwd = plantio + pd.to_timedelta(rng.integers(40, 90, linhas), unit='D')
+    pfwd = sfwd + pd.to_timedelta(rng.integers(-3, 6, linhas), unit='D')
+
+    df = pd.DataFrame({COLUNAS[0]: plantio, COLUNAS[1]: sfwd, COLUNAS[2]: pfwd})
+    invalidas = rng.random(linhas) < fracao_invalidas
+    df[COLUNAS[1]] = df[COLUNAS[1]].astype(object)
+    df.loc[invalidas, COLUNAS[1]] = 'n/d'
+
+    for i in range(largura):
+        if i % 3 == 0:
+            df[f'Caracteristica {i}'] = np.round(rng.normal(200, 20, linhas), 2)
+        elif i % 3 == 1:
+            df[f'Caracteristica {i}'] = rng.integers(0, 1000, linhas)
+        else:
+            df[f'Caracteristica {i}'] = rng.choice(['A', 'B', 'C', 'D'], linhas)
+
+    print(f"Gerando {caminho}...", file=sys.stderr)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    if formato == 'xlsx':
+        from escrita import escrever_resultado_xlsx
+        escrever_resultado_xlsx(df, temporario, sheet_name='Dados')
+    elif formato == 'csv':
+        df.to_csv(temporario, index=False)
+    else:
+        df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+    return caminho
+
+def _fases_processamento(medidor, clima_index, caminho, saida, formato_saida, tamanho_bloco):
+    """Etapas de processamento.processar_arquivo, medidas uma a uma"""
+    from escrita import escrever_tabela
+    from gdu_engine import calcular_gdu_colunas, converter_datas
+    from leitura import detectar_formato, ler_tabela
+
+    with medidor.fase('leitura'):
+        tabela = ler_tabela(caminho, detectar_formato(caminho))
+    with medidor.fase('datas'):
+        datas = [converter_datas(tabela.valores(coluna)) for coluna in COLUNAS]
+    with medidor.fase('gdu'):
+        colunas_gdu, mascaras = calcular_gdu_colunas(clima_index, *datas)
+    with medidor.fase('escrita'):
+        escrever_tabela(tabela, colunas_gdu, saida, formato_saida)
+    return int(mascaras['sfwd'].sum()), len(tabela)
+
+def _fases_chunk_processor(medidor, clima_index, caminho, saida, formato_saida, tamanho_bloco):
+    """Etapas de chunk_processor.process_excel_to_xlsx (bloco a bloco), medidas uma a uma"""
+    from chunk_processor import iter_excel_blocks
+    from escrita import EscritorXlsx
+    from gdu_engine import calcular_gdu_colunas, converter_datas
+
+    blocos = iter_excel_blocks(caminho, block_size=tamanho_bloco)
+    escritor = None
+    validas = 0
+    total = 0
+    while True:
+        with medidor.fase('leitura'):
+            bloco = next(blocos, None)
+        if bloco is None:
+            break
+        with medidor.fase('datas'):
+            datas = [converter_datas(bloco[coluna]) for coluna in COLUNAS]
+        with medidor.fase('gdu'):
+            colunas_gdu, mascaras = calcular_gdu_colunas(clima_index, *datas)
+            resultado = bloco.copy(deep=False)
+            for nome, valores in colunas_gdu.items():
+                resultado[nome] = valores
+        with medidor.fase('escrita'):
+            if escritor is None:
+                escritor = EscritorXlsx(saida)
+            escritor.escrever_bloco(resultado)
+        validas += int(mascaras['sfwd'].sum())
+        total += len(bloco)
+    with medidor.fase('escrita'):
+        if escritor is not None:
+            escritor.fechar()
+    return validas, total
+
+def _total_processamento(caminho, saida, formato_saida, tamanho_bloco):
+    from processamento import processar_arquivo
+    contadores = processar_arquivo(caminho, os.path.basename(caminho), saida, *COLUNAS, formato_saida)
+    return contadores['linhas_validas'], contadores['linhas_validas'] + contadores['erros']
+
+def _total_chunk_processor(caminho, saida, formato_saida, tamanho_bloco):
+    from chunk_processor import process_excel_to_xlsx
+    erros, validas, _, total = process_excel_to_xlsx(caminho, saida, chunk_size=tamanho_bloco)
+    return validas, total
+
+def executar_caso(caminho_codigo, modo, arquivo, formato_saida, tamanho_bloco):
+    """Roda um caso no processo atual e retorna suas medidas (chamado no subprocesso)"""
+    from clima_base import obter_clima_index
+
+    medidor = Medidor()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with medidor.fase('clima'):
+            clima_index = obter_clima_index()
+
+        if caminho_codigo == 'chunk_processor':
+            formato_saida = 'xlsx'
+        saida = os.path.join(PASTA_DADOS, f"saida_{caminho_codigo}_{os.getpid()}.{formato_saida}")
+        try:
+            if modo == 'fases':
+                funcao = _fases_processamento if caminho_codigo == 'processamento' else _fases_chunk_processor
+                validas, total = funcao(medidor, clima_index, arquivo, saida, formato_saida, tamanho_bloco)
+            else:
+                funcao = _total_processamento if caminho_codigo == 'processamento' else _total_chunk_processor
+                with medidor.fase('total'):
+                    validas, total = funcao(arquivo, saida, formato_saida, tamanho_bloco)
+            tamanho_saida = os.path.getsize(saida)
+        finally:
+            if os.path.exists(saida):
+                os.remove(saida)
+
+        if modo == 'fases' and caminho_codigo == 'processamento':
+            # Chamadas escalares (independentes do arquivo), como calcular_gdu_rapido faz para uma linha
+            inicio = pd.Timestamp('2025-01-10')
+            fim = pd.Timestamp('2025-03-20')
+            with medidor.fase('gdu_escalar'):
+                for _ in range(CHAMADAS_ESCALARES):
+                    clima_index.calcular([inicio], [fim])
+
+    return {
+        'caminho': caminho_codigo,
+        'modo': modo,
+        'formato_saida': formato_saida,
+        'linhas': total,
+        'linhas_validas': validas,
+        'bytes_saida': tamanho_saida,
+        'fases': medidor.resultado(),
+        'pico_rss_por_fase': medidor.pico_reinicializavel,
+    }
+
+def _rodar_subprocesso(argumentos):
+    """Executa um caso em um interpretador novo e lê o JSON impresso na última linha"""
+    processo = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + argumentos,
+        capture_output=True, text=True,
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"Caso {argumentos} falhou:\n{processo.stderr}")
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description='Benchmarks dos caminhos de cálculo de GDU.')
+    parser.add_argument('--escalas', type=int, nargs='+', default=list(ESCALAS_PADRAO),
+                        help='Números de linhas das planilhas sintéticas (padrão: 1000 100000 1000000)')
+    parser.add_argument('--largura', type=int, default=10, help='Colunas de características além das datas')
+    parser.add_argument('--inicio', default='2025-01-01', help='Primeira data de plantio')
+    parser.add_argument('--span-dias', type=int, default=120, help='Dias sobre os quais o plantio se espalha')
+    parser.add_argument('--fracao-invalidas', type=float, default=0.02, help='Fração de datas SFWD inválidas')
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--formato-entrada', choices=('xlsx', 'csv', 'parquet'), default='xlsx')
+    parser.add_argument('--formato-saida', choices=('xlsx', 'csv', 'parquet'), default='xlsx')
+    parser.add_argument('--caminhos', nargs='+', choices=CAMINHOS, default=list(CAMINHOS))
+    parser.add_argument('--tamanho-bloco', type=int, default=1000, help='Linhas por bloco no chunk_processor')
+    parser.add_argument('--saida', default='benchmark_resultados.json', help='Arquivo JSON com os resultados')
+    # Uso interno: executa um único caso e imprime seu JSON
+    parser.add_argument('--caso', nargs=2, metavar=('CAMINHO', 'MODO'), help=argparse.SUPPRESS)
+    parser.add_argument('--arquivo', help=argparse.SUPPRESS)
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+
+    if args.caso:
+        resultado = executar_caso(args.caso[0], args.caso[1], args.arquivo, args.formato_saida, args.tamanho_bloco)
+        print(json.dumps(resultado, sort_keys=True))
+        return 0
+
+    casos = []
+    for linhas in args.escalas:
+        arquivo = gerar_planilha(linhas, args.largura, args.inicio, args.span_dias, args.fracao_invalidas,
+                                 args.semente, args.formato_entrada)
+        for caminho_codigo in args.caminhos:
+            if caminho_codigo == 'chunk_processor' and args.formato_entrada != 'xlsx':
+                continue
+            for modo in ('fases', 'total'):
+                print(f"{linhas} linhas, {caminho_codigo}, {modo}...", file=sys.stderr)
+                caso = _rodar_subprocesso([
+                    '--caso', caminho_codigo, modo, '--arquivo', arquivo,
+                    '--formato-saida', args.formato_saida, '--tamanho-bloco', str(args.tamanho_bloco),
+                ])
+                caso['colunas_extras'] = args.largura
+                casos.append(caso)
+
+                tempos = ', '.join(f"{nome} {fase['s']:.3f}s/{fase['pico_rss_mb']:.0f}MB"
+                                   for nome, fase in caso['fases'].items())
+                print(f"  {tempos}", file=sys.stderr)
+
+    resultado = {
+        'meta': {
+            'commit': _commit_atual(),
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'parametros': {
+            'escalas': args.escalas,
+            'largura': args.largura,
+            'inicio': args.inicio,
+            'span_dias': args.span_dias,
+            'fracao_invalidas': args.fracao_invalidas,
+            'semente': args.semente,
+            'formato_entrada': args.formato_entrada,
+            'formato_saida': args.formato_saida,
+            'tamanho_bloco': args.tamanho_bloco,
+            'chamadas_escalares': CHAMADAS_ESCALARES,
+        },
+        'casos': casos,
+    }
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"Resultados gravados em {args.saida}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,5 +12,8 @@ pip install -r requirements.txt
 # Garantir que xlsxwriter seja instalado (como precaução extra)
 pip install xlsxwriter
 
+# Compilar a base climática (evita ler a planilha na inicialização dos workers)
+python clima_base.py
+
 # Imprimir as dependências instaladas para verificação
 pip list
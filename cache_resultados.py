@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+TAMANHO_BLOCO = 1024 * 1024
+
+def salvar_com_hash(file_storage, filepath):
+    """Salva um upload em disco calculando o SHA-256 dos bytes durante a gravação"""
+    sha = hashlib.sha256()
+    with open(filepath, 'wb') as destino:
+        for bloco in iter(lambda: file_storage.stream.read(TAMANHO_BLOCO), b''):
+            sha.update(bloco)
+            destino.write(bloco)
+    return sha.hexdigest()
+
+class CacheResultados:
+    """
+    Cache em disco de arquivos de resultado, endereçado pelo conteúdo do upload.
+
+    A chave combina o hash dos bytes enviados, o mapeamento de colunas, a versão da
+    base climática e o formato de saída. Cada entrada guarda o arquivo gerado
+    (<chave>.xlsx, .csv ou .parquet) e os contadores do cálculo (<chave>.json). O tamanho total é limitado a max_bytes, removendo
+    primeiro as entradas usadas há mais tempo (LRU pelo mtime, renovado a cada acerto).
+    """
+
+    def __init__(self, pasta, max_bytes=200 * 1024 * 1024):
+        self.pasta = pasta
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    @staticmethod
+    def chave(hash_upload, col_plantio, col_sfwd, col_pfwd, versao_clima, formato_saida='xlsx', estacao=None,
+              gdu_alvo=None, cenarios=None, resumo=None):
+        """
+        Chave da entrada: hash do upload + colunas configuradas + versão do clima + formato de saída
+        (+ a resolução das estações: coluna de estação ou coordenadas, vizinhos e versão do índice
+        espacial; + o GDU alvo da consulta inversa; + os cenários climáticos e a saída pedida;
+        + as colunas de agrupamento do resumo)
+        """
+        partes = [hash_upload, col_plantio, col_sfwd, col_pfwd, versao_clima, formato_saida]
+        # Sem as opções a chave continua a mesma de antes
+        if estacao or gdu_alvo is not None or cenarios is not None or resumo:
+            partes.append(estacao or '')
+        if gdu_alvo is not None:
+            partes.append(f'alvo={gdu_alvo}')
+        if cenarios is not None:
+            partes.append('cenarios=' + '|'.join(str(parte) for parte in cenarios))
+        if resumo:
+            partes.append('resumo=' + '|'.join(resumo))
+        return hashlib.sha256('\x00'.join(partes).encode('utf-8')).hexdigest()
+
+    def _caminhos(self, chave, extensao='.xlsx'):
+        return os.path.join(self.pasta, f"{chave}{extensao}"), os.path.join(self.pasta, f"{chave}.json")
+
+    def obter(self, chave, destino, extensao='.xlsx'):
+        """
+        Copia o resultado em cache para destino e retorna seus contadores,
+        ou None se a chave não estiver no cache.
+        """
+        caminho_resultado, caminho_meta = self._caminhos(chave, extensao)
+        try:
+            with open(caminho_meta, 'r', encoding='utf-8') as f:
+                contadores = json.load(f)
+            shutil.copyfile(caminho_resultado, destino)
+            # Renova a entrada para a política LRU
+            os.utime(caminho_resultado)
+            os.utime(caminho_meta)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return contadores
+
+    def guardar(self, chave, caminho_resultado, contadores, extensao='.xlsx'):
+        """Adiciona um resultado ao cache e remove as entradas mais antigas se passar do limite"""
+        destino_resultado, destino_meta = self._caminhos(chave, extensao)
+        sufixo = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(caminho_resultado, destino_resultado + sufixo)
+            os.replace(destino_resultado + sufixo, destino_resultado)
+            # Os contadores são gravados por último: a entrada só vale com o resultado completo
+            with open(destino_meta + sufixo, 'w', encoding='utf-8') as f:
+                json.dump(contadores, f)
+            os.replace(destino_meta + sufixo, destino_meta)
+        except OSError as e:
+            print(f"Erro ao gravar resultado no cache: {e}")
+            for temporario in (destino_resultado + sufixo, destino_meta + sufixo):
+                if os.path.exists(temporario):
+                    os.remove(temporario)
+            return
+        self._aplicar_limite()
+
+    def _aplicar_limite(self):
+        """Remove as entradas usadas há mais tempo até o cache caber em max_bytes"""
+        entradas = {}
+        total = 0
+        for nome in os.listdir(self.pasta):
+            if nome.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.pasta, nome))
+            except OSError:
+                continue
+            entrada = entradas.setdefault(nome.split('.', 1)[0], {'tamanho': 0, 'mtime': 0, 'arquivos': []})
+            entrada['tamanho'] += stat.st_size
+            entrada['mtime'] = max(entrada['mtime'], stat.st_mtime)
+            entrada['arquivos'].append(nome)
+            total += stat.st_size
+
+        for chave, entrada in sorted(entradas.items(), key=lambda item: item[1]['mtime']):
+            if total <= self.max_bytes:
+                break
+            for nome in entrada['arquivos']:
+                try:
+                    os.remove(os.path.join(self.pasta, nome))
+                except OSError:
+                    pass
+            total -= entrada['tamanho']
+            print(f"Entrada removida do cache de resultados: {chave}")
+
+    def estatisticas(self):
+        """Contadores de acertos e falhas deste processo"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'max_bytes': self.max_bytes}
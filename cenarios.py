@@ -0,0 +1,130 @@
+"""
+Cenários climáticos alternativos ("e se") para o GDU acumulado de cada linha.
+
+Um cenário é uma série de GDU diário nos mesmos dias da base climática:
+  - "+1", "-0.5", "+2C": as temperaturas mínima e máxima de todos os dias deslocadas em °C,
+    com o GDU recalculado pelo método escolhido;
+  - "2024" ou "ano:2024": cada dia recebe o GDU do mesmo dia e mês de outro ano da mesma
+    estação (anos históricos, ou anos análogos de safra úmida/seca). 29/02 usa 28/02 em
+    anos não bissextos; dias que o outro ano não tem ficam sem GDU.
+
+As S séries formam uma matriz (S, dias) resolvida de uma vez por ClimaIndex.calcular_cenarios,
+em blocos de cenários limitados por GDU_CENARIOS_MB. O resultado sai como colunas de resumo
+(mínimo, média, percentis e máximo entre os cenários) ou uma coluna por cenário.
+"""
+import os
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from gdu_engine import DESLOCAMENTO_ESTACAO
+from metodos_gdu import obter_metodo
+
+# Memória dos blocos de cenários (somas prefixadas e resultados de cada bloco)
+CENARIOS_MAX_BYTES = int(os.environ.get('GDU_CENARIOS_MB', 64)) * 1024 * 1024
+
+# Máximo de cenários por cálculo (cada um vira uma coluna na saída larga)
+MAX_CENARIOS = int(os.environ.get('GDU_MAX_CENARIOS', 100))
+
+SAIDAS = ('resumo', 'largo')
+PERCENTIS = (10, 50, 90)
+
+_RE_DESLOCAMENTO = re.compile(r'^([+-]\d+(?:\.\d+)?)(?:°?c)?$', re.IGNORECASE)
+_RE_ANO = re.compile(r'^(?:ano:)?(\d{4})$', re.IGNORECASE)
+
+class Cenario:
+    """Temperaturas deslocadas em deslocamento_c °C ou GDU de outro ano (ano)"""
+
+    def __init__(self, deslocamento_c=None, ano=None):
+        self.deslocamento_c = deslocamento_c
+        self.ano = ano
+
+    @property
+    def nome(self):
+        if self.ano is not None:
+            return f'ano_{self.ano}'
+        return f'{self.deslocamento_c:+g}C'
+
+    def gdu_diario(self, clima_index, metodo):
+        """GDU diário do cenário em cada dia de clima_index"""
+        if self.ano is not None:
+            return _gdu_outro_ano(clima_index, self.ano)
+        if clima_index.temp_min is None or clima_index.temp_max is None:
+            raise ValueError('A base climática não tem temperaturas para deslocar')
+        return metodo.gdu_diario(clima_index.temp_min + self.deslocamento_c,
+                                 clima_index.temp_max + self.deslocamento_c)
+
+def ler_cenarios(texto):
+    """
+    Interpreta uma lista como "+1, +2.5, 2024" (separada por vírgula, ponto e vírgula ou espaço;
+    decimais com ponto).
+    Levanta ValueError com o item inválido.
+    """
+    cenarios = []
+    for item in re.split(r'[,;\s]+', texto or ''):
+        item = item.strip()
+        if not item:
+            continue
+        deslocamento = _RE_DESLOCAMENTO.match(item)
+        ano = _RE_ANO.match(item)
+        if deslocamento:
+            cenarios.append(Cenario(deslocamento_c=float(deslocamento.group(1))))
+        elif ano:
+            cenarios.append(Cenario(ano=int(ano.group(1))))
+        else:
+            raise ValueError(f"Cenário inválido: '{item}'. Use deslocamentos como +1 ou -0.5 e anos como 2024")
+    if not cenarios:
+        raise ValueError('Nenhum cenário informado')
+    if len(cenarios) > MAX_CENARIOS:
+        raise ValueError(f'Máximo de {MAX_CENARIOS} cenários por cálculo')
+    return cenarios
+
+def _gdu_outro_ano(clima_index, ano):
+    """GDU diário de cada dia da base no mesmo dia e mês do ano pedido, na mesma estação"""
+    codigos = (clima_index.ordinais + DESLOCAMENTO_ESTACAO // 2) // DESLOCAMENTO_ESTACAO
+    datas = pd.DatetimeIndex((clima_index.ordinais - codigos * DESLOCAMENTO_ESTACAO).astype('datetime64[D]'))
+    # 29/02 vira 28/02 quando o ano pedido não é bissexto
+    dias_no_mes = pd.DatetimeIndex(pd.to_datetime({'year': ano, 'month': datas.month, 'day': 1})).days_in_month
+    alvo = pd.to_datetime({'year': ano, 'month': datas.month, 'day': np.minimum(datas.day, dias_no_mes)})
+    chaves = alvo.to_numpy().astype('datetime64[D]').astype(np.int64) + codigos * DESLOCAMENTO_ESTACAO
+
+    posicoes = np.minimum(np.searchsorted(clima_index.ordinais, chaves), len(clima_index) - 1)
+    encontrados = clima_index.ordinais[posicoes] == chaves
+    return np.where(encontrados, clima_index.gdu_diario[posicoes], np.nan)
+
+def matriz_cenarios(clima_index, cenarios, metodo_gdu=None):
+    """Matriz (S, dias) com o GDU diário de cada cenário"""
+    metodo = obter_metodo(metodo_gdu)
+    matriz = np.empty((len(cenarios), len(clima_index)))
+    for i, cenario in enumerate(cenarios):
+        matriz[i] = cenario.gdu_diario(clima_index, metodo)
+    return matriz
+
+def calcular_cenarios(clima_index, datas_inicio, datas_fim, cenarios, metodo_gdu=None, estacoes=None):
+    """Matriz (linhas, S) do GDU acumulado entre as datas em cada cenário"""
+    _, matriz, _ = clima_index.calcular_cenarios(
+        datas_inicio, datas_fim, matriz_cenarios(clima_index, cenarios, metodo_gdu), estacoes, CENARIOS_MAX_BYTES
+    )
+    return matriz
+
+def colunas_cenarios(cenarios, matriz, saida='resumo'):
+    """
+    Colunas de resultado: no resumo, mínimo, média, percentis e máximo entre os cenários
+    (gdu_cenarios_*); na saída larga, uma coluna gdu_cenario_<nome> por cenário.
+    """
+    if saida == 'largo':
+        return {f'gdu_cenario_{cenario.nome}': matriz[:, i] for i, cenario in enumerate(cenarios)}
+
+    with warnings.catch_warnings():
+        # Linhas sem GDU em nenhum cenário ficam vazias
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        colunas = {
+            'gdu_cenarios_min': np.nanmin(matriz, axis=1),
+            'gdu_cenarios_media': np.round(np.nanmean(matriz, axis=1), 2),
+        }
+        for percentil, valores in zip(PERCENTIS, np.nanpercentile(matriz, PERCENTIS, axis=1)):
+            colunas[f'gdu_cenarios_p{percentil}'] = np.round(valores, 2)
+        colunas['gdu_cenarios_max'] = np.nanmax(matriz, axis=1)
+    return colunas
@@ -1,204 +1,172 @@
 import pandas as pd
-import os
 import numpy as np
-import gc
-import traceback
 
-# Usa try/except para a importação do openpyxl
-try:
-    from openpyxl import load_workbook
-except ImportError:
-    # Implementação de fallback para contar linhas
-    def count_rows_in_excel(filepath):
-        """Fallback para contar linhas usando pandas"""
-        try:
-            # Verifica se o arquivo existe
-            if not os.path.exists(filepath):
-                return 0
-            
-            # Tenta ler apenas 1 linha para ver se o arquivo é válido
-            test_df = pd.read_excel(filepath, nrows=1)
-            
-            # Se chegou aqui, o arquivo é válido, usa uma estimativa baseada no tamanho
-            file_size = os.path.getsize(filepath)
-            # Estimativa grosseira: ~100 bytes por linha
-            estimated_rows = min(file_size // 100, 10000)
-            return max(estimated_rows, 10)  # No mínimo 10 linhas
-        except Exception as e:
-            print(f"Erro ao estimar linhas: {e}")
-            return 100  # Valor padrão seguro
+from clima_base import obter_clima_index
+from escrita import EscritorXlsx
+from gdu_engine import ClimaIndex, calcular_gdu_colunas, converter_datas
+from leitura import LeitorXlsx, colunas_booleanas_xlsx, converter_booleanos
+from metodos_gdu import indice_para_metodo
+from planejamento import memoria_disponivel, sondar_dimensoes, tamanho_bloco
 
-def count_rows_in_excel(filepath):
-    """Conta o número de linhas em um arquivo Excel sem carregar todo o conteúdo na memória."""
-    try:
-        # Verifica se load_workbook está disponível (definido acima)
-        if 'load_workbook' in globals():
-            # Carrega apenas as propriedades do workbook
-            wb = load_workbook(filepath, read_only=True)
-            sheet = wb.active
-            # Retorna o número máximo de linhas
-            row_count = sheet.max_row
-            # Libera memória
-            del wb
-            gc.collect()
-            return row_count
-        else:
-            # Usa o fallback definido acima
-            return count_rows_in_excel(filepath)
-    except Exception as e:
-        print(f"Erro ao contar linhas: {e}")
-        print(traceback.format_exc())
+def _montar_bloco(linhas, colunas, booleanas):
+    """Cria o DataFrame de um bloco, com as colunas de texto booleano da planilha convertidas"""
+    return pd.DataFrame(converter_booleanos(linhas, booleanas), columns=colunas)
+
+def iter_excel_blocks(filepath, block_size=100):
+    """
+    Lê a primeira planilha em uma única passada (openpyxl read-only) e produz
+    DataFrames de até block_size linhas, sem carregar o arquivo inteiro na memória.
+    Linhas vazias no final da planilha são descartadas, como no pd.read_excel.
+    Se a planilha só tiver cabeçalho, produz um único DataFrame vazio com as colunas.
+    As colunas de texto booleano são decididas antes, pela planilha inteira
+    (leitura.colunas_booleanas_xlsx), para valerem igualmente em todos os blocos.
+    """
+    booleanas = colunas_booleanas_xlsx(filepath)
+    with LeitorXlsx(filepath) as leitor:
+        if not leitor.colunas:
+            return
         
-        # Fallback seguro: estima linhas com base no tamanho do arquivo
-        try:
-            file_size = os.path.getsize(filepath)
-            # Estimativa grosseira: ~100 bytes por linha
-            estimated_rows = min(file_size // 100, 10000)
-            return max(estimated_rows, 10)  # No mínimo 10 linhas
-        except:
-            return 100  # Valor padrão muito seguro
+        bloco = []
+        algum_bloco = False
+        for linha in leitor.linhas():
+            bloco.append(linha)
+            if len(bloco) >= block_size:
+                algum_bloco = True
+                yield _montar_bloco(bloco, leitor.colunas, booleanas)
+                bloco = []
+        
+        if bloco or not algum_bloco:
+            yield _montar_bloco(bloco, leitor.colunas, booleanas)
 
-def process_excel_in_chunks(filepath, clima_df, chunk_size=100, col_plantio="Data de Plantio", 
-                           col_sfwd="05. SFWD", col_pfwd="06. PFWD"):
+def processar_bloco(chunk, clima_index, col_plantio, col_sfwd, col_pfwd, incluir_pfwd, col_estacao=None):
     """
-    Processa um arquivo Excel em chunks para evitar esgotar a memória.
-    Retorna um DataFrame com os resultados.
+    Calcula dias e GDU acumulado de um bloco de linhas com o índice climático compartilhado
+    (com col_estacao, cada linha usa a estação climática indicada nessa coluna).
+    Retorna o bloco com as colunas de resultado e os contadores (erros, linhas válidas, GDU alto).
     """
-    try:
-        # Contar linhas para determinar o número de chunks necessários
-        total_rows = count_rows_in_excel(filepath)
-        if total_rows <= 1:  # Apenas o cabeçalho ou vazio
-            print(f"Arquivo {filepath} vazio ou contém apenas cabeçalho.")
-            return pd.DataFrame(), 0, 0, 0
-    except Exception as e:
-        print(f"Erro ao contar linhas, usando valor padrão: {e}")
-        # Se falhar em contar linhas, use um valor padrão seguro
-        total_rows = 1000
-    
-    print(f"Processando arquivo {filepath} com aproximadamente {total_rows} linhas em chunks de {chunk_size}")
+    chunk_result = chunk.copy(deep=False)
     
-    # Obter os nomes das colunas do arquivo (apenas a primeira linha)
-    header_df = pd.read_excel(filepath, nrows=0)
-    all_columns = header_df.columns.tolist()
+    # Com o nome da coluna, os formatos detectados no primeiro bloco valem para os seguintes
+    datas_plantio = converter_datas(chunk[col_plantio], col_plantio)
+    datas_sfwd = converter_datas(chunk[col_sfwd], col_sfwd)
+    datas_pfwd = converter_datas(chunk[col_pfwd], col_pfwd) if incluir_pfwd else None
     
-    # Verificar se as colunas necessárias existem
-    if col_plantio not in all_columns:
-        print(f"Coluna '{col_plantio}' não encontrada no arquivo {filepath}")
-        return pd.DataFrame(), 0, 0, 0
+    estacoes = clima_index.codigos_estacoes(chunk[col_estacao]) if col_estacao else None
     
-    if col_sfwd not in all_columns:
-        print(f"Coluna '{col_sfwd}' não encontrada no arquivo {filepath}")
-        return pd.DataFrame(), 0, 0, 0
+    colunas_gdu, mascaras = calcular_gdu_colunas(clima_index, datas_plantio, datas_sfwd, datas_pfwd, estacoes)
+    for nome_coluna, valores in colunas_gdu.items():
+        chunk_result[nome_coluna] = valores
     
-    # Verificar se a coluna PFWD existe
-    incluir_pfwd = col_pfwd in all_columns
+    # Contagem por linha, como em processamento: válida é a linha com GDU até o SFWD
+    linhas_validas = int(mascaras['sfwd'].sum())
+    erros = len(chunk) - linhas_validas
+    gdu_alto = int((colunas_gdu['gdu_acumulado'] > 1200).sum())
     if incluir_pfwd:
-        print(f"Coluna '{col_pfwd}' encontrada. Incluindo cálculos PFWD.")
-    else:
-        print(f"Coluna '{col_pfwd}' não encontrada. Ignorando cálculos PFWD.")
+        gdu_alto += int((colunas_gdu['gdu_acumulado_pfwd'] > 1200).sum())
     
-    # Lista para armazenar os resultados de cada chunk
-    results = []
-    erros = 0
-    linhas_validas = 0
-    gdu_alto = 0
+    return chunk_result, erros, linhas_validas, gdu_alto
+
+def _bloco_com_erro(chunk, incluir_pfwd):
+    """Resultado de um bloco cujo cálculo falhou: colunas de resultado em NaN e todas as linhas com erro"""
+    chunk_result = chunk.copy(deep=False)
+    nomes = ['dias', 'gdu_acumulado'] + (['dias_pfwd', 'gdu_acumulado_pfwd'] if incluir_pfwd else [])
+    for nome_coluna in nomes:
+        chunk_result[nome_coluna] = np.nan
+    return chunk_result, len(chunk), 0, 0
+
+def _resolver_clima_index(clima_index, metodo_gdu=None):
+    """
+    Aceita um ClimaIndex, um DataFrame climático ou None (índice compartilhado do processo)
+    e aplica o método de GDU pedido (None = fórmula padrão)
+    """
+    if clima_index is None:
+        clima_index = obter_clima_index()
+    elif isinstance(clima_index, pd.DataFrame):
+        clima_index = ClimaIndex.from_dataframe(clima_index)
+    return indice_para_metodo(clima_index, metodo_gdu)
+
+def iter_processed_blocks(filepath, clima_index=None, chunk_size=None, col_plantio="Data de Plantio",
+                          col_sfwd="05. SFWD", col_pfwd="06. PFWD", metodo_gdu=None, col_estacao=None):
+    """
+    Lê a planilha em uma única passada e produz, bloco a bloco, o resultado calculado
+    e seus contadores: (chunk_result, erros, linhas_validas, gdu_alto). Um bloco cujo cálculo
+    falha sai com as colunas de resultado vazias (NaN) e todas as suas linhas contadas como erro.
+    Não produz nada se faltar uma coluna obrigatória ou se a planilha estiver vazia.
+    Sem chunk_size, o tamanho do bloco vem do orçamento de memória (planejamento.tamanho_bloco).
+    """
+    clima_index = _resolver_clima_index(clima_index, metodo_gdu)
+    if chunk_size is None:
+        chunk_size = tamanho_bloco(sondar_dimensoes(filepath, 'xlsx')[1], 'xlsx', memoria_disponivel())
+    print(f"Processando arquivo {filepath} em blocos de {chunk_size} linhas (leitura em passada única)")
     
-    # Processar em chunks para economizar memória
-    for chunk_start in range(0, total_rows, chunk_size):
-        try:
-            # Carregar um chunk do arquivo
-            chunk = pd.read_excel(
-                filepath, 
-                skiprows=chunk_start if chunk_start == 0 else chunk_start+1,  # Pular cabeçalho nos chunks subsequentes
-                nrows=chunk_size,
-                engine='openpyxl',
-                na_values=['NA', 'N/A', 'n/a', 'na', '', 'null', 'NULL', 'None', 'none'],
-                keep_default_na=False
-            )
-            
-            # Se é o primeiro chunk e não tem linhas após o cabeçalho, pular
-            if chunk_start == 0 and chunk.shape[0] == 0:
-                continue
-                
-            # Se não é o primeiro chunk, adicionar cabeçalhos corretos
-            if chunk_start > 0:
-                # Garantir que o chunk tenha os mesmos nomes de colunas que o cabeçalho original
-                if len(chunk.columns) == len(all_columns):
-                    chunk.columns = all_columns
-            
-            # Criar DataFrame de resultado para este chunk
-            chunk_result = chunk.copy(deep=False)
+    incluir_pfwd = False
+    chunk_start = 0
+    
+    for chunk in iter_excel_blocks(filepath, block_size=chunk_size):
+        # Verificar as colunas necessárias no primeiro bloco (o cabeçalho é o mesmo para todos)
+        if chunk_start == 0:
+            all_columns = chunk.columns.tolist()
             
-            # Processar cada linha do chunk
-            for i, row in chunk.iterrows():
-                try:
-                    # Converter as datas para o processamento interno
-                    data_plantio = pd.to_datetime(row[col_plantio], dayfirst=True, errors='coerce')
-                    data_sfwd = pd.to_datetime(row[col_sfwd], dayfirst=True, errors='coerce')
-                    
-                    if pd.isna(data_plantio) or pd.isna(data_sfwd):
-                        chunk_result.at[i, 'dias'] = float('nan')
-                        chunk_result.at[i, 'gdu_acumulado'] = float('nan')
-                        erros += 1
-                    else:
-                        intervalo = clima_df[(clima_df['data'] > data_plantio) & (clima_df['data'] <= data_sfwd)].copy()
-                        intervalo['GDU'] = ((intervalo['temp_min'] + intervalo['temp_max']) / 2) - 10
-                        gdu_acumulado = intervalo['GDU'].sum()
-                        dias = (data_sfwd - data_plantio).days
-                        
-                        chunk_result.at[i, 'dias'] = dias
-                        chunk_result.at[i, 'gdu_acumulado'] = round(gdu_acumulado, 2)
-                        
-                        # Verificar se GDU está acima do limite
-                        if gdu_acumulado > 1200:
-                            gdu_alto += 1
-                            
-                        linhas_validas += 1
-                    
-                    # Processar PFWD se disponível
-                    if incluir_pfwd:
-                        data_pfwd = pd.to_datetime(row[col_pfwd], dayfirst=True, errors='coerce')
-                        
-                        if pd.isna(data_pfwd):
-                            chunk_result.at[i, 'dias_pfwd'] = float('nan')
-                            chunk_result.at[i, 'gdu_acumulado_pfwd'] = float('nan')
-                            erros += 1
-                        else:
-                            intervalo_pfwd = clima_df[(clima_df['data'] > data_plantio) & (clima_df['data'] <= data_pfwd)].copy()
-                            intervalo_pfwd['GDU'] = ((intervalo_pfwd['temp_min'] + intervalo_pfwd['temp_max']) / 2) - 10
-                            gdu_pfwd = intervalo_pfwd['GDU'].sum()
-                            dias_pfwd = (data_pfwd - data_plantio).days
-                            
-                            chunk_result.at[i, 'dias_pfwd'] = dias_pfwd
-                            chunk_result.at[i, 'gdu_acumulado_pfwd'] = round(gdu_pfwd, 2)
-                            
-                            # Verificar se GDU está acima do limite
-                            if gdu_pfwd > 1200:
-                                gdu_alto += 1
-                                
-                            linhas_validas += 1
-                
-                except Exception as e:
-                    print(f"Erro ao processar linha {i} no chunk {chunk_start}-{chunk_start+chunk_size}: {e}")
-                    chunk_result.at[i, 'dias'] = float('nan')
-                    chunk_result.at[i, 'gdu_acumulado'] = float('nan')
-                    if incluir_pfwd:
-                        chunk_result.at[i, 'dias_pfwd'] = float('nan')
-                        chunk_result.at[i, 'gdu_acumulado_pfwd'] = float('nan')
-                    erros += 1
+            if col_plantio not in all_columns:
+                print(f"Coluna '{col_plantio}' não encontrada no arquivo {filepath}")
+                return
             
-            # Adicionar o resultado deste chunk à lista
-            results.append(chunk_result)
+            if col_sfwd not in all_columns:
+                print(f"Coluna '{col_sfwd}' não encontrada no arquivo {filepath}")
+                return
             
-            # Liberar memória após processar cada chunk
-            del chunk
-            gc.collect()
+            if col_estacao and col_estacao not in all_columns:
+                print(f"Coluna de estação '{col_estacao}' não encontrada no arquivo {filepath}")
+                return
             
-            print(f"Chunk {chunk_start}-{chunk_start+chunk_size} processado: {chunk_result.shape[0]} linhas")
+            # Verificar se a coluna PFWD existe
+            incluir_pfwd = col_pfwd in all_columns
+            if incluir_pfwd:
+                print(f"Coluna '{col_pfwd}' encontrada. Incluindo cálculos PFWD.")
+            else:
+                print(f"Coluna '{col_pfwd}' não encontrada. Ignorando cálculos PFWD.")
             
+            if chunk.shape[0] == 0:
+                print(f"Arquivo {filepath} vazio ou contém apenas cabeçalho.")
+                return
+        
+        chunk_end = chunk_start + chunk.shape[0]
+        try:
+            resultado = processar_bloco(chunk, clima_index, col_plantio, col_sfwd, col_pfwd, incluir_pfwd,
+                                        col_estacao)
         except Exception as e:
-            print(f"Erro ao processar chunk {chunk_start}-{chunk_start+chunk_size}: {e}")
-            continue
+            # O bloco sai com as colunas de resultado vazias e todas as suas linhas contam como erro,
+            # como em processamento: a saída mantém todas as linhas da planilha
+            print(f"Erro ao processar chunk {chunk_start}-{chunk_end}: {e}")
+            resultado = _bloco_com_erro(chunk, incluir_pfwd)
+        else:
+            print(f"Chunk {chunk_start}-{chunk_end} processado: {resultado[0].shape[0]} linhas")
+        yield resultado
+        
+        chunk_start = chunk_end
+
+def process_excel_in_chunks(filepath, clima_index=None, chunk_size=None, col_plantio="Data de Plantio", 
+                           col_sfwd="05. SFWD", col_pfwd="06. PFWD", metodo_gdu=None, col_estacao=None):
+    """
+    Processa um arquivo Excel em chunks para evitar esgotar a memória.
+    Retorna um DataFrame com os resultados.
+    
+    Usa o mesmo motor de GDU de main.index(); sem clima_index, usa o índice
+    compartilhado da base climática (construído uma vez por processo).
+    """
+    # Lista para armazenar os resultados de cada chunk
+    results = []
+    erros = 0
+    linhas_validas = 0
+    gdu_alto = 0
+    
+    blocos = iter_processed_blocks(filepath, clima_index, chunk_size, col_plantio, col_sfwd, col_pfwd, metodo_gdu,
+                                   col_estacao)
+    for chunk_result, chunk_erros, chunk_validas, chunk_gdu_alto in blocos:
+        erros += chunk_erros
+        linhas_validas += chunk_validas
+        gdu_alto += chunk_gdu_alto
+        results.append(chunk_result)
     
     # Se não há resultados, retornar DataFrame vazio
     if not results:
@@ -208,12 +176,42 @@ def process_excel_in_chunks(filepath, clima_df, chunk_size=100, col_plantio="Dat
     try:
         final_result = pd.concat(results, ignore_index=True)
         print(f"Arquivo processado com sucesso: {final_result.shape[0]} linhas totais")
-        
-        # Limpar a lista de resultados para economizar memória
-        del results
-        gc.collect()
-        
         return final_result, erros, linhas_validas, gdu_alto
     except Exception as e:
         print(f"Erro ao combinar chunks: {e}")
         return pd.DataFrame(), erros, linhas_validas, gdu_alto
+
+def process_excel_to_xlsx(filepath, output_path, clima_index=None, chunk_size=None, col_plantio="Data de Plantio",
+                          col_sfwd="05. SFWD", col_pfwd="06. PFWD", sheet_name='GDU', metodo_gdu=None,
+                          col_estacao=None):
+    """
+    Lê, calcula e grava o resultado bloco a bloco (XlsxWriter em constant_memory), sem
+    manter a planilha inteira na memória: o pico de memória depende só de chunk_size
+    (sem ele, o bloco é dimensionado pelo orçamento de memória).
+    Retorna (erros, linhas_validas, gdu_alto, total_linhas); total_linhas é 0 e nenhum
+    arquivo é gravado se a planilha não puder ser processada.
+    """
+    erros = 0
+    linhas_validas = 0
+    gdu_alto = 0
+    total_linhas = 0
+    escritor = None
+    
+    try:
+        blocos = iter_processed_blocks(filepath, clima_index, chunk_size, col_plantio, col_sfwd, col_pfwd,
+                                       metodo_gdu, col_estacao)
+        for chunk_result, chunk_erros, chunk_validas, chunk_gdu_alto in blocos:
+            if escritor is None:
+                escritor = EscritorXlsx(output_path, sheet_name)
+            escritor.escrever_bloco(chunk_result)
+            erros += chunk_erros
+            linhas_validas += chunk_validas
+            gdu_alto += chunk_gdu_alto
+            total_linhas += chunk_result.shape[0]
+    finally:
+        if escritor is not None:
+            escritor.fechar()
+    
+    if total_linhas:
+        print(f"Arquivo gravado em streaming: {total_linhas} linhas em {output_path}")
+    return erros, linhas_validas, gdu_alto, total_linhas
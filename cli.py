@@ -0,0 +1,252 @@
+"""
+Processamento em lote pela linha de comando, sem passar pelo Flask (uploads, timeout do
+gunicorn e limpeza automática de resultados não se aplicam).
+
+Exemplo:
+    python cli.py "ensaios/**/*.xlsx" dados/safra.csv -o resultados --formato csv --jobs 4
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from cenarios import SAIDAS, ler_cenarios
+from clima_base import obter_clima_index, obter_indice_espacial, publicar_clima_compartilhado
+from leitura import FORMATOS
+from metodos_gdu import METODO_PADRAO, indice_para_metodo, obter_metodo
+from processamento import executar_tarefas, montar_mensagem_status, nome_saida
+from resumo_grupos import ler_colunas_grupo
+
+# Registro dos resultados já gerados em cada pasta de saída (para pular arquivos atualizados)
+MANIFESTO = '.gdu_lote.json'
+RESUMO_PADRAO = 'resumo_gdu.json'
+
+# Extensões consideradas ao percorrer diretórios
+EXTENSOES_DIRETORIO = ('.xlsx', '.xlsm', '.csv', '.parquet', '.pq')
+
+def expandir_entradas(padroes):
+    """Expande globs e diretórios na lista de arquivos a processar, sem repetições e na ordem dada"""
+    arquivos = []
+    vistos = set()
+
+    def adicionar(caminho):
+        absoluto = os.path.abspath(caminho)
+        if absoluto not in vistos:
+            vistos.add(absoluto)
+            arquivos.append(caminho)
+
+    for padrao in padroes:
+        caminhos = sorted(glob.glob(padrao, recursive=True))
+        if not caminhos:
+            print(f"Nenhum arquivo corresponde a {padrao}")
+        for caminho in caminhos:
+            if os.path.isdir(caminho):
+                for raiz, _, nomes in sorted(os.walk(caminho)):
+                    for nome in sorted(nomes):
+                        # Ignora arquivos de bloqueio do Excel (~$arquivo.xlsx)
+                        if nome.lower().endswith(EXTENSOES_DIRETORIO) and not nome.startswith('~$'):
+                            adicionar(os.path.join(raiz, nome))
+            elif os.path.isfile(caminho):
+                adicionar(caminho)
+    return arquivos
+
+def carregar_manifesto(pasta):
+    try:
+        with open(os.path.join(pasta, MANIFESTO), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _gravar_json(destino, dados):
+    """Grava um JSON de forma atômica (temporário + os.replace)"""
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, destino)
+
+def _assinatura(caminho):
+    stat = os.stat(caminho)
+    return {'mtime_ns': stat.st_mtime_ns, 'tamanho': stat.st_size}
+
+def _atualizado(registro, entrada, parametros, output_path):
+    """O resultado existe e foi gerado a partir desta versão da entrada, com os mesmos parâmetros"""
+    return (
+        registro is not None
+        and os.path.exists(output_path)
+        and registro.get('entrada') == os.path.abspath(entrada)
+        and registro.get('assinatura') == _assinatura(entrada)
+        and registro.get('parametros') == parametros
+    )
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        description='Calcula dias e GDU acumulado para lotes de planilhas (xlsx, CSV ou Parquet).'
+    )
+    parser.add_argument('entradas', nargs='+',
+                        help='Arquivos, diretórios ou globs (use aspas e ** para buscar em subpastas)')
+    parser.add_argument('-o', '--saida', required=True, help='Diretório onde os resultados são gravados')
+    parser.add_argument('--formato', choices=FORMATOS, default='xlsx', help='Formato dos resultados (padrão: xlsx)')
+    parser.add_argument('--col-plantio', default='Data de Plantio', help='Coluna da data de plantio')
+    parser.add_argument('--col-sfwd', default='05. SFWD', help='Coluna da data de florescimento feminino')
+    parser.add_argument('--col-pfwd', default='06. PFWD', help='Coluna da data de florescimento masculino')
+    parser.add_argument('--col-estacao',
+                        help='Coluna com a estação climática de cada linha (padrão: todas na estação padrão)')
+    parser.add_argument('--col-latitude', help='Coluna de latitude (com --col-longitude, usa a estação mais próxima)')
+    parser.add_argument('--col-longitude', help='Coluna de longitude')
+    parser.add_argument('--vizinhos', type=int, default=1,
+                        help='Estações mais próximas combinadas pelo inverso da distância (padrão: 1)')
+    parser.add_argument('--gdu-alvo',
+                        help='GDU alvo (número ou coluna): acrescenta a data em que ele é atingido desde o plantio')
+    parser.add_argument('--cenarios',
+                        help='Cenários climáticos ("+1, -0.5, 2024"): acrescenta o GDU de plantio a SFWD em cada um')
+    parser.add_argument('--saida-cenarios', choices=SAIDAS, default='resumo',
+                        help='Colunas de resumo entre os cenários ou uma coluna por cenário (padrão: resumo)')
+    parser.add_argument('--agrupar-por',
+                        help='Colunas de agrupamento ("Híbrido, Local"): grava a planilha Resumo com o GDU por grupo')
+    parser.add_argument('--metodo', default=METODO_PADRAO,
+                        help=f'Método de cálculo do GDU (padrão: {METODO_PADRAO}; ver metodos_gdu.py)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Arquivos processados em paralelo (processos)')
+    parser.add_argument('--forcar', action='store_true', help='Reprocessa mesmo os arquivos com resultado atualizado')
+    parser.add_argument('--resumo', help=f'Arquivo JSON do resumo (padrão: <saida>/{RESUMO_PADRAO})')
+    return parser
+
+def main(argv=None):
+    parser = criar_parser()
+    args = parser.parse_args(argv)
+    try:
+        obter_metodo(args.metodo)
+    except ValueError as e:
+        parser.error(str(e))
+    coordenadas = None
+    if args.col_latitude or args.col_longitude:
+        if not (args.col_latitude and args.col_longitude):
+            parser.error('informe --col-latitude e --col-longitude juntas')
+        if args.col_estacao:
+            parser.error('use --col-estacao ou as colunas de coordenadas, não ambas')
+        if args.vizinhos < 1:
+            parser.error('--vizinhos deve ser pelo menos 1')
+        coordenadas = (args.col_latitude, args.col_longitude, args.vizinhos)
+    cenarios = None
+    if args.cenarios:
+        try:
+            ler_cenarios(args.cenarios)
+        except ValueError as e:
+            parser.error(str(e))
+        cenarios = (args.cenarios, args.saida_cenarios)
+    try:
+        agrupar_por = ler_colunas_grupo(args.agrupar_por)
+    except ValueError as e:
+        parser.error(str(e))
+    if agrupar_por and args.formato != 'xlsx':
+        parser.error('--agrupar-por grava uma planilha: use --formato xlsx')
+    inicio = time.time()
+    os.makedirs(args.saida, exist_ok=True)
+
+    arquivos = expandir_entradas(args.entradas)
+    if not arquivos:
+        print("Nenhum arquivo para processar.")
+        return 2
+
+    # O índice climático é carregado uma única vez; com --jobs > 1 os processos do pool
+    # o leem da memória compartilhada em vez de carregá-lo de novo
+    if args.jobs > 1:
+        publicar_clima_compartilhado()
+    clima_index = indice_para_metodo(obter_clima_index(), args.metodo)
+
+    parametros = {
+        'col_plantio': args.col_plantio,
+        'col_sfwd': args.col_sfwd,
+        'col_pfwd': args.col_pfwd,
+        'formato': args.formato,
+        'metodo': args.metodo,
+        'col_estacao': args.col_estacao,
+        'coordenadas': list(coordenadas) if coordenadas else None,
+        'versao_clima': clima_index.versao,
+        'versao_coordenadas': obter_indice_espacial().versao if coordenadas else None,
+        'gdu_alvo': args.gdu_alvo,
+        'cenarios': list(cenarios) if cenarios else None,
+        'agrupar_por': agrupar_por,
+    }
+    manifesto = carregar_manifesto(args.saida)
+
+    registros = []
+    tarefas = []
+    posicoes = []
+    saidas_usadas = set()
+    for entrada in arquivos:
+        saida = nome_saida(os.path.basename(entrada), args.formato)
+        output_path = os.path.join(args.saida, saida)
+        registro = {'entrada': entrada, 'saida': output_path}
+        registros.append(registro)
+
+        # Dois arquivos com o mesmo nome em pastas diferentes gravariam o mesmo resultado
+        if output_path in saidas_usadas:
+            registro.update(estado='erro', mensagem='Outro arquivo de entrada gera o mesmo nome de saída.')
+            continue
+        saidas_usadas.add(output_path)
+
+        anterior = manifesto.get(saida)
+        if not args.forcar and _atualizado(anterior, entrada, parametros, output_path):
+            registro.update(estado='atualizado', duracao_s=0.0, **anterior['contadores'])
+            continue
+
+        tarefas.append((entrada, os.path.basename(entrada), output_path,
+                        args.col_plantio, args.col_sfwd, args.col_pfwd, args.formato, args.metodo,
+                        args.col_estacao, coordenadas, args.gdu_alvo, cenarios, agrupar_por))
+        posicoes.append(len(registros) - 1)
+
+    print(f"{len(arquivos)} arquivo(s) encontrados, {len(tarefas)} a processar com {args.jobs} processo(s).")
+
+    concluidos = 0
+    for indice, (contadores, duracao) in executar_tarefas(tarefas, args.jobs):
+        registro = registros[posicoes[indice]]
+        saida = os.path.basename(registro['saida'])
+        registro['duracao_s'] = duracao
+        if contadores is None:
+            registro['estado'] = 'erro'
+            manifesto.pop(saida, None)
+        else:
+            registro.update(estado='processado', **contadores)
+            manifesto[saida] = {
+                'entrada': os.path.abspath(registro['entrada']),
+                'assinatura': _assinatura(registro['entrada']),
+                'parametros': parametros,
+                'contadores': contadores,
+            }
+        # O manifesto é gravado a cada arquivo: uma execução interrompida não perde o que já terminou
+        _gravar_json(os.path.join(args.saida, MANIFESTO), manifesto)
+        concluidos += 1
+        print(f"[{concluidos}/{len(tarefas)}] {registro['entrada']}: {registro['estado']} ({duracao}s)")
+
+    contagem = {estado: sum(1 for r in registros if r['estado'] == estado)
+                for estado in ('processado', 'atualizado', 'erro')}
+    totais = {
+        chave: sum(r.get(chave, 0) for r in registros if r['estado'] != 'erro')
+        for chave in ('erros', 'linhas_validas', 'gdu_alto')
+    }
+    status_message, status_type = montar_mensagem_status(
+        contagem['processado'] + contagem['atualizado'], totais['erros'], totais['linhas_validas'], totais['gdu_alto']
+    )
+    resumo = {
+        'inicio': inicio,
+        'duracao_total_s': round(time.time() - inicio, 3),
+        'parametros': parametros,
+        'processos': args.jobs,
+        'arquivos': registros,
+        'contagem': contagem,
+        'totais': totais,
+        'status_message': status_message,
+        'status_type': status_type,
+    }
+    caminho_resumo = args.resumo or os.path.join(args.saida, RESUMO_PADRAO)
+    _gravar_json(caminho_resumo, resumo)
+
+    print(status_message)
+    print(f"Processados: {contagem['processado']}, atualizados (pulados): {contagem['atualizado']}, "
+          f"com erro: {contagem['erro']}. Resumo em {caminho_resumo}")
+    return 1 if contagem['erro'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
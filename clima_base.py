@@ -0,0 +1,395 @@
+import atexit
+import hashlib
+import json
+import os
+import sys
+import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from datas import normalizar_datas
+from espacial import IndiceEspacial
+from gdu_engine import ClimaIndex, calcular_gdu_diario
+
+# Base climática fixa
+CLIMA_PATH = 'base_clima/temperaturas_2025.xlsx'
+CLIMA_SHEET = 'Fonte  Estação Terra Nova Temp.'
+
+# Nome da estação da planilha fixa (estação padrão das linhas sem estação)
+ESTACAO_PADRAO = os.environ.get('GDU_ESTACAO_PADRAO', 'Terra Nova')
+
+# Pasta opcional com outras estações e anos: cada arquivo (.xlsx na primeira aba ou .csv) tem
+# as colunas data, temp_min e temp_max e, opcionalmente, estacao; sem ela, o nome do arquivo
+# é o nome da estação. Dias de uma estação podem vir de vários arquivos.
+CLIMA_ESTACOES_DIR = os.environ.get('GDU_CLIMA_ESTACOES', 'base_clima/estacoes')
+EXTENSOES_ESTACOES = ('.xlsx', '.csv')
+
+# Coordenadas das estações (colunas estacao, latitude e longitude), usadas para resolver a
+# estação de linhas que só trazem latitude e longitude
+COORDENADAS_PATH = os.environ.get('GDU_COORDENADAS_ESTACOES', 'base_clima/coordenadas_estacoes.csv')
+
+# Versão do formato da base compilada; incrementar ao mudar o layout do artefato
+FORMATO_COMPILADO = 2
+DTYPE_COMPILADO = np.dtype([
+    ('ordinal', '<i8'),
+    ('temp_min', '<f8'),
+    ('temp_max', '<f8'),
+    ('gdu_diario', '<f8'),
+])
+
+# Variável de ambiente com o nome do segmento compartilhado; processos filhos a herdam
+CLIMA_SHM_ENV = 'CLIMA_SHM'
+
+# Arrays do índice guardados no segmento compartilhado, após um cabeçalho de dois int64 (número
+# de dias e tamanho da lista de estações em JSON, gravada após os arrays). Os campos marcados
+# com 1 têm um elemento a mais (somas prefixadas).
+CAMPOS_COMPARTILHADOS = [
+    ('ordinais', np.int64, 0),
+    ('gdu_diario', np.float64, 0),
+    ('temp_min', np.float64, 0),
+    ('temp_max', np.float64, 0),
+    ('acumulado', np.float64, 1),
+    ('nulos_acumulado', np.int64, 1),
+]
+
+_clima_index = None
+_clima_lock = threading.Lock()
+_clima_shm = None
+_indice_espacial = None
+
+class _SegmentoCompartilhado(shared_memory.SharedMemory):
+    """SharedMemory que não reclama ao ser destruído com arrays ainda apontando para ele"""
+
+    def __del__(self):
+        try:
+            super().__del__()
+        except BufferError:
+            # No encerramento do processo os arrays do índice ainda existem; o SO libera o mapeamento
+            pass
+
+def carregar_clima_df(path=CLIMA_PATH, sheet_name=CLIMA_SHEET):
+    """Lê a planilha climática e pré-calcula o GDU diário"""
+    clima_df = pd.read_excel(path, sheet_name=sheet_name, engine='openpyxl')
+
+    # Garante que datas sejam datetime com formato brasileiro (dayfirst=True)
+    clima_df['data'] = pd.to_datetime(clima_df['data'], dayfirst=True)
+    clima_df['gdu_diario'] = calcular_gdu_diario(clima_df['temp_min'], clima_df['temp_max'])
+    return clima_df
+
+def listar_fontes(path=CLIMA_PATH, sheet_name=CLIMA_SHEET, pasta_estacoes=CLIMA_ESTACOES_DIR):
+    """Arquivos que compõem a base: (caminho, aba) da planilha fixa seguida dos arquivos da pasta de estações"""
+    fontes = [(path, sheet_name)]
+    if pasta_estacoes and os.path.isdir(pasta_estacoes):
+        for nome in sorted(os.listdir(pasta_estacoes)):
+            if nome.lower().endswith(EXTENSOES_ESTACOES) and not nome.startswith(('.', '~$')):
+                fontes.append((os.path.join(pasta_estacoes, nome), None))
+    return fontes
+
+def carregar_estacao_df(path):
+    """Lê um arquivo da pasta de estações (datas em qualquer formato aceito por datas.normalizar_datas)"""
+    if path.lower().endswith('.csv'):
+        clima_df = pd.read_csv(path, sep=None, engine='python')
+    else:
+        clima_df = pd.read_excel(path, sheet_name=0, engine='openpyxl')
+    clima_df.columns = [str(coluna).strip().lower() for coluna in clima_df.columns]
+    faltando = {'data', 'temp_min', 'temp_max'} - set(clima_df.columns)
+    if faltando:
+        raise ValueError(f"{path}: colunas ausentes: {', '.join(sorted(faltando))}")
+
+    clima_df['data'] = normalizar_datas(clima_df['data'], 'data').datas
+    if 'estacao' not in clima_df.columns:
+        clima_df['estacao'] = os.path.splitext(os.path.basename(path))[0]
+    clima_df['gdu_diario'] = calcular_gdu_diario(clima_df['temp_min'], clima_df['temp_max'])
+    return clima_df
+
+def carregar_clima_estacoes(path=CLIMA_PATH, sheet_name=CLIMA_SHEET, pasta_estacoes=CLIMA_ESTACOES_DIR):
+    """
+    Junta a planilha fixa (estação padrão) e os arquivos da pasta de estações em um único
+    DataFrame com a coluna estacao. A estação padrão recebe o código 0.
+    """
+    partes = []
+    for fonte, aba in listar_fontes(path, sheet_name, pasta_estacoes):
+        if aba is not None:
+            clima_df = carregar_clima_df(fonte, aba)
+            clima_df['estacao'] = ESTACAO_PADRAO
+        else:
+            clima_df = carregar_estacao_df(fonte)
+        partes.append(clima_df[['data', 'temp_min', 'temp_max', 'gdu_diario', 'estacao']])
+    return pd.concat(partes, ignore_index=True)
+
+def caminhos_compilados(path=CLIMA_PATH):
+    """Retorna os caminhos do artefato compilado (.gdu.npy) e de seus metadados (.gdu.json)"""
+    base, _ = os.path.splitext(path)
+    return f"{base}.gdu.npy", f"{base}.gdu.json"
+
+def _hash_arquivo(path):
+    """Calcula o SHA-256 do arquivo de origem"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _gravar_atomico(destino, escrever):
+    """Grava em um arquivo temporário e o move para o destino, evitando leituras parciais"""
+    temporario = f"{destino}.{os.getpid()}.tmp"
+    try:
+        escrever(temporario)
+        os.replace(temporario, destino)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def _descrever_fonte(fonte, aba):
+    """Metadados de validação de um arquivo de origem"""
+    stat = os.stat(fonte)
+    return {
+        'origem': fonte,
+        'aba': aba,
+        'mtime_ns': stat.st_mtime_ns,
+        'tamanho': stat.st_size,
+        'sha256': _hash_arquivo(fonte),
+    }
+
+def compilar_base_clima(path=CLIMA_PATH, sheet_name=CLIMA_SHEET, pasta_estacoes=CLIMA_ESTACOES_DIR):
+    """
+    Converte a planilha climática e os arquivos de estações em um array colunar binário
+    (ordinal do dia com o código da estação, temp_min, temp_max, gdu_diario) com metadados
+    de validação das origens e os nomes das estações.
+    Retorna o índice construído.
+    """
+    fontes = listar_fontes(path, sheet_name, pasta_estacoes)
+    print(f"Compilando base climática {path} ({len(fontes)} arquivo(s))...")
+    index = ClimaIndex.from_dataframe(carregar_clima_estacoes(path, sheet_name, pasta_estacoes))
+
+    tabela = np.empty(len(index), dtype=DTYPE_COMPILADO)
+    tabela['ordinal'] = index.ordinais
+    tabela['temp_min'] = index.temp_min
+    tabela['temp_max'] = index.temp_max
+    tabela['gdu_diario'] = index.gdu_diario
+
+    metadados = {
+        'formato': FORMATO_COMPILADO,
+        'fontes': [_descrever_fonte(fonte, aba) for fonte, aba in fontes],
+        'estacoes': list(index.estacoes),
+        'dias': len(index),
+    }
+
+    caminho_npy, caminho_json = caminhos_compilados(path)
+
+    def escrever_npy(destino):
+        with open(destino, 'wb') as f:
+            np.save(f, tabela)
+
+    def escrever_json(destino):
+        with open(destino, 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, ensure_ascii=False, indent=2)
+
+    # Os metadados são gravados por último: só validam um .npy já completo
+    _gravar_atomico(caminho_npy, escrever_npy)
+    _gravar_atomico(caminho_json, escrever_json)
+    print(f"Base climática compilada em {caminho_npy} ({len(index)} dias, {len(index.estacoes)} estação(ões))")
+    return index
+
+def _metadados_validos(fontes, caminho_json):
+    """
+    Confere se os metadados do artefato correspondem aos arquivos de origem atuais.
+    Retorna os metadados ou None.
+    """
+    try:
+        with open(caminho_json, 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    registrados = metadados.get('fontes') or []
+    if metadados.get('formato') != FORMATO_COMPILADO or \
+            [(r.get('origem'), r.get('aba')) for r in registrados] != list(fontes):
+        return None
+
+    alterados = False
+    for registro, (fonte, _) in zip(registrados, fontes):
+        stat = os.stat(fonte)
+        if registro.get('mtime_ns') == stat.st_mtime_ns and registro.get('tamanho') == stat.st_size:
+            continue
+        # O mtime mudou (ex.: checkout ou cópia), mas o conteúdo pode ser o mesmo
+        if registro.get('sha256') != _hash_arquivo(fonte):
+            return None
+        registro['mtime_ns'] = stat.st_mtime_ns
+        registro['tamanho'] = stat.st_size
+        alterados = True
+
+    if not alterados:
+        return metadados
+
+    try:
+        def escrever_json(destino):
+            with open(destino, 'w', encoding='utf-8') as f:
+                json.dump(metadados, f, ensure_ascii=False, indent=2)
+
+        _gravar_atomico(caminho_json, escrever_json)
+    except OSError as e:
+        print(f"Não foi possível atualizar os metadados da base compilada: {e}")
+    return metadados
+
+def carregar_base_compilada(path=CLIMA_PATH, sheet_name=CLIMA_SHEET, pasta_estacoes=CLIMA_ESTACOES_DIR):
+    """
+    Carrega o artefato compilado com memory map, se ele existir e estiver
+    válido para os arquivos de origem. Retorna None caso contrário.
+    """
+    caminho_npy, caminho_json = caminhos_compilados(path)
+    if not os.path.exists(caminho_npy):
+        return None
+    metadados = _metadados_validos(listar_fontes(path, sheet_name, pasta_estacoes), caminho_json)
+    if metadados is None:
+        return None
+
+    try:
+        tabela = np.load(caminho_npy, mmap_mode='r')
+    except (OSError, ValueError) as e:
+        print(f"Erro ao carregar base compilada {caminho_npy}: {e}")
+        return None
+
+    if tabela.dtype != DTYPE_COMPILADO:
+        return None
+
+    return ClimaIndex(tabela['ordinal'], tabela['gdu_diario'], tabela['temp_min'], tabela['temp_max'],
+                      estacoes=metadados.get('estacoes'))
+
+def _index_do_segmento(buffer):
+    """Monta um ClimaIndex somente leitura cujos arrays são vistas sobre o segmento compartilhado"""
+    dias, tamanho_estacoes = (int(valor) for valor in np.frombuffer(buffer, dtype=np.int64, count=2))
+    offset = 2 * np.dtype(np.int64).itemsize
+    arrays = {}
+    for nome, dtype, extra in CAMPOS_COMPARTILHADOS:
+        array = np.frombuffer(buffer, dtype=dtype, count=dias + extra, offset=offset)
+        array.setflags(write=False)
+        arrays[nome] = array
+        offset += array.nbytes
+    estacoes = json.loads(bytes(buffer[offset:offset + tamanho_estacoes]).decode('utf-8'))
+    return ClimaIndex(**arrays, estacoes=estacoes)
+
+def publicar_clima_compartilhado():
+    """
+    Copia o índice climático para um segmento de memória compartilhada e passa a usá-lo
+    neste processo. Deve ser chamado no processo mestre antes do fork (gunicorn --preload):
+    os workers herdam o mapeamento e leem os mesmos arrays sem cópia.
+    Retorna o nome do segmento.
+    """
+    global _clima_index, _clima_shm
+    with _clima_lock:
+        if _clima_shm is not None:
+            return _clima_shm.name
+
+        index = _clima_index or _construir_clima_index()
+        arrays = [getattr(index, nome) for nome, _, _ in CAMPOS_COMPARTILHADOS]
+        if index.temp_min is None or index.temp_max is None:
+            arrays[2] = arrays[3] = np.full(len(index), np.nan)
+
+        estacoes = json.dumps(list(index.estacoes), ensure_ascii=False).encode('utf-8')
+        tamanho = 2 * np.dtype(np.int64).itemsize + len(estacoes) + sum(
+            len(array) * np.dtype(dtype).itemsize
+            for array, (_, dtype, _) in zip(arrays, CAMPOS_COMPARTILHADOS)
+        )
+        shm = _SegmentoCompartilhado(create=True, size=tamanho)
+        np.frombuffer(shm.buf, dtype=np.int64, count=2)[:] = (len(index), len(estacoes))
+        offset = 2 * np.dtype(np.int64).itemsize
+        for array, (_, dtype, _) in zip(arrays, CAMPOS_COMPARTILHADOS):
+            destino = np.frombuffer(shm.buf, dtype=dtype, count=len(array), offset=offset)
+            destino[:] = array
+            offset += destino.nbytes
+        shm.buf[offset:offset + len(estacoes)] = estacoes
+
+        _clima_shm = shm
+        _clima_index = _index_do_segmento(shm.buf)
+        os.environ[CLIMA_SHM_ENV] = shm.name
+
+        pid_criador = os.getpid()
+
+        def liberar_segmento():
+            # Só o processo que criou o segmento o remove; workers apenas herdam o mapeamento
+            if os.getpid() == pid_criador:
+                os.environ.pop(CLIMA_SHM_ENV, None)
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+
+        atexit.register(liberar_segmento)
+        print(f"Índice climático publicado em memória compartilhada ({shm.name}, {tamanho} bytes)")
+        return shm.name
+
+def anexar_clima_compartilhado(nome):
+    """Anexa este processo a um segmento publicado por publicar_clima_compartilhado (sem copiar)"""
+    global _clima_index, _clima_shm
+    # Processos filhos (pool de processos, workers) já usam o resource_tracker de quem criou
+    # o segmento; só um processo independente tem um tracker próprio
+    tracker_proprio = resource_tracker._resource_tracker._fd is None
+    shm = _SegmentoCompartilhado(name=nome)
+    if tracker_proprio:
+        # Quem anexa não é dono do segmento: não deixar o próprio tracker removê-lo ao sair
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    _clima_shm = shm
+    _clima_index = _index_do_segmento(shm.buf)
+    return _clima_index
+
+def _construir_clima_index():
+    """Carrega a base compilada, regenerando-a se necessário"""
+    index = carregar_base_compilada()
+    if index is None:
+        try:
+            index = compilar_base_clima()
+        except OSError as e:
+            # Sem permissão de escrita: usa a planilha diretamente
+            print(f"Erro ao gravar base compilada, usando a planilha: {e}")
+            index = ClimaIndex.from_dataframe(carregar_clima_estacoes())
+    return index
+
+def obter_clima_index():
+    """
+    Retorna o índice de GDU da base climática, construído uma única vez por processo.
+    Se um segmento compartilhado foi publicado (CLIMA_SHM), anexa-se a ele; senão usa a
+    base compilada quando válida e a regenera quando a planilha muda.
+    """
+    global _clima_index
+    if _clima_index is None:
+        with _clima_lock:
+            if _clima_index is None:
+                nome_shm = os.environ.get(CLIMA_SHM_ENV)
+                if nome_shm:
+                    try:
+                        return anexar_clima_compartilhado(nome_shm)
+                    except (OSError, ValueError) as e:
+                        print(f"Erro ao anexar índice compartilhado {nome_shm}: {e}")
+                _clima_index = _construir_clima_index()
+    return _clima_index
+
+def carregar_indice_espacial(clima_index, path=COORDENADAS_PATH):
+    """Índice espacial das estações de clima_index com coordenadas no arquivo (vazio sem o arquivo)"""
+    if not path or not os.path.exists(path):
+        return IndiceEspacial([], [], [])
+    try:
+        coordenadas_df = pd.read_csv(path, sep=None, engine='python', dtype=str)
+        coordenadas_df.columns = [str(coluna).strip().lower() for coluna in coordenadas_df.columns]
+        indice = IndiceEspacial.from_dataframe(coordenadas_df, clima_index)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Erro ao carregar coordenadas das estações {path}: {e}")
+        return IndiceEspacial([], [], [])
+    print(f"Índice espacial com {len(indice)} estação(ões) com coordenadas")
+    return indice
+
+def obter_indice_espacial():
+    """Retorna o índice espacial das estações, construído uma única vez por processo"""
+    global _indice_espacial
+    if _indice_espacial is None:
+        clima_index = obter_clima_index()
+        with _clima_lock:
+            if _indice_espacial is None:
+                _indice_espacial = carregar_indice_espacial(clima_index)
+    return _indice_espacial
+
+if __name__ == '__main__':
+    # Etapa de compilação: python clima_base.py [planilha] [aba] [pasta de estações]
+    compilar_base_clima(*sys.argv[1:4])
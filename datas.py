@@ -0,0 +1,324 @@
+"""
+Normalização das colunas de data das planilhas enviadas.
+
+As colunas chegam misturando datas já convertidas pelo leitor, números de série do Excel
+e textos em mais de um formato (DD/MM/AAAA, ISO). Cada valor distinto é tratado uma vez:
+datas vão direto para datetime64, números de série são convertidos aritmeticamente e os
+textos são lidos com formatos explícitos, detectados por amostragem e lembrados por nome
+de coluna. Só o que nenhum formato conhecido reconhece passa pelo parser genérico do pandas.
+"""
+import datetime
+import threading
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Formatos de texto tentados na detecção, em ordem de preferência (padrão brasileiro primeiro)
+FORMATOS_TEXTO = (
+    '%d/%m/%Y',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%d/%m/%y',
+)
+
+# Valores distintos ainda não reconhecidos usados para escolher o próximo formato
+TAMANHO_AMOSTRA = 200
+
+# Números de série do Excel (sistema 1900): dia 1 = 1900-01-01. O Excel conta um 29/02/1900
+# inexistente (serial 60), então a partir do serial 61 (1900-03-01) a origem efetiva é
+# 1899-12-30 e antes dele, 1899-12-31. Limite: 9999-12-31.
+ORIGEM_SERIAL_EXCEL = np.datetime64('1899-12-30', 'ns')
+SERIAL_29_FEVEREIRO_1900 = 60
+MAXIMO_SERIAL_EXCEL = 2958465
+
+# Textos ISO (AAAA-MM-DD, com ou sem horário) no parser genérico
+_ISO_RE = r'^\d{4}-\d{2}-\d{2}'
+
+# Formatos que funcionaram por nome de coluna (as planilhas de um programa se repetem)
+MAX_COLUNAS_CACHE = 256
+_formatos_por_coluna = OrderedDict()
+_formatos_lock = threading.Lock()
+
+class DatasNormalizadas:
+    """
+    Resultado da normalização de uma coluna: datas (datetime64[ns], NaT onde não há data),
+    falhas (posições das linhas com valor preenchido que não pôde ser lido como data) e os
+    formatos usados ('datetime', 'serial_excel', formatos strftime ou 'generico').
+    """
+
+    def __init__(self, datas, falhas, formatos):
+        self.datas = datas
+        self.falhas = falhas
+        self.formatos = formatos
+
+def formatos_da_coluna(coluna):
+    with _formatos_lock:
+        formatos = _formatos_por_coluna.get(coluna)
+        if formatos is not None:
+            _formatos_por_coluna.move_to_end(coluna)
+        return list(formatos or [])
+
+def _lembrar_formatos(coluna, formatos):
+    with _formatos_lock:
+        _formatos_por_coluna[coluna] = list(formatos)
+        _formatos_por_coluna.move_to_end(coluna)
+        while len(_formatos_por_coluna) > MAX_COLUNAS_CACHE:
+            _formatos_por_coluna.popitem(last=False)
+
+def _converter_seriais(numeros):
+    """
+    Números de série do Excel (com fração de dia) para datetime64[ns]. Como no openpyxl, que
+    lê as células de data do xlsx, seriais antes do 29/02/1900 fictício ganham um dia e o
+    próprio serial 60 cai em 1900-02-28.
+    """
+    numeros = numeros.astype(np.float64)
+    validos = (numeros >= 1) & (numeros <= MAXIMO_SERIAL_EXCEL)
+    datas = np.full(len(numeros), np.datetime64('NaT'), dtype='datetime64[ns]')
+    dias = numeros[validos] + (numeros[validos] < SERIAL_29_FEVEREIRO_1900)
+    # Arredondado ao segundo, como o Excel exibe
+    segundos = np.round(dias * 86400).astype(np.int64)
+    datas[validos] = ORIGEM_SERIAL_EXCEL + segundos.astype('timedelta64[s]')
+    return datas
+
+# Campos numéricos dos formatos: número de dígitos quando preenchidos com zeros
+_DIGITOS_CAMPO = {'Y': 4, 'y': 2, 'm': 2, 'd': 2, 'H': 2, 'M': 2, 'S': 2}
+_LIMITES_CAMPO = {'m': (1, 12), 'd': (1, 31), 'H': (0, 23), 'M': (0, 59), 'S': (0, 59)}
+
+def _layout(formato):
+    """
+    Posições fixas de um formato com campos preenchidos com zeros ('%d/%m/%Y' ->
+    comprimento 10, campos {'d': 0, 'm': 3, 'Y': 6}, separadores {2: '/', 5: '/'}).
+    """
+    campos = {}
+    separadores = {}
+    posicao = 0
+    i = 0
+    while i < len(formato):
+        if formato[i] == '%':
+            campo = formato[i + 1]
+            campos[campo] = posicao
+            posicao += _DIGITOS_CAMPO[campo]
+            i += 2
+        else:
+            separadores[posicao] = formato[i]
+            posicao += 1
+            i += 1
+    return posicao, campos, separadores
+
+_LAYOUTS = {formato: _layout(formato) for formato in FORMATOS_TEXTO}
+
+def _tamanhos(textos):
+    return np.fromiter(map(len, textos), dtype=np.int64, count=len(textos))
+
+def _converter_layout_fixo(textos, formato, tamanhos):
+    """
+    Lê de forma vetorizada os textos no comprimento exato do formato, tratando-os como uma
+    matriz de bytes: os dígitos de cada campo viram números sem passar pelo strptime.
+    Textos em outro comprimento ou com campos inválidos (ex.: 31/02) ficam NaT.
+    """
+    comprimento, campos, separadores = _LAYOUTS[formato]
+    datas = np.full(len(textos), np.datetime64('NaT'), dtype='datetime64[ns]')
+    indices = np.flatnonzero(tamanhos == comprimento)
+    if len(indices) == 0:
+        return datas
+    try:
+        bytes_ = np.array(textos[indices].tolist(), dtype=f'S{comprimento}')
+    except UnicodeEncodeError:
+        return datas
+    matriz = bytes_.view(np.uint8).reshape(len(indices), comprimento)
+
+    ok = np.ones(len(indices), dtype=bool)
+    for posicao, separador in separadores.items():
+        ok &= matriz[:, posicao] == ord(separador)
+    valores = {}
+    for campo, posicao in campos.items():
+        digitos = matriz[:, posicao:posicao + _DIGITOS_CAMPO[campo]].astype(np.int64) - ord('0')
+        ok &= ((digitos >= 0) & (digitos <= 9)).all(axis=1)
+        valor = np.zeros(len(indices), dtype=np.int64)
+        for coluna in range(digitos.shape[1]):
+            valor = valor * 10 + digitos[:, coluna]
+        minimo, maximo = _LIMITES_CAMPO.get(campo, (0, 9999))
+        ok &= (valor >= minimo) & (valor <= maximo)
+        valores[campo] = valor
+
+    if 'y' in valores:
+        # Como o strptime: 69-99 -> 1969-1999, 00-68 -> 2000-2068
+        valores['Y'] = np.where(valores['y'] >= 69, 1900, 2000) + valores['y']
+    ano = np.where(ok, valores['Y'], 1970)
+    mes = np.where(ok, valores['m'], 1)
+    dia = np.where(ok, valores['d'], 1)
+    meses = ((ano - 1970) * 12 + (mes - 1)).astype('datetime64[M]')
+    dias = meses.astype('datetime64[D]') + (dia - 1).astype('timedelta64[D]')
+    # Dias além do fim do mês (31/04, 29/02 fora de ano bissexto) caem no mês seguinte
+    ok &= dias.astype('datetime64[M]') == meses
+
+    segundos = sum(valores.get(campo, 0) * fator for campo, fator in (('H', 3600), ('M', 60), ('S', 1)))
+    resultado = dias.astype('datetime64[ns]') + np.asarray(segundos, dtype=np.int64).astype('timedelta64[s]')
+    datas[indices[ok]] = resultado[ok]
+    return datas
+
+def _com_formato(textos, formato, tamanhos=None):
+    """
+    Textos no formato explícito: o comprimento exato vai pelo caminho vetorizado; os mais
+    curtos (dia ou mês sem zero à esquerda, como 1/2/2025) pelo strptime do pandas.
+    """
+    if tamanhos is None:
+        tamanhos = _tamanhos(textos)
+    datas = _converter_layout_fixo(textos, formato, tamanhos)
+    curtos = np.flatnonzero(tamanhos < _LAYOUTS[formato][0])
+    if len(curtos):
+        datas[curtos] = pd.to_datetime(
+            textos[curtos], format=formato, errors='coerce'
+        ).to_numpy(dtype='datetime64[ns]')
+    return datas
+
+def _converter_textos(textos, coluna=None):
+    """
+    Lê textos distintos com formatos explícitos: primeiro os já vistos na coluna, depois o
+    formato que mais reconhece uma amostra do que falta, até nenhum formato reconhecer nada.
+    O restante vai ao parser genérico (ISO ou dia primeiro). Retorna (datas, formatos usados).
+    """
+    datas = np.full(len(textos), np.datetime64('NaT'), dtype='datetime64[ns]')
+    pendentes = np.ones(len(textos), dtype=bool)
+    tamanhos = _tamanhos(textos)
+    usados = []
+
+    def aplicar(formato):
+        indices = np.flatnonzero(pendentes)
+        convertidos = _com_formato(textos[indices], formato, tamanhos[indices])
+        ok = ~np.isnat(convertidos)
+        if ok.any():
+            datas[indices[ok]] = convertidos[ok]
+            pendentes[indices[ok]] = False
+            usados.append(formato)
+
+    conhecidos = formatos_da_coluna(coluna) if coluna is not None else []
+    for formato in conhecidos:
+        if not pendentes.any():
+            break
+        aplicar(formato)
+
+    candidatos = [formato for formato in FORMATOS_TEXTO if formato not in conhecidos]
+    while pendentes.any() and candidatos:
+        amostra = np.flatnonzero(pendentes)[:TAMANHO_AMOSTRA]
+        acertos = [(~np.isnat(_com_formato(textos[amostra], formato, tamanhos[amostra]))).sum()
+                   for formato in candidatos]
+        melhor = int(np.argmax(acertos))
+        if acertos[melhor] == 0:
+            break
+        aplicar(candidatos.pop(melhor))
+
+    if pendentes.any():
+        # Números de série gravados como texto (CSV exportado de uma coluna de datas do Excel)
+        indices = np.flatnonzero(pendentes)
+        seriais = pd.to_numeric(pd.Series(textos[indices], dtype=object).str.replace(',', '.', regex=False),
+                                errors='coerce').to_numpy(dtype=np.float64)
+        # Fora da faixa de seriais (ex.: 20250110) segue para o parser genérico
+        numericos = (seriais >= 1) & (seriais <= MAXIMO_SERIAL_EXCEL)
+        if numericos.any():
+            datas[indices[numericos]] = _converter_seriais(seriais[numericos])
+            pendentes[indices[numericos]] = False
+            usados.append('serial_excel')
+
+    if pendentes.any():
+        # Formatos fora da lista (nomes de mês, fusos horários...): parser genérico
+        indices = np.flatnonzero(pendentes)
+        restantes = pd.Series(textos[indices], dtype=object)
+        iso = restantes.str.match(_ISO_RE).to_numpy(dtype=bool)
+        if iso.any():
+            datas_iso = pd.to_datetime(restantes[iso], format='ISO8601', errors='coerce', utc=True)
+            datas[indices[iso]] = datas_iso.dt.tz_localize(None).to_numpy(dtype='datetime64[ns]')
+        if not iso.all():
+            with warnings.catch_warnings():
+                # Sem formato comum o pandas avisa que lerá valor a valor; é o esperado aqui
+                warnings.filterwarnings('ignore', 'Could not infer format', UserWarning)
+                outras = pd.to_datetime(restantes[~iso], dayfirst=True, errors='coerce')
+            datas[indices[~iso]] = outras.to_numpy(dtype='datetime64[ns]')
+        if (~np.isnat(datas[indices])).any():
+            usados.append('generico')
+
+    if coluna is not None:
+        # Só os formatos strftime são lembrados: seriais e o parser genérico não são tentados por formato
+        formatos_texto = [formato for formato in usados if formato in FORMATOS_TEXTO]
+        if formatos_texto and formatos_texto != conhecidos[:len(formatos_texto)]:
+            _lembrar_formatos(coluna, formatos_texto + [f for f in conhecidos if f not in formatos_texto])
+    return datas, usados
+
+def _tipo_valor(valor):
+    """Classe de um valor distinto: 0 data, 1 número, 2 texto, 3 outro"""
+    if isinstance(valor, (datetime.date, np.datetime64)):
+        return 0
+    if isinstance(valor, (bool, np.bool_)):
+        return 3
+    if isinstance(valor, (int, float, np.integer, np.floating)):
+        return 1
+    if isinstance(valor, str):
+        return 2
+    return 3
+
+_TIPOS_HOMOGENEOS = {
+    'string': 2, 'datetime': 0, 'datetime64': 0, 'date': 0,
+    'integer': 1, 'floating': 1, 'mixed-integer-float': 1,
+}
+
+def normalizar_datas(valores, coluna=None):
+    """
+    Converte os valores brutos de uma coluna de datas (Series, lista ou array) para
+    datetime64[ns] e informa as linhas que falharam (ver DatasNormalizadas). Células vazias
+    viram NaT sem contar como falha. Com o nome da coluna, os formatos de texto detectados
+    são reaproveitados nas próximas chamadas para a mesma coluna (blocos, outros arquivos).
+    """
+    if pd.api.types.is_datetime64_dtype(getattr(valores, 'dtype', None)):
+        datas = np.asarray(valores, dtype='datetime64[ns]')
+        return DatasNormalizadas(datas, np.array([], dtype=np.int64), ['datetime'])
+
+    codigos, distintos = pd.factorize(pd.Series(valores, dtype=object), use_na_sentinel=True)
+    distintos = np.asarray(distintos, dtype=object)
+    # Colunas homogêneas (o caso comum) dispensam classificar valor a valor
+    tipo_coluna = _TIPOS_HOMOGENEOS.get(pd.api.types.infer_dtype(distintos, skipna=True))
+    if tipo_coluna is not None:
+        tipos = np.full(len(distintos), tipo_coluna, dtype=np.int8)
+    else:
+        tipos = np.fromiter((_tipo_valor(valor) for valor in distintos), dtype=np.int8, count=len(distintos))
+
+    # Uma posição extra com NaT para os valores ausentes (código -1 do factorize)
+    convertidos = np.full(len(distintos) + 1, np.datetime64('NaT'), dtype='datetime64[ns]')
+    vazios = np.zeros(len(distintos) + 1, dtype=bool)
+    vazios[-1] = True
+    formatos = []
+
+    datas_prontas = tipos == 0
+    if datas_prontas.any():
+        convertidos[:-1][datas_prontas] = pd.to_datetime(
+            pd.Series(distintos[datas_prontas], dtype=object), errors='coerce'
+        ).to_numpy(dtype='datetime64[ns]')
+        formatos.append('datetime')
+
+    numeros = tipos == 1
+    if numeros.any():
+        seriais = distintos[numeros].astype(np.float64)
+        vazios[:-1][numeros] = np.isnan(seriais)
+        convertidos[:-1][numeros] = _converter_seriais(seriais)
+        formatos.append('serial_excel')
+
+    textos = tipos == 2
+    if textos.any():
+        limpos = np.array(list(map(str.strip, distintos[textos])), dtype=object)
+        em_branco = limpos == ''
+        vazios[:-1][np.flatnonzero(textos)[em_branco]] = True
+        posicoes = np.flatnonzero(textos)[~em_branco]
+        if len(posicoes):
+            datas_texto, usados = _converter_textos(limpos[~em_branco], coluna)
+            convertidos[:-1][posicoes] = datas_texto
+            formatos.extend(usados)
+
+    falhou = np.isnat(convertidos) & ~vazios
+    falhas = np.flatnonzero(falhou[codigos])
+    return DatasNormalizadas(convertidos[codigos], falhas, formatos)
@@ -0,0 +1,237 @@
+import datetime
+import math
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# Formatos usados pelo pandas (ExcelWriter) para datas, mantidos para o arquivo sair igual
+FORMATO_DATAHORA = 'YYYY-MM-DD HH:MM:SS'
+FORMATO_DATA = 'YYYY-MM-DD'
+
+# Linhas e colunas usadas na heurística de largura das colunas
+LINHAS_AMOSTRA_LARGURA = 100
+COLUNAS_AJUSTE_LARGURA = 100
+
+class EscritorXlsx:
+    """
+    Grava uma planilha de resultado bloco a bloco com o XlsxWriter em modo constant_memory:
+    cada linha vai direto para o disco, então a memória usada não depende do número de linhas.
+
+    Mantém a formatação da escrita anterior (via pandas): cabeçalho em negrito com fundo azul,
+    datas em YYYY-MM-DD HH:MM:SS, células vazias para NaN/NaT e largura das colunas calculada
+    a partir das primeiras 100 linhas.
+    """
+
+    def __init__(self, output_path, sheet_name='GDU'):
+        self.workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        self.header_format = self.workbook.add_format({
+            'bold': True,
+            'bg_color': '#4facfe',
+            'font_color': 'white',
+            'border': 1
+        })
+        self.datahora_format = self.workbook.add_format({'num_format': FORMATO_DATAHORA})
+        self.data_format = self.workbook.add_format({'num_format': FORMATO_DATA})
+        self.colunas = None
+        self.proxima_linha = 0
+        # Maior texto visto por coluna nas primeiras linhas (heurística de largura)
+        self._larguras = {}
+        self._linhas_amostra = 0
+
+    def _escrever_cabecalho(self, colunas):
+        self.colunas = list(colunas)
+        for col_num, value in enumerate(self.colunas):
+            self.worksheet.write(0, col_num, value, self.header_format)
+        self.proxima_linha = 1
+
+    def _escrever_valor(self, linha, coluna, valor):
+        """Escreve uma célula convertendo o valor como o ExcelWriter do pandas"""
+        if valor is None or valor is pd.NaT:
+            return
+        if isinstance(valor, (float, np.floating)):
+            if math.isnan(valor):
+                return
+            if math.isinf(valor):
+                valor = 'inf' if valor > 0 else '-inf'
+                self.worksheet.write_string(linha, coluna, valor)
+                return
+            self.worksheet.write_number(linha, coluna, float(valor))
+        elif isinstance(valor, (bool, np.bool_)):
+            self.worksheet.write_boolean(linha, coluna, bool(valor))
+        elif isinstance(valor, (int, np.integer)):
+            self.worksheet.write_number(linha, coluna, int(valor))
+        elif isinstance(valor, datetime.datetime):
+            self.worksheet.write_datetime(linha, coluna, valor, self.datahora_format)
+        elif isinstance(valor, datetime.date):
+            self.worksheet.write_datetime(linha, coluna, valor, self.data_format)
+        elif isinstance(valor, datetime.timedelta):
+            self.worksheet.write_number(linha, coluna, valor.total_seconds() / 86400)
+        else:
+            self.worksheet.write(linha, coluna, str(valor))
+
+    def _medir_larguras(self, posicao, tamanho):
+        if tamanho > self._larguras.get(posicao, 0):
+            self._larguras[posicao] = tamanho
+
+    def escrever_bloco(self, bloco):
+        """Acrescenta as linhas de um DataFrame à planilha (o primeiro bloco define o cabeçalho)"""
+        if self.colunas is None:
+            self._escrever_cabecalho(bloco.columns)
+
+        # Medir as primeiras linhas para a heurística de largura das colunas
+        if self._linhas_amostra < LINHAS_AMOSTRA_LARGURA:
+            parte = bloco.iloc[:LINHAS_AMOSTRA_LARGURA - self._linhas_amostra]
+            for i in range(min(parte.shape[1], COLUNAS_AJUSTE_LARGURA)):
+                if len(parte) > 0:
+                    self._medir_larguras(i, parte.iloc[:, i].astype(str).map(len).max())
+            self._linhas_amostra += len(parte)
+
+        # Converter coluna a coluna para tipos Python evita o custo de iterrows
+        valores_colunas = [bloco[col].tolist() for col in bloco.columns]
+        for valores_linha in zip(*valores_colunas):
+            for coluna, valor in enumerate(valores_linha):
+                self._escrever_valor(self.proxima_linha, coluna, valor)
+            self.proxima_linha += 1
+
+    def escrever_linhas(self, colunas, linhas):
+        """
+        Acrescenta linhas já em tipos Python (sequências na ordem de colunas), sem passar
+        por um DataFrame. O primeiro lote define o cabeçalho.
+        """
+        if self.colunas is None:
+            self._escrever_cabecalho(colunas)
+
+        for valores_linha in linhas:
+            if self._linhas_amostra < LINHAS_AMOSTRA_LARGURA:
+                for i, valor in enumerate(valores_linha[:COLUNAS_AJUSTE_LARGURA]):
+                    self._medir_larguras(i, len(str(valor)))
+                self._linhas_amostra += 1
+            for coluna, valor in enumerate(valores_linha):
+                self._escrever_valor(self.proxima_linha, coluna, valor)
+            self.proxima_linha += 1
+
+    def nova_planilha(self, sheet_name):
+        """
+        Termina a planilha atual (larguras das colunas) e passa a escrever em outra planilha
+        do mesmo arquivo, com cabeçalho e heurística de largura próprios.
+        """
+        if self.colunas is None:
+            self._escrever_cabecalho([])
+        self._ajustar_larguras()
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        self.colunas = None
+        self.proxima_linha = 0
+        self._larguras = {}
+        self._linhas_amostra = 0
+
+    def escrever_resumo(self, resumo, sheet_name='Resumo'):
+        """Grava um DataFrame pequeno (ex.: resumo_grupos.ResumoGrupos.tabela) em uma nova planilha"""
+        self.nova_planilha(sheet_name)
+        self.escrever_bloco(resumo)
+
+    def _ajustar_larguras(self):
+        """Ajusta a largura das primeiras 100 colunas com base nas primeiras 100 linhas"""
+        for i, col in enumerate(self.colunas[:COLUNAS_AJUSTE_LARGURA]):
+            max_len = max(self._larguras.get(i, 0), len(str(col))) + 2
+            self.worksheet.set_column(i, i, max_len)
+
+    def fechar(self):
+        """Aplica as larguras de coluna e finaliza o arquivo"""
+        if self.colunas is None:
+            self._escrever_cabecalho([])
+        self._ajustar_larguras()
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fechar()
+        return False
+
+def escrever_resultado_xlsx(df_result, output_path, sheet_name='GDU', tamanho_bloco=5000, resumo=None):
+    """
+    Grava um DataFrame completo com o EscritorXlsx, em fatias de tamanho_bloco linhas
+    (com resumo, um DataFrame gravado na planilha 'Resumo')
+    """
+    with EscritorXlsx(output_path, sheet_name) as escritor:
+        if len(df_result) == 0:
+            escritor.escrever_bloco(df_result)
+        for inicio in range(0, len(df_result), tamanho_bloco):
+            escritor.escrever_bloco(df_result.iloc[inicio:inicio + tamanho_bloco])
+        if resumo is not None:
+            escritor.escrever_resumo(resumo)
+
+def acrescentar_linhas_xlsx(escritor, colunas, linhas, colunas_extras, tamanho_bloco=5000):
+    """
+    Acrescenta ao escritor linhas lidas sem DataFrame (ver leitura.py) com as colunas
+    calculadas (nome -> array do mesmo tamanho das linhas). Uma coluna calculada com o nome
+    de uma coluna existente a substitui na mesma posição, como a atribuição df[nome] = valores.
+    Chamado uma vez por bloco no processamento em streaming (mesmas colunas em todos).
+    """
+    colunas_saida = list(colunas)
+    substituidas = {}
+    acrescentadas = []
+    for nome, valores in colunas_extras.items():
+        valores = valores.tolist() if hasattr(valores, 'tolist') else list(valores)
+        if nome in colunas:
+            substituidas[colunas.index(nome)] = valores
+        else:
+            colunas_saida.append(nome)
+            acrescentadas.append(valores)
+
+    escritor.escrever_linhas(colunas_saida, [])
+    for inicio in range(0, len(linhas), tamanho_bloco):
+        bloco = []
+        for i, linha in enumerate(linhas[inicio:inicio + tamanho_bloco], start=inicio):
+            linha = linha + [valores[i] for valores in acrescentadas]
+            for posicao, valores in substituidas.items():
+                linha[posicao] = valores[i]
+            bloco.append(linha)
+        escritor.escrever_linhas(colunas_saida, bloco)
+
+def escrever_linhas_xlsx(colunas, linhas, colunas_extras, output_path, sheet_name='GDU', tamanho_bloco=5000,
+                         resumo=None):
+    """
+    Grava linhas lidas sem DataFrame com as colunas calculadas (ver acrescentar_linhas_xlsx)
+    e, com resumo, um DataFrame na planilha 'Resumo'
+    """
+    with EscritorXlsx(output_path, sheet_name) as escritor:
+        acrescentar_linhas_xlsx(escritor, colunas, linhas, colunas_extras, tamanho_bloco)
+        if resumo is not None:
+            escritor.escrever_resumo(resumo)
+
+def _colunas_para_parquet(df):
+    """Colunas com tipos misturados (ex.: datas e textos) viram texto: o Parquet exige um tipo por coluna"""
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ('mixed', 'mixed-integer'):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+def escrever_tabela(tabela, colunas_extras, output_path, formato='xlsx', resumo=None):
+    """
+    Grava a tabela lida (ver leitura.Tabela) com as colunas calculadas no formato pedido.
+    As colunas originais, inclusive as de data, saem com os valores lidos. O resumo por
+    grupo (DataFrame), se houver, vai para a planilha 'Resumo' (só no xlsx).
+    """
+    if formato == 'xlsx' and tabela.df is None:
+        escrever_linhas_xlsx(tabela.colunas, tabela.linhas, colunas_extras, output_path, resumo=resumo)
+        return
+
+    df = tabela.para_dataframe()
+    for nome, valores in colunas_extras.items():
+        df[nome] = valores
+
+    if formato == 'xlsx':
+        escrever_resultado_xlsx(df, output_path, resumo=resumo)
+    elif formato == 'csv':
+        df.to_csv(output_path, index=False, sep=tabela.separador, decimal=',' if tabela.separador == ';' else '.')
+    elif formato == 'parquet':
+        try:
+            _colunas_para_parquet(df).to_parquet(output_path, index=False)
+        except ImportError as e:
+            raise ValueError('Gravação de arquivos Parquet requer o pacote pyarrow (extra "parquet" do projeto)') from e
+    else:
+        raise ValueError(f"Formato de saída não suportado: {formato}")
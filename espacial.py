@@ -0,0 +1,116 @@
+"""
+Resolução de estações climáticas a partir de coordenadas (latitude e longitude) das linhas.
+
+O índice espacial guarda as estações como vetores unitários em 3D, calculados uma vez. Uma
+coluna de coordenadas é resolvida em lote: as coordenadas distintas (poucas por planilha de
+ensaio) são comparadas com todas as estações por um produto matricial em blocos, e as k mais
+próximas de cada uma são escolhidas pela similaridade (a ordem do produto escalar é a mesma
+da distância sobre a esfera). Cada linha herda o resultado da sua coordenada.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from leitura import ler_numeros
+
+RAIO_TERRA_KM = 6371.0
+
+# Potência do inverso da distância na média ponderada das k estações mais próximas
+POTENCIA_IDW = 2
+
+# Distância mínima considerada (km): uma estação no mesmo ponto domina a média sem dividir por zero
+DISTANCIA_MINIMA_KM = 0.001
+
+# Elementos da matriz coordenadas x estações calculados por vez (limita a memória)
+ELEMENTOS_POR_BLOCO = 1 << 22
+
+def _vetores_unitarios(latitudes, longitudes):
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def ler_coordenadas(valores, limite):
+    """
+    Converte uma coluna de latitudes ou longitudes para float (aceita vírgula decimal).
+    Valores vazios, ilegíveis ou fora de [-limite, limite] viram NaN.
+    """
+    numeros = ler_numeros(valores)
+    numeros[np.abs(numeros) > limite] = np.nan
+    return numeros
+
+class IndiceEspacial:
+    """Estações com coordenadas conhecidas e a busca das k mais próximas de cada ponto"""
+
+    def __init__(self, codigos, latitudes, longitudes):
+        self.codigos = np.asarray(codigos, dtype=np.int64)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.vetores = _vetores_unitarios(self.latitudes, self.longitudes)
+
+    @classmethod
+    def from_dataframe(cls, coordenadas_df, clima_index):
+        """
+        Monta o índice a partir de um DataFrame (estacao, latitude, longitude). Estações que não
+        existem na base climática são ignoradas com um aviso.
+        """
+        codigos = clima_index.codigos_estacoes(coordenadas_df['estacao'])
+        latitudes = ler_coordenadas(coordenadas_df['latitude'], 90)
+        longitudes = ler_coordenadas(coordenadas_df['longitude'], 180)
+        validas = (codigos >= 0) & ~np.isnan(latitudes) & ~np.isnan(longitudes)
+        for nome in coordenadas_df['estacao'][~validas]:
+            print(f"Coordenadas da estação '{nome}' ignoradas (estação fora da base ou coordenadas inválidas)")
+        return cls(codigos[validas], latitudes[validas], longitudes[validas])
+
+    def __len__(self):
+        return len(self.codigos)
+
+    @property
+    def versao(self):
+        """Impressão digital das estações e coordenadas, usada nas chaves de cache de resultado"""
+        sha = hashlib.sha256()
+        for array in (self.codigos, self.latitudes, self.longitudes):
+            sha.update(np.ascontiguousarray(array).tobytes())
+        return sha.hexdigest()[:16]
+
+    def vizinhos(self, latitudes, longitudes, k=1):
+        """
+        Códigos das k estações mais próximas de cada ponto, da mais próxima para a mais distante,
+        e as distâncias em km; arrays (n, k). Pontos sem coordenadas válidas recebem código -1.
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        k = max(1, min(int(k), len(self)))
+        codigos = np.full((len(latitudes), k), -1, dtype=np.int64)
+        distancias = np.full((len(latitudes), k), np.nan)
+        validos = ~(np.isnan(latitudes) | np.isnan(longitudes))
+        if not len(self) or not validos.any():
+            return codigos, distancias
+
+        # Cada coordenada distinta é resolvida uma vez (o par vira um número complexo para o factorize)
+        inversos, pontos = pd.factorize(latitudes[validos] + 1j * longitudes[validos])
+        vetores = _vetores_unitarios(pontos.real, pontos.imag)
+        posicoes = np.empty((len(pontos), k), dtype=np.int64)
+        similaridades = np.empty((len(pontos), k))
+        passo = max(1, ELEMENTOS_POR_BLOCO // len(self))
+        for inicio in range(0, len(pontos), passo):
+            similaridade = vetores[inicio:inicio + passo] @ self.vetores.T
+            if k < len(self):
+                candidatas = np.argpartition(-similaridade, k - 1, axis=1)[:, :k]
+            else:
+                candidatas = np.broadcast_to(np.arange(len(self)), similaridade.shape)
+            valores = np.take_along_axis(similaridade, candidatas, axis=1)
+            ordem = np.argsort(-valores, axis=1, kind='stable')
+            posicoes[inicio:inicio + passo] = np.take_along_axis(candidatas, ordem, axis=1)
+            similaridades[inicio:inicio + passo] = np.take_along_axis(valores, ordem, axis=1)
+
+        # Distância sobre a esfera a partir da corda entre os vetores unitários
+        corda = np.sqrt(np.clip(2.0 - 2.0 * similaridades, 0.0, 4.0))
+        distancias_pontos = 2 * RAIO_TERRA_KM * np.arcsin(np.minimum(corda / 2, 1.0))
+        codigos[validos] = self.codigos[posicoes][inversos]
+        distancias[validos] = distancias_pontos[inversos]
+        return codigos, distancias
+
+def pesos_idw(distancias, potencia=POTENCIA_IDW):
+    """Pesos do inverso da distância (não normalizados; a média ponderada os normaliza)"""
+    return 1.0 / np.power(np.maximum(distancias, DISTANCIA_MINIMA_KM), potencia)
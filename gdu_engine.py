@@ -0,0 +1,396 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from datas import normalizar_datas
+
+
+def calcular_gdu_diario(temp_min, temp_max):
+    """GDU diário: média das temperaturas mínima e máxima menos a base de 10°C."""
+    return ((temp_min + temp_max) / 2) - 10
+
+
+def para_datetime64(datas):
+    """Converte uma coluna de datas (Series, lista ou array) para um array datetime64[ns]."""
+    # Datas já convertidas não passam de novo pelo pd.to_datetime, que percorre os valores
+    if pd.api.types.is_datetime64_dtype(getattr(datas, 'dtype', None)):
+        return np.asarray(datas, dtype='datetime64[ns]')
+    return pd.to_datetime(pd.Series(datas)).to_numpy(dtype='datetime64[ns]')
+
+
+def converter_datas(valores, coluna=None):
+    """
+    Converte os valores brutos de uma coluna de datas para datetime64[ns] (ver
+    datas.normalizar_datas): datas, números de série do Excel e textos DD/MM/AAAA ou ISO.
+    Ausentes ou inválidas viram NaT.
+    """
+    return normalizar_datas(valores, coluna).datas
+
+
+# Situação de cada linha na busca da data em que um GDU alvo é atingido (ClimaIndex.data_para_gdu)
+ALVO_INVALIDO = -1
+ALVO_NAO_ATINGIDO = 0
+ALVO_ATINGIDO = 1
+
+# Texto da coluna de resultado quando o alvo não é atingido dentro da base climática
+TEXTO_ALVO_NAO_ATINGIDO = 'não atingido na base climática'
+
+# Deslocamento do código da estação nos ordinais do índice: o ordinal guardado é
+# codigo * DESLOCAMENTO_ESTACAO + dia, o que mantém as estações em faixas contíguas e ordenadas
+DESLOCAMENTO_ESTACAO = 1 << 32
+
+
+def nome_estacao(valor):
+    """Nome de uma estação como texto, sem espaços nas pontas"""
+    if isinstance(valor, float) and valor.is_integer():
+        # Códigos numéricos lidos do Excel chegam como float (101.0)
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def chave_estacao(valor):
+    """Forma normalizada do nome de uma estação (nomes que só diferem na caixa são a mesma)"""
+    return nome_estacao(valor).casefold()
+
+
+def datas_para_ordinais(datas):
+    """
+    Converte datas para ordinais de dia (dias desde 1970-01-01).
+    Retorna o array de ordinais (int64) e a máscara de datas válidas.
+    """
+    valores = para_datetime64(datas)
+    validas = ~np.isnat(valores)
+    # A conversão para dias trunca o horário, como o antigo data.date()
+    ordinais = valores.astype('datetime64[D]').astype(np.int64)
+    ordinais[~validas] = 0
+    return ordinais, validas
+
+
+class ClimaIndex:
+    """
+    Índice de GDU acumulado sobre o calendário da base climática.
+
+    Regra do intervalo: o GDU entre duas datas é a soma do GDU diário de todos os dias
+    da base climática com data_inicio <= dia <= data_fim (ambos os extremos incluídos).
+    Dias ausentes da base contribuem com zero; um dia presente com GDU NaN torna NaN
+    todo intervalo que o contém.
+
+    Várias estações (cada uma com quantos anos tiver) ficam nos mesmos arrays contíguos,
+    em faixas consecutivas: o ordinal de cada dia leva o código da estação (ver
+    DESLOCAMENTO_ESTACAO). Como uma busca nunca sai da faixa da própria estação, a diferença
+    das somas prefixadas globais é a soma acumulada daquela estação, e intervalos que
+    atravessam a virada do ano são resolvidos pela mesma busca.
+    """
+
+    def __init__(self, ordinais, gdu_diario, temp_min=None, temp_max=None,
+                 acumulado=None, nulos_acumulado=None, estacoes=None):
+        """
+        Recebe arrays por dia já ordenados e sem datas repetidas (ver from_dataframe).
+        Os arrays são usados sem cópia, o que permite arrays mapeados em memória ou
+        em memória compartilhada; as somas prefixadas podem ser passadas já calculadas.
+        estacoes lista os nomes das estações na ordem dos códigos (0, 1, ...).
+        """
+        self.estacoes = tuple(estacoes or ())
+        self._codigos = {chave_estacao(nome): codigo for codigo, nome in enumerate(self.estacoes)}
+        self.ordinais = np.asarray(ordinais, dtype=np.int64)
+        self.gdu_diario = np.asarray(gdu_diario, dtype=np.float64)
+        self.temp_min = None if temp_min is None else np.asarray(temp_min, dtype=np.float64)
+        self.temp_max = None if temp_max is None else np.asarray(temp_max, dtype=np.float64)
+
+        # Somas prefixadas: acumulado[k] = soma dos k primeiros dias
+        if acumulado is None or nulos_acumulado is None:
+            nulos = np.isnan(self.gdu_diario)
+            acumulado = np.concatenate(([0.0], np.cumsum(np.where(nulos, 0.0, self.gdu_diario))))
+            nulos_acumulado = np.concatenate(([0], np.cumsum(nulos, dtype=np.int64)))
+        self.acumulado = np.asarray(acumulado, dtype=np.float64)
+        self.nulos_acumulado = np.asarray(nulos_acumulado, dtype=np.int64)
+
+    @classmethod
+    def from_dataframe(cls, clima_df, col_data='data', col_gdu='gdu_diario', col_estacao='estacao'):
+        """
+        Cria o índice a partir de um DataFrame climático com datas já convertidas.
+        Sem a coluna de GDU diário, ela é calculada a partir de temp_min e temp_max.
+        Com a coluna de estação, cada estação recebe um código na ordem em que aparece
+        (nomes que só diferem na caixa ou em espaços são a mesma estação).
+        """
+        ordinais, validas = datas_para_ordinais(clima_df[col_data])
+        estacoes = None
+        if col_estacao in clima_df.columns:
+            nomes = clima_df[col_estacao].map(nome_estacao)
+            codigos, _ = pd.factorize(nomes.str.casefold())
+            estacoes = nomes.groupby(codigos).first().tolist()
+            ordinais = ordinais + codigos.astype(np.int64) * DESLOCAMENTO_ESTACAO
+        if col_gdu in clima_df.columns:
+            gdu = clima_df[col_gdu]
+        else:
+            gdu = calcular_gdu_diario(clima_df['temp_min'], clima_df['temp_max'])
+
+        tabela = pd.DataFrame({
+            'ordinal': ordinais,
+            'gdu_diario': np.asarray(gdu, dtype=np.float64),
+            'temp_min': clima_df['temp_min'].to_numpy(dtype=np.float64) if 'temp_min' in clima_df else np.nan,
+            'temp_max': clima_df['temp_max'].to_numpy(dtype=np.float64) if 'temp_max' in clima_df else np.nan,
+        })[validas]
+
+        # Em datas repetidas prevalece a última ocorrência, como no antigo clima_gdu_dict
+        tabela = tabela.drop_duplicates('ordinal', keep='last').sort_values('ordinal', kind='stable')
+        return cls(
+            tabela['ordinal'].to_numpy(),
+            tabela['gdu_diario'].to_numpy(),
+            tabela['temp_min'].to_numpy(),
+            tabela['temp_max'].to_numpy(),
+            estacoes=estacoes,
+        )
+
+    def __len__(self):
+        return len(self.ordinais)
+
+    def com_gdu_diario(self, gdu_diario):
+        """Novo índice sobre os mesmos dias com outro GDU diário (ex.: outro método de cálculo)"""
+        return ClimaIndex(self.ordinais, gdu_diario, self.temp_min, self.temp_max, estacoes=self.estacoes)
+
+    def codigos_estacoes(self, valores):
+        """
+        Códigos das estações de uma coluna inteira (nomes comparados sem caixa e sem espaços
+        nas pontas). Cada nome distinto é procurado uma vez; desconhecidos e vazios viram -1.
+        """
+        codigos, distintos = pd.factorize(pd.Series(valores, dtype=object))
+        mapa = np.array([self._codigos.get(chave_estacao(nome), -1) for nome in distintos] + [-1], dtype=np.int64)
+        # O código -1 do factorize (vazio) aponta para o último elemento do mapa
+        return mapa[codigos]
+
+    def cobertura(self):
+        """Primeiro dia, último dia e número de dias da base de cada estação"""
+        codigos = (self.ordinais + DESLOCAMENTO_ESTACAO // 2) // DESLOCAMENTO_ESTACAO
+        dias = self.ordinais - codigos * DESLOCAMENTO_ESTACAO
+        inicios = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]]) if len(codigos) else np.array([], dtype=np.int64)
+        fins = np.r_[inicios[1:], len(codigos)]
+        resumo = []
+        for inicio, fim in zip(inicios, fins):
+            codigo = int(codigos[inicio])
+            resumo.append({
+                'estacao': self.estacoes[codigo] if codigo < len(self.estacoes) else str(codigo),
+                'inicio': str(np.datetime64(int(dias[inicio]), 'D')),
+                'fim': str(np.datetime64(int(dias[fim - 1]), 'D')),
+                'dias': int(fim - inicio),
+            })
+        return resumo
+
+    @property
+    def versao(self):
+        """Impressão digital do conteúdo (datas e GDU diário), usada para invalidar caches de resultado."""
+        if getattr(self, '_versao', None) is None:
+            sha = hashlib.sha256()
+            sha.update(np.ascontiguousarray(self.ordinais).tobytes())
+            sha.update(np.ascontiguousarray(self.gdu_diario).tobytes())
+            sha.update('\x00'.join(self.estacoes).encode('utf-8'))
+            self._versao = sha.hexdigest()[:16]
+        return self._versao
+
+    def gdu_entre_ordinais(self, inicio, fim):
+        """Soma vetorizada do GDU entre ordinais de início e fim (inclusive)."""
+        inicio = np.asarray(inicio, dtype=np.int64)
+        fim = np.asarray(fim, dtype=np.int64)
+        pos_inicio = np.searchsorted(self.ordinais, inicio, side='left')
+        pos_fim = np.searchsorted(self.ordinais, fim, side='right')
+        # Intervalos invertidos (fim antes do início) não acumulam nada
+        pos_fim = np.maximum(pos_fim, pos_inicio)
+
+        gdu = self.acumulado[pos_fim] - self.acumulado[pos_inicio]
+        com_nulos = (self.nulos_acumulado[pos_fim] - self.nulos_acumulado[pos_inicio]) > 0
+        gdu[com_nulos] = np.nan
+        return gdu
+
+    def calcular(self, datas_inicio, datas_fim, estacoes=None):
+        """
+        Calcula dias e GDU acumulado para colunas inteiras de datas.
+        estacoes traz o código da estação de cada linha (ver codigos_estacoes); sem ele todas
+        as linhas usam a estação 0. Todas as estações são resolvidas na mesma busca vetorizada.
+        Retorna (dias, gdu, validas); linhas com alguma data inválida ou estação desconhecida
+        recebem NaN.
+        """
+        dias, validas, ord_inicio, ord_fim = self._ordinais_linhas(datas_inicio, datas_fim, estacoes)
+        gdu = np.full(len(dias), np.nan)
+        if validas.any():
+            gdu[validas] = np.round(self.gdu_entre_ordinais(ord_inicio, ord_fim), 2)
+        return dias, gdu, validas
+
+    def _ordinais_linhas(self, datas_inicio, datas_fim, estacoes=None):
+        """Dias entre as datas, máscara de linhas válidas e ordinais (com a estação) das linhas válidas"""
+        inicio = para_datetime64(datas_inicio)
+        fim = para_datetime64(datas_fim)
+        validas = ~(np.isnat(inicio) | np.isnat(fim))
+        if estacoes is not None:
+            estacoes = np.asarray(estacoes, dtype=np.int64)
+            validas &= estacoes >= 0
+
+        dias = np.full(len(inicio), np.nan)
+        dias[validas] = (fim[validas] - inicio[validas]) // np.timedelta64(1, 'D')
+        ord_inicio = inicio[validas].astype('datetime64[D]').astype(np.int64)
+        ord_fim = fim[validas].astype('datetime64[D]').astype(np.int64)
+        if estacoes is not None:
+            deslocamento = estacoes[validas] * DESLOCAMENTO_ESTACAO
+            ord_inicio += deslocamento
+            ord_fim += deslocamento
+        return dias, validas, ord_inicio, ord_fim
+
+    def calcular_cenarios(self, datas_inicio, datas_fim, gdu_cenarios, estacoes=None, max_bytes=64 * 1024 * 1024):
+        """
+        GDU acumulado de cada linha sob S cenários climáticos: gdu_cenarios é uma matriz (S, dias)
+        com o GDU diário de cada cenário nos mesmos dias do índice (mesma regra de intervalo e de
+        dias NaN). As posições das linhas são buscadas uma vez; cada bloco de cenários ganha suas
+        somas prefixadas e é resolvido por indexação, com blocos dimensionados para max_bytes.
+        Retorna (dias, matriz (linhas, S), validas).
+        """
+        gdu_cenarios = np.atleast_2d(np.asarray(gdu_cenarios, dtype=np.float64))
+        dias, validas, ord_inicio, ord_fim = self._ordinais_linhas(datas_inicio, datas_fim, estacoes)
+        matriz = np.full((len(dias), len(gdu_cenarios)), np.nan)
+        if not validas.any():
+            return dias, matriz, validas
+
+        pos_inicio = np.searchsorted(self.ordinais, ord_inicio, side='left')
+        pos_fim = np.maximum(np.searchsorted(self.ordinais, ord_fim, side='right'), pos_inicio)
+        # Por cenário do bloco: somas prefixadas e contagem de nulos (dias + 1) e o resultado das linhas
+        bytes_por_cenario = 8 * (2 * (len(self) + 1) + 2 * len(ord_inicio))
+        por_bloco = max(1, max_bytes // bytes_por_cenario)
+        linhas = np.flatnonzero(validas)
+        for inicio in range(0, len(gdu_cenarios), por_bloco):
+            bloco = gdu_cenarios[inicio:inicio + por_bloco]
+            nulos = np.isnan(bloco)
+            acumulado = np.zeros((len(bloco), len(self) + 1))
+            np.cumsum(np.where(nulos, 0.0, bloco), axis=1, out=acumulado[:, 1:])
+            nulos_acumulado = np.zeros((len(bloco), len(self) + 1), dtype=np.int64)
+            np.cumsum(nulos, axis=1, out=nulos_acumulado[:, 1:])
+
+            gdu = acumulado[:, pos_fim] - acumulado[:, pos_inicio]
+            gdu[(nulos_acumulado[:, pos_fim] - nulos_acumulado[:, pos_inicio]) > 0] = np.nan
+            matriz[linhas, inicio:inicio + len(bloco)] = np.round(gdu.T, 2)
+        return dias, matriz, validas
+
+    def _acumulado_maximo(self):
+        """Máximo corrente das somas prefixadas: monotônico, permite searchsorted mesmo com dias negativos"""
+        if getattr(self, '_maximo', None) is None:
+            self._maximo = np.maximum.accumulate(self.acumulado)
+        return self._maximo
+
+    def data_para_gdu(self, datas_inicio, alvos, estacoes=None):
+        """
+        Consulta inversa: para cada linha, o primeiro dia em que o GDU acumulado desde
+        data_inicio (inclusive, mesma regra de calcular) chega a alvo (um número ou um array).
+        estacoes são os códigos de estação por linha (None = estação padrão).
+        Retorna (datas, situacao): datas datetime64[D] (NaT sem resposta) e situacao com
+        ALVO_ATINGIDO, ALVO_NAO_ATINGIDO (o alvo cai depois do último dia da estação na base)
+        ou ALVO_INVALIDO (data, alvo ou estação inválidos, ou dia sem GDU antes do alvo).
+        """
+        inicio = para_datetime64(datas_inicio)
+        alvos = np.broadcast_to(np.asarray(alvos, dtype=np.float64), inicio.shape)
+        codigos = np.zeros(len(inicio), dtype=np.int64) if estacoes is None else np.asarray(estacoes, dtype=np.int64)
+        validas = ~np.isnat(inicio) & (alvos > 0) & (codigos >= 0)
+
+        datas = np.full(len(inicio), np.datetime64('NaT'), dtype='datetime64[D]')
+        situacao = np.full(len(inicio), ALVO_INVALIDO, dtype=np.int8)
+        if not validas.any():
+            return datas, situacao
+
+        codigos = codigos[validas]
+        pos_inicio = np.searchsorted(
+            self.ordinais, inicio[validas].astype('datetime64[D]').astype(np.int64) + codigos * DESLOCAMENTO_ESTACAO
+        )
+        # Fim (exclusivo) da faixa da estação de cada linha
+        limite = np.searchsorted(self.ordinais, codigos * DESLOCAMENTO_ESTACAO + DESLOCAMENTO_ESTACAO // 2)
+        meta = self.acumulado[pos_inicio] + alvos[validas]
+
+        # Primeira posição em que a soma prefixada chega à meta; o máximo corrente só erra quando
+        # um trecho anterior ao início já passou da meta (dias negativos), e essas linhas são refeitas
+        pos = np.searchsorted(self._acumulado_maximo(), meta, side='left')
+        refazer = np.flatnonzero((pos <= pos_inicio) & (pos_inicio < limite))
+        for i in refazer:
+            trecho = self.acumulado[pos_inicio[i] + 1:limite[i] + 1] >= meta[i]
+            pos[i] = pos_inicio[i] + 1 + np.argmax(trecho) if trecho.any() else len(self.acumulado)
+
+        atingido = (pos > pos_inicio) & (pos <= limite)
+        fim_busca = np.minimum(pos, limite)
+        com_nulos = (self.nulos_acumulado[fim_busca] - self.nulos_acumulado[pos_inicio]) > 0
+
+        resultado = np.where(com_nulos, ALVO_INVALIDO, np.where(atingido, ALVO_ATINGIDO, ALVO_NAO_ATINGIDO))
+        situacao[validas] = resultado
+        dias_atingidos = np.full(len(pos), np.datetime64('NaT'), dtype='datetime64[D]')
+        ok = resultado == ALVO_ATINGIDO
+        # O dia em que a meta é atingida é o último dia somado (posição pos - 1)
+        ordinais_dia = self.ordinais[pos[ok] - 1] - codigos[ok] * DESLOCAMENTO_ESTACAO
+        dias_atingidos[ok] = ordinais_dia.astype('datetime64[D]')
+        datas[validas] = dias_atingidos
+        return datas, situacao
+
+    def calcular_ponderado(self, datas_inicio, datas_fim, estacoes, pesos):
+        """
+        Como calcular, com o GDU de cada linha sendo a média ponderada do GDU de várias estações:
+        estacoes e pesos são matrizes (linhas, k). Estações com código -1 ou GDU NaN no intervalo
+        ficam fora da média; a linha só fica sem GDU se nenhuma estação o tiver.
+        """
+        estacoes = np.asarray(estacoes, dtype=np.int64)
+        pesos = np.asarray(pesos, dtype=np.float64)
+        inicio = para_datetime64(datas_inicio)
+        fim = para_datetime64(datas_fim)
+        validas = ~(np.isnat(inicio) | np.isnat(fim)) & (estacoes >= 0).any(axis=1)
+
+        dias = np.full(len(inicio), np.nan)
+        gdu = np.full(len(inicio), np.nan)
+        if validas.any():
+            dias[validas] = (fim[validas] - inicio[validas]) // np.timedelta64(1, 'D')
+            ord_inicio = inicio[validas].astype('datetime64[D]').astype(np.int64)
+            ord_fim = fim[validas].astype('datetime64[D]').astype(np.int64)
+            soma = np.zeros(len(ord_inicio))
+            soma_pesos = np.zeros(len(ord_inicio))
+            # Uma busca vetorizada por vizinho (k é pequeno), cada uma sobre todas as linhas
+            for codigos, pesos_vizinho in zip(estacoes[validas].T, pesos[validas].T):
+                deslocamento = np.maximum(codigos, 0) * DESLOCAMENTO_ESTACAO
+                gdu_vizinho = self.gdu_entre_ordinais(ord_inicio + deslocamento, ord_fim + deslocamento)
+                usar = (codigos >= 0) & ~np.isnan(gdu_vizinho)
+                soma[usar] += pesos_vizinho[usar] * gdu_vizinho[usar]
+                soma_pesos[usar] += pesos_vizinho[usar]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                gdu[validas] = np.round(np.where(soma_pesos > 0, soma / soma_pesos, np.nan), 2)
+        return dias, gdu, validas
+
+
+def calcular_gdu_colunas(clima_index, datas_plantio, datas_sfwd, datas_pfwd=None, estacoes=None, pesos=None):
+    """
+    Calcula as colunas de resultado (dias, gdu_acumulado e, se houver PFWD,
+    dias_pfwd e gdu_acumulado_pfwd) em uma única passada vetorizada.
+    estacoes são os códigos de estação por linha (None = estação padrão); com pesos,
+    estacoes e pesos são matrizes (linhas, k) e o GDU é a média ponderada das k estações.
+    Retorna um dicionário {nome_coluna: array} e as máscaras de linhas válidas.
+    """
+    calcular = clima_index.calcular if pesos is None else \
+        (lambda inicio, fim, codigos: clima_index.calcular_ponderado(inicio, fim, codigos, pesos))
+    dias, gdu, validas = calcular(datas_plantio, datas_sfwd, estacoes)
+    colunas = {'dias': dias, 'gdu_acumulado': gdu}
+    mascaras = {'sfwd': validas}
+
+    if datas_pfwd is not None:
+        dias_pfwd, gdu_pfwd, validas_pfwd = calcular(datas_plantio, datas_pfwd, estacoes)
+        colunas['dias_pfwd'] = dias_pfwd
+        colunas['gdu_acumulado_pfwd'] = gdu_pfwd
+        mascaras['pfwd'] = validas_pfwd
+
+    return colunas, mascaras
+
+
+def calcular_data_alvo_colunas(clima_index, datas_plantio, alvos, estacoes=None):
+    """
+    Colunas da consulta inversa para uma planilha: data_gdu_alvo (data em que o GDU alvo é
+    atingido, ou TEXTO_ALVO_NAO_ATINGIDO) e dias_ate_gdu_alvo. Retorna as colunas e a situação
+    de cada linha (ver ClimaIndex.data_para_gdu).
+    """
+    inicio = para_datetime64(datas_plantio)
+    datas, situacao = clima_index.data_para_gdu(inicio, alvos, estacoes)
+    atingido = situacao == ALVO_ATINGIDO
+
+    coluna_datas = np.full(len(datas), None, dtype=object)
+    coluna_datas[atingido] = datas[atingido].tolist()
+    coluna_datas[situacao == ALVO_NAO_ATINGIDO] = TEXTO_ALVO_NAO_ATINGIDO
+    dias = np.full(len(datas), np.nan)
+    dias[atingido] = (datas[atingido] - inicio[atingido].astype('datetime64[D]')) // np.timedelta64(1, 'D')
+    return {'data_gdu_alvo': coluna_datas, 'dias_ate_gdu_alvo': dias}, situacao
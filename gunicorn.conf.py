@@ -0,0 +1,19 @@
+# Configuração do gunicorn (carregada automaticamente a partir do diretório do projeto)
+
+# Carrega a aplicação no processo mestre antes do fork: os workers herdam o
+# índice climático já publicado em memória compartilhada
+preload_app = True
+
+def on_starting(server):
+    """Publica o índice climático em memória compartilhada antes de criar os workers"""
+    from clima_base import publicar_clima_compartilhado
+    nome = publicar_clima_compartilhado()
+    server.log.info(f"Índice climático compartilhado: {nome}")
+
+def post_worker_init(worker):
+    """Registra o uso de memória de cada worker após a inicialização"""
+    from memory_profile import log_memory_usage
+    log_memory_usage()
+    # A thread de vencimento dos resultados só roda nos workers (o mestre apenas importa a aplicação)
+    from main import armazem_resultados
+    armazem_resultados.iniciar()
@@ -0,0 +1,232 @@
+import json
+import os
+import re
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metricas import JOB_DURACAO, JOB_ESPERA
+
+# Estados possíveis de um job
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Intervalo de releitura do estado gravado ao aguardar um job de outro worker (segundos)
+INTERVALO_CONSULTA_DISCO = 1.0
+
+class FilaCheia(Exception):
+    """Levantada quando a fila já tem o número máximo de jobs pendentes"""
+
+class Job:
+    """Um lote de arquivos enviado pelo usuário e processado em segundo plano"""
+
+    def __init__(self, job_id, arquivos):
+        self.id = job_id
+        self.arquivos = list(arquivos)
+        self.estado = QUEUED
+        self.criado_em = time.time()
+        self.iniciado_em = None
+        self.concluido_em = None
+        self.resultado = None
+        self.erro = None
+        # Último evento de progresso publicado e o número de mudanças do job (estado ou progresso)
+        self.progresso = None
+        self.seq = 0
+
+    def to_dict(self):
+        """Representação serializável do job, com os tempos de espera e de execução"""
+        agora = time.time()
+        espera = (self.iniciado_em or agora) - self.criado_em
+        execucao = None
+        if self.iniciado_em is not None:
+            execucao = (self.concluido_em or agora) - self.iniciado_em
+        return {
+            'job_id': self.id,
+            'estado': self.estado,
+            'arquivos': self.arquivos,
+            'criado_em': self.criado_em,
+            'iniciado_em': self.iniciado_em,
+            'concluido_em': self.concluido_em,
+            'espera_s': round(espera, 3),
+            'execucao_s': None if execucao is None else round(execucao, 3),
+            'resultado': self.resultado,
+            'erro': self.erro,
+            'progresso': self.progresso,
+            'seq': self.seq,
+        }
+
+class FilaJobs:
+    """
+    Fila de processamento com um pool limitado de threads.
+
+    No máximo max_simultaneos jobs executam ao mesmo tempo e no máximo max_pendentes
+    ficam na fila ou em execução; acima disso criar() levanta FilaCheia. O estado de cada
+    job é gravado em jobs_folder, para que qualquer worker do gunicorn consiga consultá-lo.
+    """
+
+    def __init__(self, jobs_folder, max_simultaneos=2, max_pendentes=20, ttl=3600):
+        self.jobs_folder = jobs_folder
+        self.max_simultaneos = max_simultaneos
+        self.max_pendentes = max_pendentes
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Acorda quem aguarda mudanças de jobs deste worker (aguardar)
+        self._mudou = threading.Condition()
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        # Criado sob demanda: threads não sobrevivem ao fork do gunicorn --preload
+        self._executor = None
+        os.makedirs(jobs_folder, exist_ok=True)
+
+    def _obter_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_simultaneos, thread_name_prefix='gdu-job'
+                )
+            return self._executor
+
+    def _caminho(self, job_id):
+        return os.path.join(self.jobs_folder, f"{job_id}.json")
+
+    def _salvar(self, job):
+        """Grava o estado do job de forma atômica"""
+        destino = self._caminho(job.id)
+        temporario = f"{destino}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(job.to_dict(), f, ensure_ascii=False)
+            os.replace(temporario, destino)
+        except Exception as e:
+            print(f"Erro ao gravar estado do job {job.id}: {e}")
+
+    def _notificar(self, job):
+        """Registra uma mudança do job: grava o estado e acorda quem o aguarda"""
+        with self._mudou:
+            job.seq += 1
+            self._mudou.notify_all()
+        self._salvar(job)
+
+    def criar(self, arquivos):
+        """Reserva uma vaga na fila e registra um job no estado 'queued'"""
+        if not self._vagas.acquire(blocking=False):
+            raise FilaCheia(f"Fila cheia: {self.max_pendentes} jobs pendentes")
+
+        self._limpar_antigos()
+        job = Job(uuid.uuid4().hex, arquivos)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._salvar(job)
+        return job
+
+    def iniciar(self, job, func, *args, **kwargs):
+        """Enfileira a execução de func(*args, **kwargs) para o job; o retorno vira o resultado"""
+        self._obter_executor().submit(self._executar, job, func, args, kwargs)
+
+    def cancelar(self, job, erro):
+        """Marca como falho um job criado que não chegou a ser iniciado e libera sua vaga"""
+        job.estado = FAILED
+        job.erro = erro
+        job.concluido_em = time.time()
+        self._salvar(job)
+        self._vagas.release()
+
+    def publicar_progresso(self, job, evento):
+        """Guarda o último evento de progresso do job (ver progresso.Progresso)"""
+        job.progresso = evento
+        self._notificar(job)
+
+    def _executar(self, job, func, args, kwargs):
+        job.estado = RUNNING
+        job.iniciado_em = time.time()
+        self._notificar(job)
+        print(f"Job {job.id} iniciado após {job.iniciado_em - job.criado_em:.2f}s na fila")
+        JOB_ESPERA.observar(job.iniciado_em - job.criado_em)
+        try:
+            job.resultado = func(*args, **kwargs)
+            job.estado = DONE
+        except Exception as e:
+            print(f"Erro no job {job.id}: {e}")
+            print(traceback.format_exc())
+            job.erro = str(e)
+            job.estado = FAILED
+        finally:
+            job.concluido_em = time.time()
+            self._notificar(job)
+            self._vagas.release()
+            print(f"Job {job.id} finalizado ({job.estado}) em {job.concluido_em - job.iniciado_em:.2f}s")
+            JOB_DURACAO.observar(job.concluido_em - job.iniciado_em, estado=job.estado)
+
+    def obter(self, job_id):
+        """Retorna o estado do job como dicionário, ou None se ele não existir"""
+        if not _JOB_ID_RE.match(job_id):
+            return None
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+
+        # Job de outro worker: consultar o estado gravado em disco
+        try:
+            with open(self._caminho(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def aguardar(self, job_id, seq=None, timeout=15.0):
+        """
+        Espera até timeout segundos o job mudar de estado ou publicar progresso depois da
+        mudança seq e retorna o estado (None se o job não existir). Jobs de outro worker são
+        acompanhados pelo estado gravado em disco.
+        """
+        if not _JOB_ID_RE.match(job_id):
+            return None
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            with self._mudou:
+                self._mudou.wait_for(lambda: job.seq != seq, timeout)
+            return job.to_dict()
+
+        limite = time.monotonic() + timeout
+        while True:
+            estado = self.obter(job_id)
+            if estado is None or estado.get('seq') != seq or time.monotonic() >= limite:
+                return estado
+            time.sleep(min(INTERVALO_CONSULTA_DISCO, max(limite - time.monotonic(), 0)))
+
+    def estatisticas(self):
+        """Contagem de jobs deste worker por estado"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        contagem = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for job in jobs:
+            contagem[job.estado] += 1
+        contagem['max_simultaneos'] = self.max_simultaneos
+        contagem['max_pendentes'] = self.max_pendentes
+        return contagem
+
+    def _limpar_antigos(self):
+        """Esquece jobs deste worker finalizados há mais de ttl segundos"""
+        limite = time.time() - self.ttl
+        with self._lock:
+            antigos = [
+                job_id for job_id, job in self._jobs.items()
+                if job.concluido_em is not None and job.concluido_em < limite
+            ]
+            for job_id in antigos:
+                del self._jobs[job_id]
+
+        for job_id in antigos:
+            try:
+                os.remove(self._caminho(job_id))
+            except OSError:
+                pass
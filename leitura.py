@@ -0,0 +1,245 @@
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Valores de célula tratados como ausentes, equivalentes ao na_values usado na leitura
+NA_VALUES = {'NA', 'N/A', 'n/a', 'na', '', 'null', 'NULL', 'None', 'none'}
+
+def _nome_coluna(valor, posicao):
+    """Normaliza o nome de uma coluna do cabeçalho como o pandas faria"""
+    if valor is None:
+        return f"Unnamed: {posicao}"
+    return valor if isinstance(valor, str) else str(valor)
+
+def nomes_colunas(cabecalho):
+    """
+    Monta os nomes das colunas a partir da linha de cabeçalho: descarta células vazias
+    no final e renomeia repetidos como o pandas ('Col', 'Col.1', 'Col.2', ...).
+    """
+    cabecalho = list(cabecalho)
+    while cabecalho and cabecalho[-1] is None:
+        cabecalho.pop()
+
+    colunas = []
+    contagem = {}
+    for posicao, valor in enumerate(cabecalho):
+        nome = _nome_coluna(valor, posicao)
+        atual = contagem.get(nome, 0)
+        while atual > 0:
+            contagem[nome] = atual + 1
+            nome = f"{nome}.{atual}"
+            atual = contagem.get(nome, 0)
+        contagem[nome] = atual + 1
+        colunas.append(nome)
+    return colunas
+
+def normalizar_linha(valores, num_colunas):
+    """Ajusta a linha ao tamanho do cabeçalho e converte valores ausentes em NaN"""
+    linha = list(valores[:num_colunas])
+    if len(linha) < num_colunas:
+        linha.extend([None] * (num_colunas - len(linha)))
+    return [
+        np.nan if v is None or (isinstance(v, str) and v in NA_VALUES) else v
+        for v in linha
+    ]
+
+# Textos booleanos reconhecidos pelo pd.read_excel: colunas só com eles viram True/False
+VALORES_BOOLEANOS = {'True': True, 'TRUE': True, 'true': True, 'False': False, 'FALSE': False, 'false': False}
+
+def _ausente(valor):
+    return isinstance(valor, float) and valor != valor
+
+def _booleano(valor):
+    return isinstance(valor, str) and valor in VALORES_BOOLEANOS
+
+def colunas_booleanas(linhas, num_colunas):
+    """
+    Posições das colunas cujas células preenchidas são todas texto booleano ('true', 'FALSE',
+    ...), que o pd.read_excel e o pd.read_csv convertem em True/False. A decisão vale para a
+    coluna inteira: as linhas (lista ou iterador) são percorridas uma vez, até o fim ou até
+    nenhuma coluna ainda poder ser booleana.
+    """
+    possiveis = set(range(num_colunas))
+    preenchidas = set()
+    for linha in linhas:
+        for posicao in list(possiveis):
+            valor = linha[posicao]
+            if _ausente(valor):
+                continue
+            if _booleano(valor):
+                preenchidas.add(posicao)
+            else:
+                possiveis.discard(posicao)
+        if not possiveis:
+            break
+    return sorted(possiveis & preenchidas)
+
+def colunas_booleanas_xlsx(filepath):
+    """colunas_booleanas da primeira planilha, em uma passada de leitura sem guardar as linhas"""
+    with LeitorXlsx(filepath) as leitor:
+        return colunas_booleanas(leitor.linhas(), len(leitor.colunas))
+
+def converter_booleanos(linhas, posicoes):
+    """Converte em True/False, nas próprias linhas, as colunas booleanas (ver colunas_booleanas)"""
+    for posicao in posicoes:
+        for linha in linhas:
+            if not _ausente(linha[posicao]):
+                linha[posicao] = VALORES_BOOLEANOS[linha[posicao]]
+    return linhas
+
+# Formatos aceitos na entrada e na saída
+FORMATOS = ('xlsx', 'csv', 'parquet')
+EXTENSOES = {'.xlsx': 'xlsx', '.xlsm': 'xlsx', '.csv': 'csv', '.txt': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}
+
+def detectar_formato(filepath, nome_original=None):
+    """
+    Identifica o formato do arquivo: primeiro pelos bytes iniciais (xlsx é um zip, Parquet
+    começa com PAR1), depois pela extensão do nome original. Retorna None se desconhecido.
+    """
+    with open(filepath, 'rb') as f:
+        inicio = f.read(4)
+    if inicio == b'PAR1':
+        return 'parquet'
+    if inicio.startswith(b'PK'):
+        return 'xlsx'
+    extensao = os.path.splitext(nome_original or filepath)[1].lower()
+    return EXTENSOES.get(extensao)
+
+class LeitorXlsx:
+    """
+    Lê a primeira planilha de um arquivo Excel em uma única passada (openpyxl read-only),
+    linha a linha e sem inferência de tipos: cada célula chega como o openpyxl a entrega
+    (número, texto, data), apenas com os valores ausentes convertidos em NaN.
+    """
+
+    def __init__(self, filepath):
+        self.workbook = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            sheet = self.workbook.worksheets[0]
+            # As dimensões gravadas no arquivo podem estar erradas; ler até a última linha real
+            sheet.reset_dimensions()
+            self._linhas = sheet.iter_rows(values_only=True)
+            cabecalho = next(self._linhas, None)
+        except Exception:
+            self.workbook.close()
+            raise
+        self.colunas = nomes_colunas(cabecalho) if cabecalho is not None else []
+
+    def linhas(self):
+        """
+        Produz as linhas de dados (listas do tamanho do cabeçalho). Linhas vazias no final
+        da planilha são descartadas, como no pd.read_excel; as intermediárias são mantidas.
+        """
+        num_colunas = len(self.colunas)
+        vazias_pendentes = 0
+        for valores in self._linhas:
+            if all(v is None for v in valores):
+                # Só mantém linhas vazias intermediárias (seguidas de dados)
+                vazias_pendentes += 1
+                continue
+            while vazias_pendentes:
+                yield [np.nan] * num_colunas
+                vazias_pendentes -= 1
+            yield normalizar_linha(valores, num_colunas)
+
+    def fechar(self):
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.fechar()
+        return False
+
+def ler_linhas_xlsx(filepath):
+    """
+    Lê a planilha inteira como (colunas, linhas), sem montar um DataFrame (colunas de texto
+    booleano convertidas por converter_booleanos)
+    """
+    with LeitorXlsx(filepath) as leitor:
+        linhas = list(leitor.linhas())
+        return leitor.colunas, converter_booleanos(linhas, colunas_booleanas(linhas, len(leitor.colunas)))
+
+def extrair_coluna(linhas, posicao):
+    """Valores de uma coluna das linhas lidas, para converter só o que o cálculo precisa"""
+    return [linha[posicao] for linha in linhas]
+
+def ler_numeros(valores):
+    """Converte uma coluna para float aceitando vírgula decimal; vazios e ilegíveis viram NaN"""
+    serie = pd.Series(valores, dtype=object)
+    textos = serie.map(lambda valor: valor.strip().replace(',', '.') if isinstance(valor, str) else valor)
+    return pd.to_numeric(textos, errors='coerce').to_numpy(dtype=np.float64)
+
+def detectar_separador(filepath, encoding):
+    """Separador do CSV pelo cabeçalho: ';' (exportações em português, com vírgula decimal) ou ','"""
+    with open(filepath, 'r', encoding=encoding) as f:
+        cabecalho = f.readline()
+    return ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+
+def ler_csv(filepath):
+    """
+    Lê um CSV com o leitor colunar do pandas, usando os mesmos valores ausentes da leitura
+    de planilhas. Retorna (DataFrame, separador).
+    """
+    for encoding in ('utf-8-sig', 'latin-1'):
+        try:
+            separador = detectar_separador(filepath, encoding)
+            df = pd.read_csv(
+                filepath, sep=separador, decimal=',' if separador == ';' else '.', encoding=encoding,
+                keep_default_na=False, na_values=sorted(NA_VALUES),
+            )
+            return df, separador
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Não foi possível identificar a codificação do arquivo {filepath}")
+
+def ler_parquet(filepath):
+    """Lê um arquivo Parquet (requer o pacote pyarrow)"""
+    try:
+        return pd.read_parquet(filepath)
+    except ImportError as e:
+        raise ValueError('Leitura de arquivos Parquet requer o pacote pyarrow (extra "parquet" do projeto)') from e
+
+class Tabela:
+    """
+    Conteúdo de um arquivo enviado. Planilhas xlsx ficam em linhas, como foram lidas e sem
+    inferência de tipos; CSV e Parquet ficam no DataFrame dos leitores colunares do pandas.
+    """
+
+    def __init__(self, colunas, linhas=None, df=None, separador=','):
+        self.colunas = list(colunas)
+        self.linhas = linhas
+        self.df = df
+        # Separador do CSV de origem, reaproveitado quando o resultado também é CSV
+        self.separador = separador
+
+    def __len__(self):
+        return len(self.df) if self.df is not None else len(self.linhas)
+
+    def valores(self, nome):
+        """Valores de uma coluna, para converter só o que o cálculo precisa"""
+        if self.df is not None:
+            return self.df[nome]
+        return extrair_coluna(self.linhas, self.colunas.index(nome))
+
+    def para_dataframe(self):
+        """DataFrame com as colunas originais (sem copiar os dados quando já é um DataFrame)"""
+        if self.df is not None:
+            return self.df.copy(deep=False)
+        return pd.DataFrame(self.linhas, columns=self.colunas)
+
+def ler_tabela(filepath, formato):
+    """Lê um arquivo enviado no formato indicado (xlsx, csv ou parquet)"""
+    if formato == 'xlsx':
+        colunas, linhas = ler_linhas_xlsx(filepath)
+        return Tabela(colunas, linhas=linhas)
+    if formato == 'csv':
+        df, separador = ler_csv(filepath)
+        return Tabela(df.columns, df=df, separador=separador)
+    if formato == 'parquet':
+        df = ler_parquet(filepath)
+        return Tabela(df.columns, df=df)
+    raise ValueError(f"Formato de arquivo não suportado: {formato}")
@@ -1,419 +1,405 @@
-from flask import Flask, render_template, request, send_file, flash, after_this_request
+from flask import Flask, render_template, request, send_file, jsonify, url_for, Response, stream_with_context
 import pandas as pd
 import os
 import xlsxwriter
-import datetime
 import shutil
 import time
+import json
 import threading
 from pathlib import Path
-import gc
+
+from armazem_resultados import ArmazemResultados
+from api_gdu import (EntradaInvalida, calcular_datas_alvo, calcular_pares, iter_linhas_stream, iter_ndjson,
+                     iter_resultado_ndjson, ler_json_alvo, ler_json_colunar)
+from cache_resultados import CacheResultados, salvar_com_hash
+from cenarios import SAIDAS, calcular_cenarios, ler_cenarios
+from clima_base import obter_clima_index, obter_indice_espacial
+from jobs import DONE, FAILED, FilaCheia, FilaJobs
+from leitura import FORMATOS
+from metodos_gdu import METODO_PADRAO, indice_para_metodo, listar_metodos, obter_metodo
+from metricas import CONTENT_TYPE, REGISTRO, REQUISICAO_SEGUNDOS, REQUISICOES, Rastreio
+from processamento import processar_lote, valor_alvo
+from resumo_grupos import ler_colunas_grupo
 
 # Nota: Usar engine='openpyxl' diretamente nas chamadas de read_excel
 
 app = Flask(__name__)
 UPLOAD_FOLDER = 'uploads'
 RESULT_FOLDER = 'results'
+JOBS_FOLDER = os.path.join(RESULT_FOLDER, 'jobs')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(RESULT_FOLDER, exist_ok=True)
 
-# Função para limpar arquivos antigos
-def clean_old_files(directory, hours=1):
-    """Limpa arquivos mais antigos que o número de horas especificado"""
-    now = time.time()
-    cutoff_time = now - (hours * 3600)
+# Limites da fila de processamento (configuráveis por variável de ambiente)
+MAX_JOBS_SIMULTANEOS = int(os.environ.get('GDU_MAX_JOBS', 2))
+MAX_JOBS_PENDENTES = int(os.environ.get('GDU_MAX_FILA', 20))
+# Processos usados para calcular os arquivos de um mesmo envio em paralelo (1 = sequencial)
+MAX_PROCESSOS = int(os.environ.get('GDU_PROCESSOS', 1))
+fila_jobs = FilaJobs(JOBS_FOLDER, max_simultaneos=MAX_JOBS_SIMULTANEOS, max_pendentes=MAX_JOBS_PENDENTES)
+
+# Cache de resultados por conteúdo do upload, colunas e versão da base climática
+CACHE_FOLDER = os.path.join(RESULT_FOLDER, 'cache')
+CACHE_MAX_MB = int(os.environ.get('GDU_CACHE_MB', 200))
+cache_resultados = CacheResultados(CACHE_FOLDER, max_bytes=CACHE_MAX_MB * 1024 * 1024)
+
+# Máximo de pares de datas por requisição JSON em /api/gdu (NDJSON não tem limite)
+MAX_PARES_API = int(os.environ.get('GDU_API_MAX_PARES', 200000))
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+# Máximo de estações próximas combinadas por linha na resolução por coordenadas
+MAX_VIZINHOS = int(os.environ.get('GDU_MAX_VIZINHOS', 8))
+
+# Duração máxima de uma conexão de eventos de progresso (o navegador reconecta sozinho);
+# abaixo do timeout padrão do gunicorn, para não prender um worker síncrono
+SSE_DURACAO_MAXIMA = float(os.environ.get('GDU_SSE_MAX_S', 25))
+# Intervalo dos comentários que mantêm a conexão de eventos aberta em proxies
+SSE_KEEPALIVE = 10.0
+# Conexões de eventos simultâneas por worker: cada uma ocupa uma thread do gunicorn enquanto
+# dura, então o limite fica abaixo de --threads; acima dele, a página consulta /jobs/<id>
+SSE_MAX_CONEXOES = int(os.environ.get('GDU_SSE_MAX', 2))
+_conexoes_sse = threading.BoundedSemaphore(SSE_MAX_CONEXOES)
+
+# Resultados dos jobs, cada um na sua pasta, disponíveis para download por GDU_RESULTADOS_TTL
+# segundos e limitados a GDU_RESULTADOS_MB no disco, somados todos os workers (os mais antigos saem
+# antes). A thread de vencimentos é iniciada em cada worker (gunicorn.conf.py) ou no servidor local.
+RESULTADOS_FOLDER = os.path.join(RESULT_FOLDER, 'arquivos')
+RESULTADOS_TTL = int(os.environ.get('GDU_RESULTADOS_TTL', 3600))
+RESULTADOS_MAX_MB = int(os.environ.get('GDU_RESULTADOS_MB', 500))
+armazem_resultados = ArmazemResultados(RESULTADOS_FOLDER, ttl=RESULTADOS_TTL,
+                                       max_bytes=RESULTADOS_MAX_MB * 1024 * 1024)
+# Uma varredura na inicialização; depois disso os vencimentos são agendados por job
+armazem_resultados.varrer_inicial([UPLOAD_FOLDER])
+
+# O índice climático (obter_clima_index) e o espacial (obter_indice_espacial) são resolvidos a
+# cada uso, não na importação: com o gunicorn --preload, o main é importado antes de on_starting
+# publicar o índice em memória compartilhada, e uma referência guardada aqui seria uma segunda
+# cópia no mestre e em cada worker
+
+def calcular_gdu_rapido(data_inicio, data_fim, metodo_gdu=None, estacao=None, cenarios=None):
+    """
+    Calcula o GDU entre duas datas (inclusive) usando o índice acumulado do método e da estação.
+    Com cenarios (texto como "+1, -0.5, 2024"), retorna {nome do cenário: GDU} em vez de um número.
+    """
+    lista_cenarios = None if cenarios is None else ler_cenarios(cenarios)
+    if pd.isna(data_inicio) or pd.isna(data_fim):
+        return float('nan') if lista_cenarios is None else {c.nome: float('nan') for c in lista_cenarios}
     
+    index = indice_para_metodo(obter_clima_index(), metodo_gdu)
+    estacoes = None if estacao is None else index.codigos_estacoes([estacao])
+    if lista_cenarios is not None:
+        matriz = calcular_cenarios(index, [data_inicio], [data_fim], lista_cenarios, metodo_gdu, estacoes)
+        return {cenario.nome: float(gdu) for cenario, gdu in zip(lista_cenarios, matriz[0])}
+    _, gdu, _ = index.calcular([data_inicio], [data_fim], estacoes)
+    return float(gdu[0])
+
+def _enfileirar_upload():
+    """
+    Valida o formulário, salva os arquivos enviados e enfileira o job de processamento.
+    Retorna (job, None) ou (None, (mensagem_erro, status_http)).
+    """
+    uploaded_files = request.files.getlist('files[]')
+    col_plantio = request.form.get('col_plantio', 'Data de Plantio').strip()
+    col_sfwd = request.form.get('col_sfwd', '05. SFWD').strip()
+    col_pfwd = request.form.get('col_pfwd', '06. PFWD').strip()
+    formato_saida = request.form.get('formato_saida', 'xlsx').strip().lower()
+    metodo_gdu = request.form.get('metodo_gdu', METODO_PADRAO).strip()
+    # Coluna opcional com a estação climática de cada linha (vazia = estação padrão)
+    col_estacao = request.form.get('col_estacao', '').strip() or None
+    # Ou colunas de latitude e longitude, resolvidas para a(s) estação(ões) mais próxima(s)
+    col_latitude = request.form.get('col_latitude', '').strip()
+    col_longitude = request.form.get('col_longitude', '').strip()
+    vizinhos = request.form.get('vizinhos_estacao', '1').strip() or '1'
+    # GDU alvo opcional da consulta inversa: um número ou o nome de uma coluna com o alvo de cada linha
+    gdu_alvo = request.form.get('gdu_alvo', '').strip() or None
+    # Cenários climáticos opcionais ("+1, -0.5, 2024") e a forma da saída (resumo ou uma coluna por cenário)
+    texto_cenarios = request.form.get('cenarios', '').strip()
+    saida_cenarios = request.form.get('saida_cenarios', 'resumo').strip() or 'resumo'
+    # Colunas opcionais de agrupamento da planilha 'Resumo' ("Híbrido, Local")
+    texto_resumo = request.form.get('colunas_resumo', '').strip()
+
+    if formato_saida not in FORMATOS:
+        return None, (f'Formato de saída inválido: {formato_saida}. Use xlsx, csv ou parquet.', 400)
+
     try:
-        for item in os.listdir(directory):
-            item_path = os.path.join(directory, item)
-            # Ignora o arquivo .gitkeep
-            if item == '.gitkeep':
-                continue
-                
-            if os.path.isfile(item_path):
-                # Verifica a última modificação do arquivo
-                if os.path.getmtime(item_path) < cutoff_time:
-                    try:
-                        os.remove(item_path)
-                        print(f"Arquivo removido: {item_path}")
-                    except Exception as e:
-                        print(f"Erro ao remover arquivo {item_path}: {e}")
+        obter_metodo(metodo_gdu)
+    except ValueError as e:
+        return None, (str(e), 400)
+
+    coordenadas = None
+    if col_latitude or col_longitude:
+        if not (col_latitude and col_longitude):
+            return None, ('Informe as colunas de latitude e de longitude.', 400)
+        if col_estacao:
+            return None, ('Informe a coluna de estação ou as colunas de coordenadas, não ambas.', 400)
+        if not len(obter_indice_espacial()):
+            return None, ('Nenhuma estação da base climática tem coordenadas cadastradas.', 400)
+        if not vizinhos.isdigit() or not 1 <= int(vizinhos) <= MAX_VIZINHOS:
+            return None, (f'Número de estações próximas inválido: use de 1 a {MAX_VIZINHOS}.', 400)
+        coordenadas = (col_latitude, col_longitude, int(vizinhos))
+
+    if gdu_alvo is not None and valor_alvo(gdu_alvo) is not None and not valor_alvo(gdu_alvo) > 0:
+        return None, ('O GDU alvo deve ser maior que zero.', 400)
+
+    cenarios = None
+    if texto_cenarios:
+        if saida_cenarios not in SAIDAS:
+            return None, (f'Saída de cenários inválida: {saida_cenarios}. Use resumo ou largo.', 400)
+        try:
+            ler_cenarios(texto_cenarios)
+        except ValueError as e:
+            return None, (str(e), 400)
+        cenarios = (texto_cenarios, saida_cenarios)
+
+    try:
+        resumo = ler_colunas_grupo(texto_resumo)
+    except ValueError as e:
+        return None, (str(e), 400)
+    if resumo and formato_saida != 'xlsx':
+        return None, ('O resumo por grupo é gravado em uma planilha: escolha a saída xlsx.', 400)
+
+    if not uploaded_files or uploaded_files[0].filename == '':
+        return None, ('Nenhum arquivo foi selecionado.', 400)
+
+    try:
+        job = fila_jobs.criar([file.filename for file in uploaded_files])
+    except FilaCheia:
+        return None, ('Servidor ocupado: muitos arquivos na fila. Tente novamente em alguns minutos.', 429)
+
+    # Salva os uploads com o id do job no nome, para não colidirem com outros envios
+    arquivos = []
+    rastreio = Rastreio(job=job.id)
+    try:
+        for file in uploaded_files:
+            original_filename = file.filename
+            filepath = os.path.join(UPLOAD_FOLDER, f"{job.id}_{original_filename}")
+            with rastreio.fase('upload'):
+                hash_upload = salvar_com_hash(file, filepath)
+            arquivos.append((filepath, original_filename, hash_upload))
+        rastreio.registrar()
     except Exception as e:
-        print(f"Erro ao limpar diretório {directory}: {e}")
-
-# Configura a limpeza automática de arquivos a cada intervalo
-def schedule_cleanup(interval=3600):  # intervalo em segundos (1 hora)
-    """Agenda a limpeza periódica de arquivos"""
-    while True:
-        clean_old_files(UPLOAD_FOLDER)
-        clean_old_files(RESULT_FOLDER)
-        time.sleep(interval)
-
-# Inicia a thread de limpeza
-cleanup_thread = threading.Thread(target=schedule_cleanup)
-cleanup_thread.daemon = True  # Thread termina quando o programa principal termina
-cleanup_thread.start()
-
-# Base climática fixa
-clima_df = pd.read_excel(
-    'base_clima/temperaturas_2025.xlsx',
-    sheet_name='Fonte  Estação Terra Nova Temp.',
-    engine='openpyxl'
-)
-
-# Garante que datas sejam datetime com formato brasileiro (dayfirst=True)
-clima_df['data'] = pd.to_datetime(clima_df['data'], dayfirst=True)
-
-# Otimizar clima_df para consulta rápida
-print("Otimizando clima_df para consulta rápida...")
-# Pré-calcular GDU diário e indexar por data
-clima_df['gdu_diario'] = ((clima_df['temp_min'] + clima_df['temp_max']) / 2) - 10
-clima_gdu_dict = {}
-for _, row in clima_df.iterrows():
-    clima_gdu_dict[row['data'].date()] = row['gdu_diario']
-
-# Otimizar o cálculo de GDU
-def calcular_gdu_rapido(data_inicio, data_fim):
-    """Calcula o GDU de forma otimizada entre duas datas"""
-    if pd.isna(data_inicio) or pd.isna(data_fim):
-        return float('nan')
-    
-    data_atual = data_inicio.date()
-    data_fim = data_fim.date()
-    gdu_acumulado = 0
-    
-    while data_atual <= data_fim:
-        if data_atual in clima_gdu_dict:
-            gdu_acumulado += clima_gdu_dict[data_atual]
-        data_atual += datetime.timedelta(days=1)
-    
-    return round(gdu_acumulado, 2)
+        print(f"Erro ao salvar arquivos do job {job.id}: {e}")
+        for filepath, _, _ in arquivos:
+            if os.path.exists(filepath):
+                os.remove(filepath)
+        fila_jobs.cancelar(job, str(e))
+        return None, ('Erro ao receber os arquivos enviados.', 500)
+
+    fila_jobs.iniciar(job, _processar_job, arquivos, col_plantio, col_sfwd, col_pfwd,
+                      processos=MAX_PROCESSOS, cache=cache_resultados, formato_saida=formato_saida, job_id=job.id,
+                      metodo_gdu=metodo_gdu, col_estacao=col_estacao, coordenadas=coordenadas, gdu_alvo=gdu_alvo,
+                      cenarios=cenarios, resumo=resumo, progresso=lambda evento: fila_jobs.publicar_progresso(job, evento))
+    print(f"Job {job.id} enfileirado com {len(arquivos)} arquivo(s)")
+    return job, None
+
+def _processar_job(arquivos, *args, job_id, **kwargs):
+    """Processa o lote na pasta de resultados do job e agenda o vencimento dos arquivos gerados"""
+    try:
+        return processar_lote(arquivos, armazem_resultados.pasta_job(job_id), *args, job_id=job_id, **kwargs)
+    finally:
+        armazem_resultados.registrar(job_id)
+
+def _status_job(job_id):
+    """Estado do job com os links de download quando concluído"""
+    estado = fila_jobs.obter(job_id)
+    if estado is None:
+        return None
+    resultado = estado.get('resultado') or {}
+    estado['downloads'] = [
+        url_for('download', job_id=job_id, filename=filename) for filename in resultado.get('filenames', [])
+    ]
+    return estado
+
+# Estado da fila e do cache lido a cada coleta do /metrics
+REGISTRO.medidor('gdu_jobs', 'Jobs deste worker por estado', lambda: {
+    (estado,): quantidade for estado, quantidade in fila_jobs.estatisticas().items()
+    if not estado.startswith('max_')
+}, ('estado',))
+REGISTRO.medidor('gdu_cache_consultas_total', 'Consultas ao cache de resultados deste worker', lambda: {
+    (tipo,): cache_resultados.estatisticas()[tipo] for tipo in ('hits', 'misses')
+}, ('tipo',), tipo='counter')
+REGISTRO.medidor('gdu_resultados_bytes', 'Bytes dos resultados disponíveis para download (todos os workers)',
+                 lambda: armazem_resultados.estatisticas()['bytes'])
+
+@app.context_processor
+def _metodos_template():
+    # Opções de método de GDU do formulário, em todas as renderizações da página
+    return {'metodos': listar_metodos(), 'metodo_padrao': METODO_PADRAO}
+
+@app.before_request
+def _iniciar_cronometro():
+    request.inicio_metricas = time.perf_counter()
+
+@app.after_request
+def _registrar_requisicao(response):
+    # Rotas agrupadas pelo padrão (/jobs/<job_id>), para não criar uma série por job
+    rota = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+    REQUISICOES.inc(rota=rota, status=response.status_code)
+    inicio = getattr(request, 'inicio_metricas', None)
+    if inicio is not None:
+        REQUISICAO_SEGUNDOS.observar(time.perf_counter() - inicio, rota=rota)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Métricas deste worker no formato texto do Prometheus"""
+    return Response(REGISTRO.exportar(), content_type=CONTENT_TYPE)
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
     if request.method == 'POST':
-        uploaded_files = request.files.getlist('files[]')
-        col_plantio = request.form['col_plantio'].strip()
-        col_sfwd = request.form['col_sfwd'].strip()
-        col_pfwd = request.form['col_pfwd'].strip()
-
-        if not uploaded_files or uploaded_files[0].filename == '':
-            return render_template('index.html', 
-                                  status_message='Nenhum arquivo foi selecionado.', 
-                                  status_type='error')
-
-        # Lista para armazenar nomes de arquivos processados
-        processed_filenames = []
-        total_erros = 0
-        total_linhas_validas = 0
-        total_gdu_alto = 0
-        
-        # Processar cada arquivo enviado
-        for file in uploaded_files:
-            try:
-                # Armazena o nome original do arquivo
-                original_filename = file.filename
-                filepath = os.path.join(UPLOAD_FOLDER, original_filename)
-                file.save(filepath)
-                
-                # Verificar tamanho do arquivo e mostrar aviso
-                file_size_kb = os.path.getsize(filepath) / 1024
-                print(f"Arquivo: {original_filename}, Tamanho: {file_size_kb:.2f}KB")
-                
-                # Leitura do arquivo Excel com otimização máxima de memória
-                print(f"Lendo arquivo {original_filename} com otimização de memória...")
-                
-                # Verificar tamanho e usar otimização de tipos de dados se for muito grande
-                if file_size_kb > 250:  # Se for maior que 250KB
-                    print(f"Arquivo grande detectado ({file_size_kb:.2f}KB). Usando leitura otimizada...")
-                    
-                    # Ler o arquivo de uma vez, mas otimizar memória depois
-                    df = pd.read_excel(filepath, engine='openpyxl')
-                    
-                    # Otimizar uso de memória convertendo tipos de dados
-                    for col in df.columns:
-                        if df[col].dtype == 'float64':
-                            df[col] = pd.to_numeric(df[col], downcast='float')
-                        elif df[col].dtype == 'int64':
-                            df[col] = pd.to_numeric(df[col], downcast='integer')
-                        elif df[col].dtype == 'object':
-                            # Converter colunas de texto para categoria quando apropriado
-                            if len(df) > 0 and df[col].nunique() < len(df) / 2:  # Se tiver repetições significativas
-                                df[col] = df[col].astype('category')
-                                
-                    # Forçar liberação de memória
-                    gc.collect(generation=2)
-                else:
-                    # Para arquivos menores, leitura normal
-                    df = pd.read_excel(filepath, engine='openpyxl')
-                    
-                    # Otimizar uso de memória convertendo tipos de dados
-                    for col in df.columns:
-                        if df[col].dtype == 'float64':
-                            df[col] = pd.to_numeric(df[col], downcast='float')
-                        elif df[col].dtype == 'int64':
-                            df[col] = pd.to_numeric(df[col], downcast='integer')
-                
-                df_result = df.copy()
-                erros = 0
-                linhas_validas = 0
-                
-                # Forçar liberação de memória após cópia
-                del df
-                gc.collect(generation=2)
-            except Exception as e:
-                print(f"Erro ao carregar o arquivo {file.filename}: {e}")
-                continue
-        
-            # Verificar se as colunas necessárias existem no DataFrame
-            if col_plantio not in df_result.columns:
-                print(f"Erro: Coluna '{col_plantio}' não encontrada no arquivo {original_filename}")
-                continue
-                
-            if col_sfwd not in df_result.columns:
-                print(f"Erro: Coluna '{col_sfwd}' não encontrada no arquivo {original_filename}")
-                continue
-                
-            # Verificar automaticamente se a coluna PFWD existe e usá-la se existir
-            incluir_pfwd_atual = col_pfwd in df_result.columns
-            if incluir_pfwd_atual:
-                print(f"Coluna '{col_pfwd}' encontrada no arquivo {original_filename}. Incluindo cálculos PFWD.")
-            else:
-                print(f"Coluna '{col_pfwd}' não encontrada no arquivo {original_filename}. Ignorando cálculos PFWD.")
-                
-            # Criar colunas para guardar as datas originais sem modificação
-            df_result[f'{col_plantio}_orig'] = df_result[col_plantio].copy()
-            df_result[f'{col_sfwd}_orig'] = df_result[col_sfwd].copy()
-            if incluir_pfwd_atual:
-                df_result[f'{col_pfwd}_orig'] = df_result[col_pfwd].copy()
-                
-            try:
-                # Processamento otimizado - conversão vetorizada das datas
-                print(f"Convertendo datas de plantio e SFWD para o arquivo {original_filename}...")
-                
-                # Converter todas as datas de uma vez (operação vetorizada)
-                datas_plantio = pd.to_datetime(df_result[col_plantio], dayfirst=True, errors='coerce')
-                datas_sfwd = pd.to_datetime(df_result[col_sfwd], dayfirst=True, errors='coerce')
-                
-                # Inicializar colunas de resultado com NaN
-                df_result['dias'] = float('nan')
-                df_result['gdu_acumulado'] = float('nan')
-                
-                # Criar máscara para linhas com datas válidas
-                mask_validas = ~(pd.isna(datas_plantio) | pd.isna(datas_sfwd))
-                linhas_validas = mask_validas.sum()
-                erros = len(df_result) - linhas_validas
-                
-                # Calcular dias apenas para linhas válidas
-                if linhas_validas > 0:
-                    print(f"Calculando intervalos de dias para {linhas_validas} linhas...")
-                    df_result.loc[mask_validas, 'dias'] = (datas_sfwd[mask_validas] - datas_plantio[mask_validas]).dt.days
-                    
-                    # Processar GDU para cada linha válida - isso ainda precisa ser feito linha por linha
-                    # devido à natureza do filtro de datas no clima_df
-                    print(f"Calculando GDU acumulado para {linhas_validas} linhas...")
-                    
-                    # Processar em lotes de 100 para reduzir uso de memória
-                    batch_size = 100
-                    valid_indices = df_result.index[mask_validas].tolist()
-                    
-                    for start_idx in range(0, len(valid_indices), batch_size):
-                        # Liberar memória a cada lote
-                        if start_idx > 0 and start_idx % 1000 == 0:
-                            print(f"Processados {start_idx} registros. Coletando lixo...")
-                            gc.collect(generation=2)
-                            
-                        batch_indices = valid_indices[start_idx:start_idx + batch_size]
-                        
-                        for i in batch_indices:
-                            data_plantio = datas_plantio[i]
-                            data_sfwd = datas_sfwd[i]
-                            
-                            # Usar a função otimizada em vez do filtro de dataframe
-                            gdu_acumulado = calcular_gdu_rapido(data_plantio, data_sfwd)
-                            df_result.at[i, 'gdu_acumulado'] = gdu_acumulado
-                
-                # Processar PFWD se existir
-                if incluir_pfwd_atual:
-                    print(f"Processando dados de PFWD para o arquivo {original_filename}...")
-                    datas_pfwd = pd.to_datetime(df_result[col_pfwd], dayfirst=True, errors='coerce')
-                    
-                    # Inicializar colunas PFWD com NaN
-                    df_result['dias_pfwd'] = float('nan')
-                    df_result['gdu_acumulado_pfwd'] = float('nan')
-                    
-                    # Criar máscara para linhas PFWD válidas
-                    mask_pfwd_validas = ~(pd.isna(datas_plantio) | pd.isna(datas_pfwd))
-                    
-                    # Calcular dias PFWD apenas para linhas válidas
-                    if mask_pfwd_validas.sum() > 0:
-                        print(f"Calculando intervalos de dias PFWD para {mask_pfwd_validas.sum()} linhas...")
-                        df_result.loc[mask_pfwd_validas, 'dias_pfwd'] = (datas_pfwd[mask_pfwd_validas] - datas_plantio[mask_pfwd_validas]).dt.days
-                        
-                        # Processar GDU PFWD em lotes
-                        valid_pfwd_indices = df_result.index[mask_pfwd_validas].tolist()
-                        
-                        for start_idx in range(0, len(valid_pfwd_indices), batch_size):
-                            # Liberar memória a cada lote
-                            if start_idx > 0 and start_idx % 1000 == 0:
-                                print(f"Processados {start_idx} registros PFWD. Coletando lixo...")
-                                gc.collect(generation=2)
-                                
-                            batch_indices = valid_pfwd_indices[start_idx:start_idx + batch_size]
-                            
-                            for i in batch_indices:
-                                data_plantio = datas_plantio[i]
-                                data_pfwd = datas_pfwd[i]
-                                
-                                # Usar a função otimizada em vez do filtro de dataframe
-                                gdu_pfwd = calcular_gdu_rapido(data_plantio, data_pfwd)
-                                df_result.at[i, 'gdu_acumulado_pfwd'] = gdu_pfwd
-                
-            except Exception as e:
-                # Tratamento de erro global para todo o processamento de dados
-                print(f"Erro durante o processamento de dados do arquivo {original_filename}: {e}")
-                erros = len(df_result)
-                linhas_validas = 0
-            # Restaurar as colunas de datas originais para garantir que não sejam modificadas
-            try:
-                df_result[col_plantio] = df_result[f'{col_plantio}_orig']
-                df_result[col_sfwd] = df_result[f'{col_sfwd}_orig']
-                if incluir_pfwd_atual and f'{col_pfwd}_orig' in df_result.columns:
-                    df_result[col_pfwd] = df_result[f'{col_pfwd}_orig']
-                
-                # Remover as colunas temporárias que não precisamos mais
-                df_result = df_result.drop(columns=[f'{col_plantio}_orig', f'{col_sfwd}_orig'], errors='ignore')
-                if incluir_pfwd_atual and f'{col_pfwd}_orig' in df_result.columns:
-                    df_result = df_result.drop(columns=[f'{col_pfwd}_orig'], errors='ignore')
-                
-                # Verificar se há algum GDU acumulado acima de 1200
-                gdu_alto = df_result[pd.to_numeric(df_result['gdu_acumulado'], errors='coerce') > 1200].shape[0]
-                gdu_pfwd_alto = 0
-                if incluir_pfwd_atual and 'gdu_acumulado_pfwd' in df_result.columns:
-                    gdu_pfwd_alto = df_result[pd.to_numeric(df_result['gdu_acumulado_pfwd'], errors='coerce') > 1200].shape[0]
-                
-                arquivo_gdu_alto = gdu_alto + gdu_pfwd_alto
-            except Exception as e:
-                print(f"Erro ao processar estatísticas do arquivo {original_filename}: {e}")
-                arquivo_gdu_alto = 0
-                
-            total_gdu_alto += arquivo_gdu_alto
-            total_erros += erros
-            total_linhas_validas += linhas_validas
-                
-            # Usa o nome original do arquivo para o resultado
-            output_filename = original_filename
-            output_path = os.path.join(RESULT_FOLDER, output_filename)
-            
-            # Salvar o arquivo com formatação melhorada usando XlsxWriter
-            with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-                df_result.to_excel(writer, index=False, sheet_name='GDU')
-                
-                # Acessar o workbook e o worksheet para formatação
-                workbook = writer.book
-                worksheet = writer.sheets['GDU']
-                
-                # Definir formatos
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#4facfe',
-                    'font_color': 'white',
-                    'border': 1
-                })
-                
-                # Formatar cabeçalhos
-                for col_num, value in enumerate(df_result.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-                    
-                # Ajustar largura das colunas - somente para as primeiras 100 colunas para economizar tempo
-                for i, col in enumerate(df_result.columns[:100]):
-                    # Calcular largura baseada apenas nas primeiras 100 linhas para economizar processamento
-                    sample = df_result.iloc[:100][col].astype(str) if len(df_result) > 100 else df_result[col].astype(str)
-                    max_len = max(sample.map(len).max(), len(str(col))) + 2
-                    worksheet.set_column(i, i, max_len)
-                
-            # Adicionar à lista de arquivos processados
-            processed_filenames.append(output_filename)
-            print(f"Arquivo {original_filename} processado com sucesso e adicionado à lista.")
-            
-            # Forçar coleta de lixo após processamento completo do arquivo
-            gc.collect(generation=2)  # Coleta de lixo mais agressiva
-
-        # Determina a mensagem de status para todos os arquivos processados
-        num_files = len(processed_filenames)
-        print(f"Total de arquivos processados: {num_files}")
-        print(f"Lista de arquivos: {processed_filenames}")
-        
-        if num_files == 0:
-            status_message = 'Erro: nenhum arquivo foi processado.'
-            status_type = 'error'
-        elif total_linhas_validas == 0:
-            status_message = 'Erro: nenhuma linha pôde ser calculada em nenhum arquivo.'
-            status_type = 'error'
-        elif total_erros > 0:
-            status_message = f'Cálculo realizado com alguns erros. {total_linhas_validas} linhas processadas com sucesso, {total_erros} com erro em {num_files} arquivos.'
-            # Adiciona aviso de GDU alto se necessário
-            if total_gdu_alto > 0:
-                status_message += f' ATENÇÃO: {total_gdu_alto} linhas com GDU acima de 1200.'
-            status_type = 'warning'
-        else:
-            status_message = f'Cálculo realizado com sucesso! {total_linhas_validas} linhas processadas em {num_files} arquivos.'
-            # Adiciona aviso de GDU alto se necessário
-            if total_gdu_alto > 0:
-                status_message += f' ATENÇÃO: {total_gdu_alto} linhas com GDU acima de 1200.'
-            status_type = 'success'
-
-        # Limpeza imediata dos arquivos de upload (não são mais necessários)
-        try:
-            for file in uploaded_files:
-                original_filename = file.filename
-                filepath = os.path.join(UPLOAD_FOLDER, original_filename)
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-                    print(f"Arquivo de upload removido: {filepath}")
-        except Exception as e:
-            print(f"Erro ao remover arquivos de upload: {e}")
-            
-        # Renderiza a página com o resultado e links para download
-        return render_template('index.html', 
-                             download_ready=True, 
-                             status_message=status_message, 
-                             status_type=status_type,
-                             filenames=processed_filenames)
+        job, erro = _enfileirar_upload()
+        if erro is not None:
+            mensagem, _ = erro
+            return render_template('index.html', status_message=mensagem, status_type='error')
+
+        # A página acompanha o job e mostra os links de download quando ele terminar
+        return render_template('index.html',
+                             job_id=job.id,
+                             status_message=f'Arquivos recebidos ({len(job.arquivos)}). Processando...',
+                             status_type='warning')
 
     return render_template('index.html')
 
-@app.route('/download/<filename>')
-def download(filename):
-    output_path = os.path.join(RESULT_FOLDER, filename)
+@app.route('/jobs', methods=['GET', 'POST'])
+def jobs():
+    if request.method == 'POST':
+        job, erro = _enfileirar_upload()
+        if erro is not None:
+            mensagem, status_http = erro
+            return jsonify({'erro': mensagem}), status_http
+        return jsonify({
+            'job_id': job.id,
+            'estado': job.estado,
+            'status_url': url_for('job_status', job_id=job.id),
+        }), 202
+
+    return jsonify(fila_jobs.estatisticas())
+
+@app.route('/cache')
+def cache_status():
+    return jsonify(dict(cache_resultados.estatisticas(), resultados=armazem_resultados.estatisticas()))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    estado = _status_job(job_id)
+    if estado is None:
+        return jsonify({'erro': 'Job não encontrado.'}), 404
+    return jsonify(estado)
+
+def _evento_sse(tipo, dados):
+    return f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+@app.route('/jobs/<job_id>/eventos')
+def job_eventos(job_id):
+    """
+    Progresso do job como Server-Sent Events: 'progresso' a cada mudança (estado, arquivo,
+    fase, linhas e tempo restante) e 'fim' com o estado final, que encerra o stream.
+    """
+    if fila_jobs.obter(job_id) is None:
+        return jsonify({'erro': 'Job não encontrado.'}), 404
+    # Sem thread livre para eventos, o EventSource recebe 503, desiste e a página volta à consulta do estado
+    if not _conexoes_sse.acquire(blocking=False):
+        return jsonify({'erro': 'Muitas conexões de eventos; consulte /jobs/<job_id>.'}), 503
+
+    def gerar():
+        yield 'retry: 2000\n\n'
+        seq = None
+        limite = time.monotonic() + SSE_DURACAO_MAXIMA
+        while time.monotonic() < limite:
+            estado = fila_jobs.aguardar(job_id, seq, timeout=min(SSE_KEEPALIVE, max(limite - time.monotonic(), 0)))
+            if estado is None:
+                yield _evento_sse('fim', {'estado': FAILED, 'erro': 'Job não encontrado.'})
+                return
+            if estado['estado'] in (DONE, FAILED):
+                yield _evento_sse('fim', _status_job(job_id))
+                return
+            if estado.get('seq') == seq:
+                yield ': ping\n\n'
+                continue
+            seq = estado.get('seq')
+            yield _evento_sse('progresso', {'estado': estado['estado'], 'arquivos': estado['arquivos'],
+                                            'progresso': estado.get('progresso')})
+
+    resposta = Response(stream_with_context(gerar()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Liberada quando o servidor fecha a resposta, mesmo que o cliente caia antes do primeiro evento
+    resposta.call_on_close(_conexoes_sse.release)
+    return resposta
+
+@app.route('/metodos')
+def metodos():
+    """Métodos de cálculo do GDU disponíveis (nome, base, teto e limites)"""
+    return jsonify({'padrao': METODO_PADRAO, 'metodos': listar_metodos()})
+
+@app.route('/estacoes')
+def estacoes():
+    """Estações da base climática com o período coberto por cada uma e as coordenadas cadastradas"""
+    clima_index = obter_clima_index()
+    indice_espacial = obter_indice_espacial()
+    cobertura = clima_index.cobertura()
+    for codigo, latitude, longitude in zip(indice_espacial.codigos, indice_espacial.latitudes,
+                                           indice_espacial.longitudes):
+        cobertura[codigo].update(latitude=float(latitude), longitude=float(longitude))
+    return jsonify({'padrao': clima_index.estacoes[0] if clima_index.estacoes else None,
+                    'estacoes': cobertura})
+
+@app.route('/api/gdu', methods=['POST'])
+def api_gdu():
+    """
+    Calcula dias e GDU acumulado sem planilhas. Aceita JSON colunar
+    {"plantio": [...], "sfwd": [...], "pfwd": [...], "estacao": [...], "metodo": ...} ou NDJSON
+    (um objeto por linha, com o método em ?metodo=); respostas NDJSON são enviadas em streaming,
+    bloco a bloco.
+    """
+    dados = None if request.mimetype == MIMETYPE_NDJSON else request.get_json(silent=True)
+    metodo_gdu = request.args.get('metodo')
+    if metodo_gdu is None and isinstance(dados, dict):
+        metodo_gdu = dados.get('metodo')
+    try:
+        index = indice_para_metodo(obter_clima_index(), metodo_gdu)
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+    if request.mimetype == MIMETYPE_NDJSON:
+        linhas = iter_ndjson(index, iter_linhas_stream(request.stream))
+        return Response(stream_with_context(linhas), mimetype=MIMETYPE_NDJSON)
+
+    try:
+        plantio, sfwd, pfwd, estacao = ler_json_colunar(dados, MAX_PARES_API)
+    except EntradaInvalida as e:
+        return jsonify({'erro': str(e)}), 400
+
+    resultado = calcular_pares(index, plantio, sfwd, pfwd, estacao)
+    if request.accept_mimetypes.best_match(['application/json', MIMETYPE_NDJSON]) == MIMETYPE_NDJSON:
+        return Response(iter_resultado_ndjson(resultado), mimetype=MIMETYPE_NDJSON)
+    return jsonify(resultado)
+
+@app.route('/api/gdu/alvo', methods=['POST'])
+def api_gdu_alvo():
+    """
+    Consulta inversa: {"plantio": [...], "alvo": 1200 ou [...], "estacao": [...], "metodo": ...}
+    retorna a data em que o GDU acumulado desde cada plantio atinge o alvo.
+    """
+    dados = request.get_json(silent=True)
+    metodo_gdu = request.args.get('metodo')
+    if metodo_gdu is None and isinstance(dados, dict):
+        metodo_gdu = dados.get('metodo')
+    try:
+        index = indice_para_metodo(obter_clima_index(), metodo_gdu)
+        plantio, alvo, estacao = ler_json_alvo(dados, MAX_PARES_API)
+    except (ValueError, EntradaInvalida) as e:
+        return jsonify({'erro': str(e)}), 400
+    return jsonify(calcular_datas_alvo(index, plantio, alvo, estacao))
+
+@app.route('/download/<job_id>/<filename>')
+def download(job_id, filename):
+    # O arquivo continua disponível para novos downloads até vencer (GDU_RESULTADOS_TTL)
+    output_path = armazem_resultados.caminho(job_id, filename)
     
     # Verificar se o arquivo existe
-    if not os.path.exists(output_path):
-        flash('Arquivo não encontrado. Ele pode ter sido removido automaticamente.', 'error')
-        return render_template('index.html', status_message='Arquivo não encontrado.', status_type='error')
-    
-    @after_this_request
-    def cleanup(response):
-        # Tentar excluir o arquivo após o download
-        # Às vezes o arquivo pode estar em uso, então tratamos a exceção
-        try:
-            # Aguarda um pouco para garantir que o download foi concluído
-            def remove_file():
-                time.sleep(5)  # Aguarda 5 segundos
-                if os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                        print(f"Arquivo removido após download: {output_path}")
-                    except Exception as e:
-                        print(f"Erro ao remover arquivo {output_path} após download: {e}")
-            
-            # Inicia uma thread para remover o arquivo
-            thread = threading.Thread(target=remove_file)
-            thread.daemon = True
-            thread.start()
-        except Exception as e:
-            print(f"Erro ao tentar configurar a limpeza do arquivo {output_path}: {e}")
-        return response
+    if output_path is None:
+        return render_template('index.html', status_message='Arquivo não encontrado ou expirado.',
+                               status_type='error'), 404
     
     return send_file(output_path, as_attachment=True)
 
@@ -440,5 +426,6 @@ def clean_all_files():
 if __name__ == '__main__':
     # Limpa todos os arquivos temporários na inicialização
     clean_all_files()
+    armazem_resultados.iniciar()
     print("Aplicação inicializada! Acesse http://localhost:5000 para usar a calculadora de GDU.")
     app.run(debug=True, port=5000)
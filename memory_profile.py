@@ -12,20 +12,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger('memory_monitor')
 
-def log_memory_usage():
-    """Registra o uso atual de memória do processo sem depender de psutil."""
+def uso_memoria():
+    """Uso atual de memória do processo (RSS, VMS) em MB, sem registrar no log; (0, 0) se indisponível."""
     try:
         # Tentativa de usar psutil se disponível
         import psutil
-        process = psutil.Process(os.getpid())
-        mem_info = process.memory_info()
-        
-        # Converter para MB para facilitar a leitura
-        rss_mb = mem_info.rss / (1024 * 1024)
-        vms_mb = mem_info.vms / (1024 * 1024)
-        
-        logger.info(f"Memória: RSS={rss_mb:.2f}MB, VMS={vms_mb:.2f}MB")
-        return rss_mb, vms_mb
+        mem_info = psutil.Process(os.getpid()).memory_info()
+        return mem_info.rss / (1024 * 1024), mem_info.vms / (1024 * 1024)
     except ImportError:
         # Fallback para Linux: ler /proc/self/status
         try:
@@ -39,13 +32,19 @@ def log_memory_usage():
             
             rss_mb = mem_info.get('VmRSS', 0) / 1024  # KB para MB
             vms_mb = mem_info.get('VmSize', 0) / 1024  # KB para MB
-            
-            logger.info(f"Memória (via /proc): RSS={rss_mb:.2f}MB, VMS={vms_mb:.2f}MB")
             return rss_mb, vms_mb
-        except Exception as e:
-            logger.warning(f"Não foi possível obter informações de memória: {e}")
+        except Exception:
             return 0, 0
 
+def log_memory_usage():
+    """Registra o uso atual de memória do processo sem depender de psutil."""
+    rss_mb, vms_mb = uso_memoria()
+    if rss_mb == 0 and vms_mb == 0:
+        logger.warning("Não foi possível obter informações de memória")
+    else:
+        logger.info(f"Memória: RSS={rss_mb:.2f}MB, VMS={vms_mb:.2f}MB")
+    return rss_mb, vms_mb
+
 def monitor_memory(interval=10):
     """Monitora o uso de memória em um intervalo regular."""
     while True:
@@ -0,0 +1,148 @@
+"""
+Métodos de cálculo do GDU diário (temperatura base, teto e limites) e o cache dos índices
+acumulados de cada método.
+
+O método padrão é a fórmula original, ((temp_min + temp_max) / 2) - 10, sem limites: dias
+abaixo da base subtraem. Os demais são calculados de forma vetorizada a partir das
+temperaturas da base climática, uma vez por método, e mantidos em um cache LRU limitado.
+
+Métodos adicionais podem ser registrados pela variável GDU_METODOS, com um JSON como
+{"sorgo": {"base": 8, "teto": 38, "limitar_base": true, "descricao": "Sorgo 8/38 °C"}}.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+METODO_PADRAO = 'padrao'
+
+# Parâmetros da fórmula original (gdu_engine.calcular_gdu_diario), já aplicada na base compilada
+CHAVE_BASE = (10.0, None, False, False)
+
+# Índices derivados mantidos em memória (cada um ocupa poucos KB por ano de base)
+TAMANHO_CACHE_METODOS = int(os.environ.get('GDU_CACHE_METODOS', 8))
+
+class MetodoGDU:
+    """
+    Regra do GDU diário:
+      - base: temperatura base subtraída da média;
+      - teto: temperaturas acima dele são reduzidas ao teto (ex.: 30 °C no método 10/30 do milho);
+      - limitar_base: temperaturas abaixo da base são elevadas à base antes da média;
+      - minimo_zero: o GDU do dia nunca é negativo.
+    """
+
+    def __init__(self, nome, base=10.0, teto=None, limitar_base=False, minimo_zero=False, descricao=''):
+        if teto is not None and teto <= base:
+            raise ValueError(f"Método {nome}: o teto ({teto}) deve ser maior que a base ({base})")
+        self.nome = nome
+        self.base = float(base)
+        self.teto = None if teto is None else float(teto)
+        self.limitar_base = bool(limitar_base)
+        self.minimo_zero = bool(minimo_zero)
+        self.descricao = descricao
+
+    @property
+    def chave(self):
+        """Parâmetros que definem o resultado (dois métodos com a mesma chave calculam o mesmo GDU)"""
+        return (self.base, self.teto, self.limitar_base, self.minimo_zero)
+
+    def gdu_diario(self, temp_min, temp_max):
+        """GDU de cada dia; dias sem temperatura continuam NaN"""
+        temp_min = np.asarray(temp_min, dtype=np.float64)
+        temp_max = np.asarray(temp_max, dtype=np.float64)
+        if self.limitar_base:
+            temp_min = np.maximum(temp_min, self.base)
+            temp_max = np.maximum(temp_max, self.base)
+        if self.teto is not None:
+            temp_min = np.minimum(temp_min, self.teto)
+            temp_max = np.minimum(temp_max, self.teto)
+        gdu = ((temp_min + temp_max) / 2) - self.base
+        if self.minimo_zero:
+            gdu = np.maximum(gdu, 0.0)
+        return gdu
+
+    def to_dict(self):
+        return {
+            'nome': self.nome,
+            'base': self.base,
+            'teto': self.teto,
+            'limitar_base': self.limitar_base,
+            'minimo_zero': self.minimo_zero,
+            'descricao': self.descricao,
+        }
+
+_metodos = OrderedDict()
+
+def registrar_metodo(metodo):
+    """Registra (ou substitui) um método pelo nome"""
+    _metodos[metodo.nome] = metodo
+    return metodo
+
+def obter_metodo(nome=None):
+    """Retorna o método registrado com esse nome (None = padrão) ou levanta ValueError"""
+    nome = METODO_PADRAO if nome is None or nome == '' else nome
+    # Nomes vindos de JSON podem ser listas ou objetos (não hasheáveis): também são desconhecidos
+    if not isinstance(nome, str) or nome not in _metodos:
+        raise ValueError(f"Método de GDU desconhecido: {nome}. Use um de: {', '.join(_metodos)}")
+    return _metodos[nome]
+
+def listar_metodos():
+    return [metodo.to_dict() for metodo in _metodos.values()]
+
+def carregar_metodos_json(texto):
+    """Registra os métodos descritos em um JSON {nome: {base, teto, limitar_base, minimo_zero, descricao}}"""
+    for nome, parametros in json.loads(texto).items():
+        registrar_metodo(MetodoGDU(nome, **parametros))
+
+registrar_metodo(MetodoGDU(
+    METODO_PADRAO, base=10,
+    descricao='Média das temperaturas menos 10 °C, sem limites (dias frios subtraem)',
+))
+registrar_metodo(MetodoGDU(
+    'base10_sem_negativos', base=10, minimo_zero=True,
+    descricao='Média das temperaturas menos 10 °C, com mínimo de zero por dia',
+))
+registrar_metodo(MetodoGDU(
+    'milho_10_30', base=10, teto=30, limitar_base=True,
+    descricao='Milho 10/30 °C: temperaturas limitadas entre 10 e 30 °C antes da média',
+))
+
+if os.environ.get('GDU_METODOS'):
+    try:
+        carregar_metodos_json(os.environ['GDU_METODOS'])
+    except (ValueError, TypeError) as e:
+        print(f"Erro ao carregar métodos de GDU de GDU_METODOS: {e}")
+
+_cache_indices = OrderedDict()
+_cache_lock = threading.Lock()
+
+def indice_para_metodo(clima_index, metodo=None):
+    """
+    Índice acumulado do método sobre a base climática de clima_index. O método padrão usa o
+    próprio índice (o GDU diário da base já segue a fórmula original); os demais são
+    derivados das temperaturas uma vez e guardados em um cache LRU de TAMANHO_CACHE_METODOS.
+    """
+    if not isinstance(metodo, MetodoGDU):
+        metodo = obter_metodo(metodo)
+    if metodo.chave == CHAVE_BASE:
+        return clima_index
+
+    chave = (clima_index.versao, metodo.chave)
+    with _cache_lock:
+        index = _cache_indices.get(chave)
+        if index is not None:
+            _cache_indices.move_to_end(chave)
+            return index
+
+    if clima_index.temp_min is None or clima_index.temp_max is None or np.isnan(clima_index.temp_min).all():
+        raise ValueError(f"A base climática não tem temperaturas para calcular o método {metodo.nome}")
+    index = clima_index.com_gdu_diario(metodo.gdu_diario(clima_index.temp_min, clima_index.temp_max))
+
+    with _cache_lock:
+        _cache_indices[chave] = index
+        _cache_indices.move_to_end(chave)
+        while len(_cache_indices) > TAMANHO_CACHE_METODOS:
+            _cache_indices.popitem(last=False)
+    return index
@@ -0,0 +1,233 @@
+"""
+Instrumentação por fase do processamento, exportada no formato texto do Prometheus (/metrics).
+
+Cada arquivo processado gera um Rastreio com a duração, as linhas e a variação de RSS de cada
+fase (upload, leitura, datas, gdu, estatisticas, escrita, limpeza). As fases viram histogramas
+e contadores do processo; com GDU_TRACE_LOG definido, cada rastreio também é gravado como uma
+linha JSON nesse arquivo.
+
+As métricas ficam na memória de cada processo: com vários workers do gunicorn, cada coleta
+responde com os números do worker que a atendeu.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+from memory_profile import uso_memoria
+
+# Arquivo opcional com uma linha JSON por arquivo/requisição rastreada
+TRACE_LOG = os.environ.get('GDU_TRACE_LOG')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites dos histogramas (segundos e MB)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BUCKETS_MB = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+def _formatar_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    if float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = list(zip(nomes, valores))
+    if extra is not None:
+        pares.append(extra)
+    if not pares:
+        return ''
+    texto = ','.join(
+        '{}="{}"'.format(nome, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for nome, valor in pares
+    )
+    return '{' + texto + '}'
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos):
+        return tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+
+    def _linhas(self):
+        raise NotImplementedError
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        linhas.extend(self._linhas())
+        return '\n'.join(linhas)
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def _linhas(self):
+        with self._lock:
+            valores = sorted(self._valores.items())
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+                for chave, valor in valores]
+
+class Medidor(_Metrica):
+    """Valor lido por uma função no momento da coleta (gauge, ou counter mantido por outro objeto)"""
+
+    def __init__(self, nome, descricao, funcao, rotulos=(), tipo='gauge'):
+        super().__init__(nome, descricao, rotulos)
+        self.tipo = tipo
+        # funcao() retorna um número ou, com rótulos, um dicionário {tupla de rótulos: valor}
+        self.funcao = funcao
+
+    def _linhas(self):
+        try:
+            valores = self.funcao()
+        except Exception as e:
+            print(f"Erro ao coletar a métrica {self.nome}: {e}")
+            return []
+        if not self.rotulos:
+            valores = {(): valores}
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_formatar_numero(valor)}"
+                for chave, valor in sorted(valores.items())]
+
+class Histograma(_Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nome, descricao, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with self._lock:
+            contagens, soma = self._valores.get(chave, ([0] * len(self.buckets), 0.0))
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    contagens[i] += 1
+                    break
+            self._valores[chave] = (contagens, soma + valor)
+
+    def _linhas(self):
+        with self._lock:
+            valores = sorted((chave, (list(contagens), soma)) for chave, (contagens, soma) in self._valores.items())
+        linhas = []
+        for chave, (contagens, soma) in valores:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, contagens):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, ('le', _formatar_numero(limite)))
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_formatar_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+class Registro:
+    """Conjunto de métricas exportadas juntas no /metrics"""
+
+    def __init__(self):
+        self.metricas = []
+
+    def _adicionar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def contador(self, nome, descricao, rotulos=()):
+        return self._adicionar(Contador(nome, descricao, rotulos))
+
+    def histograma(self, nome, descricao, rotulos=(), buckets=BUCKETS_SEGUNDOS):
+        return self._adicionar(Histograma(nome, descricao, rotulos, buckets))
+
+    def medidor(self, nome, descricao, funcao, rotulos=(), tipo='gauge'):
+        return self._adicionar(Medidor(nome, descricao, funcao, rotulos, tipo))
+
+    def exportar(self):
+        return '\n'.join(metrica.exportar() for metrica in self.metricas) + '\n'
+
+REGISTRO = Registro()
+
+FASE_SEGUNDOS = REGISTRO.histograma(
+    'gdu_fase_duracao_segundos', 'Duração de cada fase do processamento de arquivos', ('fase',))
+FASE_LINHAS = REGISTRO.contador(
+    'gdu_fase_linhas_total', 'Linhas tratadas em cada fase do processamento de arquivos', ('fase',))
+FASE_RSS = REGISTRO.histograma(
+    'gdu_fase_rss_delta_mb', 'Variação do RSS do processo durante cada fase (MB)', ('fase',), BUCKETS_MB)
+ARQUIVOS = REGISTRO.contador(
+    'gdu_arquivos_total', 'Arquivos por resultado (processado, cache, erro)', ('resultado',))
+LINHAS = REGISTRO.contador('gdu_linhas_total', 'Linhas calculadas por tipo (validas, erros)', ('tipo',))
+JOB_ESPERA = REGISTRO.histograma('gdu_job_espera_segundos', 'Tempo dos jobs na fila antes de começar')
+JOB_DURACAO = REGISTRO.histograma(
+    'gdu_job_duracao_segundos', 'Duração dos jobs por estado final', ('estado',))
+REQUISICOES = REGISTRO.contador('gdu_requisicoes_total', 'Requisições HTTP por rota e status', ('rota', 'status'))
+REQUISICAO_SEGUNDOS = REGISTRO.histograma(
+    'gdu_requisicao_duracao_segundos', 'Duração das requisições HTTP (até o início da resposta)', ('rota',))
+REGISTRO.medidor('gdu_processo_rss_mb', 'RSS atual do processo (MB)', lambda: uso_memoria()[0])
+
+class Rastreio:
+    """
+    Fases medidas de um arquivo ou requisição. Os dados ficam em listas e dicionários simples,
+    para voltarem dos processos do pool e serem registrados no processo principal.
+    """
+
+    def __init__(self, observador=None, **contexto):
+        self.contexto = contexto
+        self.fases = []
+        # Chamado com (fase, linhas) no início de cada fase (ex.: Progresso.fase)
+        self.observador = observador
+        # Linhas dos blocos já concluídos (modo streaming): o observador recebe o total do arquivo
+        # até o fim do bloco atual, enquanto as medidas seguem com as linhas do bloco
+        self.linhas_anteriores = 0
+
+    @contextlib.contextmanager
+    def fase(self, nome, linhas=None):
+        """
+        Mede o bloco como a fase nome. O dicionário produzido pode receber 'linhas'
+        quando a contagem só é conhecida no fim da fase.
+        """
+        if self.observador is not None:
+            self.observador(nome, None if linhas is None else self.linhas_anteriores + linhas)
+        medida = {'fase': nome, 'linhas': linhas}
+        rss_inicio = uso_memoria()[0]
+        inicio = time.perf_counter()
+        try:
+            yield medida
+        finally:
+            medida['s'] = round(time.perf_counter() - inicio, 6)
+            medida['rss_delta_mb'] = round(uso_memoria()[0] - rss_inicio, 3)
+            self.fases.append(medida)
+
+    def registrar(self, **contexto):
+        """Acumula as fases nas métricas do processo e, se configurado, grava o trace"""
+        registrar_fases(self.fases, dict(self.contexto, **contexto))
+
+def registrar_fases(fases, contexto=None):
+    """Acumula fases medidas (possivelmente em outro processo) nas métricas deste processo"""
+    for medida in fases:
+        FASE_SEGUNDOS.observar(medida['s'], fase=medida['fase'])
+        FASE_RSS.observar(medida['rss_delta_mb'], fase=medida['fase'])
+        if medida.get('linhas'):
+            FASE_LINHAS.inc(medida['linhas'], fase=medida['fase'])
+    if TRACE_LOG and fases:
+        gravar_trace(dict(contexto or {}, fases=fases))
+
+_trace_lock = threading.Lock()
+
+def gravar_trace(registro, caminho=None):
+    """Acrescenta uma linha JSON ao trace log (falhas só são registradas no console)"""
+    caminho = caminho or TRACE_LOG
+    registro = dict(registro, momento=round(time.time(), 3), pid=os.getpid())
+    try:
+        with _trace_lock, open(caminho, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False, default=str) + '\n')
+    except OSError as e:
+        print(f"Erro ao gravar o trace em {caminho}: {e}")
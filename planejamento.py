@@ -0,0 +1,209 @@
+"""
+Plano de execução de um arquivo pelo orçamento de memória: processar a tabela inteira na
+memória (mais rápido) ou em blocos de linhas lidos e gravados em streaming.
+
+A memória que o arquivo vai ocupar é estimada pelas dimensões da tabela, obtidas sem ler
+os dados (a tag de dimensão da planilha xlsx, uma amostra das primeiras linhas do CSV ou os
+metadados do Parquet; sem elas, pelo tamanho do arquivo), e comparada com o que resta do
+orçamento descontado o RSS atual do processo (memory_profile.uso_memoria). Não é preciso
+forçar coletas do gc: o pico fica limitado pela escolha do caminho e do tamanho do bloco.
+"""
+import os
+import re
+import zipfile
+
+from leitura import detectar_separador
+from memory_profile import uso_memoria
+
+# Orçamento de memória de cada processo (MB). Sem GDU_MEMORIA_MB, usa uma fração do limite
+# do container (cgroup); sem limite conhecido, todo arquivo é processado na memória.
+# Com vários processos ou jobs simultâneos, defina GDU_MEMORIA_MB como o limite dividido entre eles.
+FRACAO_LIMITE_CONTAINER = 0.8
+
+# Memória de pico por célula no processamento completo (bytes), medida com arquivos reais:
+# células do xlsx são objetos Python; CSV e Parquet ficam em colunas do pandas
+BYTES_POR_CELULA = {'xlsx': 80, 'csv': 100, 'parquet': 60}
+
+# Bytes do arquivo por célula, usados quando as dimensões não podem ser lidas (xlsx é comprimido)
+BYTES_ARQUIVO_POR_CELULA = {'xlsx': 3, 'csv': 8, 'parquet': 2}
+
+# Colunas supostas quando só o tamanho do arquivo é conhecido
+COLUNAS_ESTIMADAS = 20
+
+# Fração da memória livre usada por bloco no modo streaming e limites do tamanho do bloco (linhas)
+FRACAO_BLOCO = 0.25
+BLOCO_MINIMO = 1000
+BLOCO_MAXIMO = 50000
+
+# Bytes lidos do início do CSV (tamanho médio das linhas) e do XML da planilha (tag de dimensão)
+AMOSTRA_CSV = 64 * 1024
+AMOSTRA_XLSX = 64 * 1024
+
+# Arquivos dos limites de memória do cgroup (v2 e v1)
+_CGROUP_LIMITES = ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes')
+
+def _limite_container_mb():
+    """Limite de memória do cgroup em MB, ou None se não houver (ou for 'max'/enorme no v1)"""
+    for caminho in _CGROUP_LIMITES:
+        try:
+            with open(caminho, 'r') as f:
+                valor = f.read().strip()
+        except OSError:
+            continue
+        if valor.isdigit() and int(valor) < 1 << 60:
+            return int(valor) / (1024 * 1024)
+        return None
+    return None
+
+def _orcamento_padrao():
+    if os.environ.get('GDU_MEMORIA_MB'):
+        return float(os.environ['GDU_MEMORIA_MB'])
+    limite = _limite_container_mb()
+    return None if limite is None else limite * FRACAO_LIMITE_CONTAINER
+
+ORCAMENTO_MEMORIA_MB = _orcamento_padrao()
+
+def _coluna_para_numero(letras):
+    numero = 0
+    for letra in letras:
+        numero = numero * 26 + ord(letra) - ord('A') + 1
+    return numero
+
+def _xml_primeira_planilha(arquivo_zip):
+    """Caminho no zip da primeira planilha do workbook (ordem de <sheets>, resolvida pelos rels)"""
+    workbook = arquivo_zip.read('xl/workbook.xml').decode('utf-8', 'replace')
+    rels = arquivo_zip.read('xl/_rels/workbook.xml.rels').decode('utf-8', 'replace')
+    primeira = re.search(r'<sheet\b[^>]*\br:id="([^"]+)"', workbook)
+    if primeira is not None:
+        for relacao in re.finditer(r'<Relationship\b[^>]*>', rels):
+            if f'Id="{primeira.group(1)}"' in relacao.group(0):
+                alvo = re.search(r'Target="([^"]+)"', relacao.group(0)).group(1)
+                return alvo.lstrip('/') if alvo.startswith('/') else 'xl/' + alvo
+    return 'xl/worksheets/sheet1.xml'
+
+def _dimensoes_xlsx(filepath):
+    """
+    Linhas e colunas pela tag <dimension> do início da primeira planilha, lida direto do zip
+    (o openpyxl calcularia as dimensões percorrendo a planilha quando a tag falta). Sem a
+    tag, as colunas vêm da primeira linha e as linhas do tamanho do arquivo.
+    """
+    with zipfile.ZipFile(filepath) as arquivo_zip:
+        with arquivo_zip.open(_xml_primeira_planilha(arquivo_zip)) as planilha:
+            inicio = planilha.read(AMOSTRA_XLSX).decode('utf-8', 'replace')
+
+    dimensao = re.search(r'<dimension ref="[A-Z]+\d+:([A-Z]+)(\d+)"', inicio)
+    # Planilhas com a tag 'A1' (ou sem ela) não dizem nada sobre o tamanho
+    if dimensao is not None and int(dimensao.group(2)) > 1:
+        return int(dimensao.group(2)) - 1, _coluna_para_numero(dimensao.group(1))
+
+    primeira_linha = re.search(r'<row\b.*?</row>', inicio, re.S)
+    if primeira_linha is None:
+        return None
+    colunas = max(primeira_linha.group(0).count('<c '), 1)
+    return int(os.path.getsize(filepath) / BYTES_ARQUIVO_POR_CELULA['xlsx'] / colunas), colunas
+
+def _dimensoes_csv(filepath):
+    """Colunas do cabeçalho e linhas estimadas pelo tamanho médio das linhas do início do arquivo"""
+    for encoding in ('utf-8-sig', 'latin-1'):
+        try:
+            separador = detectar_separador(filepath, encoding)
+            with open(filepath, 'r', encoding=encoding) as f:
+                amostra = f.read(AMOSTRA_CSV)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        return None
+    linhas_amostra = amostra.splitlines()
+    if len(linhas_amostra) < 2:
+        return None
+    colunas = linhas_amostra[0].count(separador) + 1
+    bytes_por_linha = len(amostra.encode('utf-8')) / len(linhas_amostra)
+    return int(os.path.getsize(filepath) / bytes_por_linha), colunas
+
+def _dimensoes_parquet(filepath):
+    """Linhas e colunas dos metadados do Parquet (requer pyarrow)"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        return None
+    metadados = pq.read_metadata(filepath)
+    return metadados.num_rows, metadados.num_columns
+
+_SONDAS = {'xlsx': _dimensoes_xlsx, 'csv': _dimensoes_csv, 'parquet': _dimensoes_parquet}
+
+def sondar_dimensoes(filepath, formato):
+    """
+    (linhas, colunas, origem) do arquivo sem ler os dados; origem é 'dimensao' quando veio do
+    próprio arquivo e 'tamanho' quando foi estimada pelo tamanho em bytes.
+    """
+    try:
+        dimensoes = _SONDAS[formato](filepath)
+    except Exception as e:
+        print(f"Não foi possível ler as dimensões de {filepath}: {e}")
+        dimensoes = None
+    if dimensoes is not None:
+        return dimensoes[0], dimensoes[1], 'dimensao'
+    celulas = os.path.getsize(filepath) / BYTES_ARQUIVO_POR_CELULA[formato]
+    return int(celulas / COLUNAS_ESTIMADAS), COLUNAS_ESTIMADAS, 'tamanho'
+
+class PlanoExecucao:
+    """
+    Caminho escolhido para um arquivo: modo 'memoria' (tabela inteira) ou 'streaming'
+    (blocos de tamanho_bloco linhas), com as estimativas que levaram à escolha.
+    """
+
+    def __init__(self, modo, linhas, colunas, estimativa_mb, disponivel_mb, tamanho_bloco=None, origem='dimensao'):
+        self.modo = modo
+        self.linhas = linhas
+        self.colunas = colunas
+        self.estimativa_mb = estimativa_mb
+        self.disponivel_mb = disponivel_mb
+        self.tamanho_bloco = tamanho_bloco
+        self.origem = origem
+
+    @property
+    def streaming(self):
+        return self.modo == 'streaming'
+
+    def __str__(self):
+        disponivel = 'sem limite' if self.disponivel_mb is None else f"{self.disponivel_mb:.0f}MB livres"
+        texto = (f"{self.modo}: ~{self.linhas} linhas x {self.colunas} colunas ({self.origem}), "
+                 f"estimativa {self.estimativa_mb:.1f}MB, {disponivel}")
+        if self.streaming:
+            texto += f", blocos de {self.tamanho_bloco} linhas"
+        return texto
+
+def tamanho_bloco(colunas, formato='xlsx', disponivel_mb=None):
+    """Linhas por bloco que cabem em FRACAO_BLOCO da memória livre (BLOCO_MAXIMO sem orçamento)"""
+    if disponivel_mb is None:
+        return BLOCO_MAXIMO
+    bytes_por_linha = max(colunas, 1) * BYTES_POR_CELULA[formato]
+    linhas = int(max(disponivel_mb, 0) * 1024 * 1024 * FRACAO_BLOCO / bytes_por_linha)
+    return min(max(linhas, BLOCO_MINIMO), BLOCO_MAXIMO)
+
+def memoria_disponivel(orcamento_mb=None):
+    """MB que restam do orçamento descontado o RSS atual do processo (None sem orçamento)"""
+    orcamento_mb = ORCAMENTO_MEMORIA_MB if orcamento_mb is None else orcamento_mb
+    if orcamento_mb is None:
+        return None
+    return orcamento_mb - uso_memoria()[0]
+
+def planejar(filepath, formato, streaming_possivel=True, orcamento_mb=None):
+    """
+    Escolhe o caminho de um arquivo: na memória se a estimativa couber no que resta do
+    orçamento; senão em streaming, quando o formato permite (streaming_possivel). Sem
+    streaming possível, o arquivo segue na memória com um aviso.
+    """
+    linhas, colunas, origem = sondar_dimensoes(filepath, formato)
+    estimativa_mb = linhas * colunas * BYTES_POR_CELULA[formato] / (1024 * 1024)
+    disponivel_mb = memoria_disponivel(orcamento_mb)
+
+    if disponivel_mb is None or estimativa_mb <= disponivel_mb:
+        return PlanoExecucao('memoria', linhas, colunas, estimativa_mb, disponivel_mb, origem=origem)
+    if not streaming_possivel:
+        print(f"Aviso: {filepath} deve ocupar ~{estimativa_mb:.0f}MB com {disponivel_mb:.0f}MB livres no "
+              f"orçamento, mas só planilhas xlsx com saída xlsx podem ser processadas em blocos")
+        return PlanoExecucao('memoria', linhas, colunas, estimativa_mb, disponivel_mb, origem=origem)
+    return PlanoExecucao('streaming', linhas, colunas, estimativa_mb, disponivel_mb,
+                         tamanho_bloco(colunas, formato, disponivel_mb), origem)
@@ -0,0 +1,672 @@
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from cenarios import calcular_cenarios, colunas_cenarios, ler_cenarios
+from clima_base import obter_clima_index, obter_indice_espacial
+from datas import normalizar_datas
+from escrita import EscritorXlsx, acrescentar_linhas_xlsx, escrever_tabela
+from espacial import ler_coordenadas, pesos_idw
+from gdu_engine import ALVO_NAO_ATINGIDO, calcular_data_alvo_colunas, calcular_gdu_colunas, nome_estacao
+from leitura import (LeitorXlsx, Tabela, colunas_booleanas_xlsx, converter_booleanos, detectar_formato, ler_numeros,
+                     ler_tabela)
+from metodos_gdu import indice_para_metodo
+from metricas import ARQUIVOS, LINHAS, Rastreio, registrar_fases
+from planejamento import planejar
+from progresso import Progresso
+from resumo_grupos import ResumoGrupos
+
+_pool = None
+_pool_processos = 0
+_pool_lock = threading.Lock()
+
+def _inicializar_worker():
+    """Carrega o índice climático no processo do pool antes de receber arquivos"""
+    obter_clima_index()
+
+def _obter_pool(processos):
+    """
+    Retorna o pool de processos compartilhado pelos lotes, criado sob demanda.
+    Usa forkserver quando disponível (seguro com as threads do Flask e da fila de jobs);
+    os processos herdam CLIMA_SHM e se anexam ao índice compartilhado, se publicado.
+    """
+    global _pool, _pool_processos
+    with _pool_lock:
+        if _pool is None or _pool_processos != processos:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            metodos = multiprocessing.get_all_start_methods()
+            contexto = multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+            _pool = ProcessPoolExecutor(
+                max_workers=processos, mp_context=contexto, initializer=_inicializar_worker
+            )
+            _pool_processos = processos
+        return _pool
+
+def _processar_arquivo_cronometrado(filepath, original_filename, output_path, col_plantio, col_sfwd, col_pfwd,
+                                    formato_saida='xlsx', metodo_gdu=None, col_estacao=None, coordenadas=None,
+                                    gdu_alvo=None, cenarios=None, resumo=None, observador=None):
+    """
+    Executa processar_arquivo e devolve também a duração e as fases medidas (usado nos
+    processos do pool: as métricas são registradas no processo que recebe o resultado).
+    observador recebe o início de cada fase (só no mesmo processo, ex.: Progresso.fase).
+    """
+    inicio = time.perf_counter()
+    rastreio = Rastreio(observador=observador)
+    contadores = processar_arquivo(filepath, original_filename, output_path, col_plantio, col_sfwd, col_pfwd,
+                                   formato_saida, metodo_gdu, col_estacao, coordenadas, gdu_alvo, cenarios,
+                                   resumo, rastreio=rastreio)
+    return contadores, round(time.perf_counter() - inicio, 3), rastreio.fases
+
+# Linhas com data ilegível listadas por coluna no resultado (as demais só entram no total)
+MAX_LINHAS_FALHA = 20
+
+def _resumo_falhas(falhas):
+    """Total e primeiras linhas (numeradas como no arquivo, com o cabeçalho na linha 1) com data ilegível"""
+    return {'total': int(len(falhas)), 'linhas': [int(i) + 2 for i in falhas[:MAX_LINHAS_FALHA]]}
+
+def _contar_estacoes_desconhecidas(valores, codigos):
+    """Linhas por nome de estação que não existe na base climática (vazias aparecem como '')"""
+    desconhecidas = pd.Series(valores, dtype=object)[codigos < 0].map(
+        lambda valor: '' if pd.isna(valor) else nome_estacao(valor))
+    return desconhecidas.value_counts()
+
+class _Ocorrencias:
+    """
+    Problemas encontrados nas linhas de um arquivo (datas ilegíveis, estações desconhecidas,
+    coordenadas inválidas e alvos não atingidos). No modo streaming são somados bloco a
+    bloco, com as posições de cada bloco deslocadas pela linha em que ele começa.
+    """
+
+    def __init__(self):
+        self.falhas_datas = {}
+        self.estacoes_desconhecidas = None
+        self.coordenadas_invalidas = []
+        self.estacoes_por_coordenada = {}
+        self.alvo_nao_atingido = 0
+
+    def somar_estacoes_desconhecidas(self, contagem):
+        if self.estacoes_desconhecidas is None:
+            self.estacoes_desconhecidas = contagem
+        else:
+            self.estacoes_desconhecidas = self.estacoes_desconhecidas.add(contagem, fill_value=0)
+
+    def somar_estacoes_por_coordenada(self, por_estacao):
+        for nome, total in por_estacao.items():
+            self.estacoes_por_coordenada[nome] = self.estacoes_por_coordenada.get(nome, 0) + total
+
+    def registrar(self, contadores, original_filename):
+        """Acrescenta os resumos aos contadores do arquivo e os mostra no console"""
+        falhas_datas = {}
+        for col, posicoes in self.falhas_datas.items():
+            falhas_datas[col] = _resumo_falhas(np.concatenate(posicoes))
+            print(f"Coluna '{col}' do arquivo {original_filename}: {falhas_datas[col]['total']} data(s) "
+                  f"ilegível(is), linhas {falhas_datas[col]['linhas']}")
+        if falhas_datas:
+            contadores['falhas_datas'] = falhas_datas
+
+        if self.estacoes_desconhecidas is not None:
+            contagem = self.estacoes_desconhecidas.sort_values(ascending=False, kind='stable')
+            contadores['estacoes_desconhecidas'] = {
+                nome: int(total) for nome, total in contagem.head(MAX_LINHAS_FALHA).items()
+            }
+            print(f"Arquivo {original_filename}: {int(contagem.sum())} linha(s) com estação "
+                  f"desconhecida: {contadores['estacoes_desconhecidas']}")
+
+        if self.coordenadas_invalidas:
+            invalidas = np.concatenate(self.coordenadas_invalidas)
+            print(f"Arquivo {original_filename}: estações mais próximas {self.estacoes_por_coordenada}, "
+                  f"{len(invalidas)} linha(s) sem coordenadas válidas")
+            if self.estacoes_por_coordenada:
+                contadores['estacoes_por_coordenada'] = self.estacoes_por_coordenada
+            if len(invalidas):
+                contadores['coordenadas_invalidas'] = _resumo_falhas(invalidas)
+
+        if self.alvo_nao_atingido:
+            contadores['alvo_nao_atingido'] = self.alvo_nao_atingido
+
+def valor_alvo(gdu_alvo):
+    """O GDU alvo como número, ou None quando ele é o nome de uma coluna"""
+    try:
+        return float(str(gdu_alvo).strip().replace(',', '.'))
+    except ValueError:
+        return None
+
+def _resolver_coordenadas(tabela, coordenadas, clima_index):
+    """
+    Estações das linhas a partir das colunas de latitude e longitude: a mais próxima (códigos
+    por linha) ou, com mais de um vizinho, as k mais próximas com pesos do inverso da distância.
+    Retorna (estacoes, pesos, posições sem coordenadas válidas, linhas por estação mais próxima).
+    """
+    col_latitude, col_longitude, vizinhos = coordenadas
+    latitudes = ler_coordenadas(tabela.valores(col_latitude), 90)
+    longitudes = ler_coordenadas(tabela.valores(col_longitude), 180)
+    codigos, distancias = obter_indice_espacial().vizinhos(latitudes, longitudes, vizinhos)
+
+    resolvidas = codigos[:, 0] >= 0
+    contagem = np.bincount(codigos[resolvidas, 0], minlength=len(clima_index.estacoes))
+    por_estacao = {clima_index.estacoes[codigo]: int(total) for codigo, total in enumerate(contagem) if total}
+    if codigos.shape[1] == 1:
+        return codigos[:, 0], None, np.flatnonzero(~resolvidas), por_estacao
+    return codigos, pesos_idw(distancias), np.flatnonzero(~resolvidas), por_estacao
+
+def nome_saida(original_filename, formato_saida):
+    """Nome do arquivo de resultado: o nome enviado com a extensão do formato de saída"""
+    base, extensao = os.path.splitext(original_filename)
+    if extensao.lower() == f'.{formato_saida}':
+        return original_filename
+    return f"{base}.{formato_saida}"
+
+def _registrar_resultado(tarefa, resultado, contexto):
+    """Acumula nas métricas as fases e os contadores de um arquivo; devolve (contadores, duracao)"""
+    contadores, duracao, fases = resultado
+    registrar_fases(fases, dict(contexto or {}, arquivo=tarefa[1], duracao_s=duracao))
+    if contadores is None:
+        ARQUIVOS.inc(resultado='erro')
+    else:
+        ARQUIVOS.inc(resultado='processado')
+        LINHAS.inc(contadores['linhas_validas'], tipo='validas')
+        LINHAS.inc(contadores['erros'], tipo='erros')
+    return contadores, duracao
+
+def _concluir_progresso(progresso, indice, tarefa, resultado):
+    if progresso is not None:
+        contadores, duracao = resultado
+        linhas = 0 if contadores is None else contadores['linhas_validas'] + contadores['erros']
+        progresso.concluir_arquivo(indice, tarefa[1], linhas, duracao)
+
+def executar_tarefas(tarefas, processos=1, contexto=None, progresso=None):
+    """
+    Executa processar_arquivo para cada tarefa (tupla com os argumentos de processar_arquivo)
+    e produz (indice, (contadores, duracao)) à medida que os arquivos terminam.
+    Com processos > 1 e mais de uma tarefa, os arquivos são distribuídos no pool de processos.
+    Um arquivo que falhe inesperadamente é reportado com contadores None, sem interromper os demais.
+    As fases de cada arquivo entram nas métricas deste processo (contexto vai para o trace log).
+    Com um progresso.Progresso, publica o fim de cada arquivo e, sem o pool, também suas fases.
+    """
+    if processos > 1 and len(tarefas) > 1:
+        print(f"Processando {len(tarefas)} arquivos em até {processos} processos...")
+        pool = _obter_pool(processos)
+        futures = {pool.submit(_processar_arquivo_cronometrado, *tarefa): indice for indice, tarefa in enumerate(tarefas)}
+        if progresso is not None:
+            progresso.fase('processando')
+        for future in as_completed(futures):
+            tarefa = tarefas[futures[future]]
+            try:
+                resultado = future.result()
+            except Exception as e:
+                print(f"Erro ao processar o arquivo {tarefa[1]}: {e}")
+                resultado = (None, None, [])
+            resultado = _registrar_resultado(tarefa, resultado, contexto)
+            _concluir_progresso(progresso, futures[future], tarefa, resultado)
+            yield futures[future], resultado
+    else:
+        for indice, tarefa in enumerate(tarefas):
+            if progresso is not None:
+                progresso.iniciar_arquivo(indice, tarefa[1])
+            try:
+                resultado = _processar_arquivo_cronometrado(
+                    *tarefa, observador=progresso.fase if progresso is not None else None
+                )
+            except Exception as e:
+                print(f"Erro ao processar o arquivo {tarefa[1]}: {e}")
+                resultado = (None, None, [])
+            resultado = _registrar_resultado(tarefa, resultado, contexto)
+            _concluir_progresso(progresso, indice, tarefa, resultado)
+            yield indice, resultado
+
+def _verificar_colunas(colunas, original_filename, col_plantio, col_sfwd, col_estacao, coordenadas, gdu_alvo,
+                       resumo=None):
+    """Confere se as colunas configuradas existem no arquivo (mostra o erro e retorna False se não)"""
+    if col_plantio not in colunas:
+        print(f"Erro: Coluna '{col_plantio}' não encontrada no arquivo {original_filename}")
+        return False
+
+    if col_sfwd not in colunas:
+        print(f"Erro: Coluna '{col_sfwd}' não encontrada no arquivo {original_filename}")
+        return False
+
+    if col_estacao and col_estacao not in colunas:
+        print(f"Erro: Coluna de estação '{col_estacao}' não encontrada no arquivo {original_filename}")
+        return False
+
+    if coordenadas and not col_estacao:
+        for col in coordenadas[:2]:
+            if col not in colunas:
+                print(f"Erro: Coluna de coordenada '{col}' não encontrada no arquivo {original_filename}")
+                return False
+        if not len(obter_indice_espacial()):
+            print(f"Erro: nenhuma estação tem coordenadas para resolver as linhas do arquivo {original_filename}")
+            return False
+
+    if gdu_alvo is not None and valor_alvo(gdu_alvo) is None and gdu_alvo not in colunas:
+        print(f"Erro: Coluna de GDU alvo '{gdu_alvo}' não encontrada no arquivo {original_filename}")
+        return False
+
+    for col in resumo or ():
+        if col not in colunas:
+            print(f"Erro: Coluna de agrupamento '{col}' não encontrada no arquivo {original_filename}")
+            return False
+    return True
+
+def _calcular_colunas(tabela, clima_index, col_plantio, col_sfwd, col_pfwd, incluir_pfwd, metodo_gdu, col_estacao,
+                      coordenadas, gdu_alvo, cenarios, rastreio, ocorrencias, original_filename, deslocamento=0):
+    """
+    Calcula as colunas de resultado das linhas da tabela: o arquivo inteiro ou um bloco que
+    começa na linha deslocamento (modo streaming). Os problemas das linhas são somados em
+    ocorrencias. Retorna (colunas_gdu, linhas_validas, erros); com um erro inesperado, o
+    bloco sai sem colunas calculadas e todas as suas linhas contam como erro.
+    """
+    try:
+        # As células originais não são alteradas: só cópias das colunas de data são convertidas
+        with rastreio.fase('datas', len(tabela)):
+            colunas_data = [col_plantio, col_sfwd] + ([col_pfwd] if incluir_pfwd else [])
+            normalizadas = {col: normalizar_datas(tabela.valores(col), col) for col in colunas_data}
+            datas_plantio = normalizadas[col_plantio].datas
+            datas_sfwd = normalizadas[col_sfwd].datas
+            datas_pfwd = normalizadas[col_pfwd].datas if incluir_pfwd else None
+
+        # Células preenchidas que não puderam ser lidas como data (vazias não contam)
+        for col, normalizada in normalizadas.items():
+            if len(normalizada.falhas):
+                ocorrencias.falhas_datas.setdefault(col, []).append(normalizada.falhas + deslocamento)
+
+        # Calcular dias e GDU acumulado de todas as linhas em uma única passada vetorizada
+        with rastreio.fase('gdu', len(tabela)):
+            estacoes = pesos = None
+            if col_estacao:
+                # Cada nome distinto é resolvido uma vez; todas as estações entram na mesma busca
+                valores_estacao = tabela.valores(col_estacao)
+                estacoes = clima_index.codigos_estacoes(valores_estacao)
+                if (estacoes < 0).any():
+                    ocorrencias.somar_estacoes_desconhecidas(_contar_estacoes_desconhecidas(valores_estacao, estacoes))
+            elif coordenadas:
+                # Coordenadas distintas são resolvidas uma vez no índice espacial
+                estacoes, pesos, invalidas, por_estacao = _resolver_coordenadas(tabela, coordenadas, clima_index)
+                ocorrencias.coordenadas_invalidas.append(invalidas + deslocamento)
+                ocorrencias.somar_estacoes_por_coordenada(por_estacao)
+            colunas_gdu, mascaras = calcular_gdu_colunas(clima_index, datas_plantio, datas_sfwd, datas_pfwd,
+                                                         estacoes, pesos)
+
+        if gdu_alvo is not None:
+            # Consulta inversa: data em que o GDU acumulado desde o plantio atinge o alvo
+            with rastreio.fase('alvo', len(tabela)):
+                alvos = valor_alvo(gdu_alvo)
+                if alvos is None:
+                    alvos = ler_numeros(tabela.valores(gdu_alvo))
+                # Na média de várias estações, a data é a da estação mais próxima
+                estacoes_alvo = estacoes[:, 0] if estacoes is not None and estacoes.ndim == 2 else estacoes
+                colunas_alvo, situacao = calcular_data_alvo_colunas(clima_index, datas_plantio, alvos, estacoes_alvo)
+                colunas_gdu.update(colunas_alvo)
+                ocorrencias.alvo_nao_atingido += int((situacao == ALVO_NAO_ATINGIDO).sum())
+
+        if cenarios is not None:
+            # Todos os cenários em uma matriz linhas x cenários (buscas das datas feitas uma vez)
+            with rastreio.fase('cenarios', len(tabela)):
+                texto_cenarios, saida_cenarios = cenarios
+                lista_cenarios = ler_cenarios(texto_cenarios)
+                estacoes_cenarios = estacoes[:, 0] if estacoes is not None and estacoes.ndim == 2 else estacoes
+                matriz = calcular_cenarios(clima_index, datas_plantio, datas_sfwd, lista_cenarios, metodo_gdu,
+                                           estacoes_cenarios)
+                colunas_gdu.update(colunas_cenarios(lista_cenarios, matriz, saida_cenarios))
+
+        linhas_validas = int(mascaras['sfwd'].sum())
+        return colunas_gdu, linhas_validas, len(tabela) - linhas_validas
+
+    except Exception as e:
+        # Tratamento de erro global para todo o processamento de dados
+        print(f"Erro durante o processamento de dados do arquivo {original_filename}: {e}")
+        return {}, 0, len(tabela)
+
+def _nomes_colunas_calculadas(incluir_pfwd, gdu_alvo, cenarios):
+    """Nomes das colunas que _calcular_colunas produz com estas opções, na mesma ordem"""
+    nomes = ['dias', 'gdu_acumulado']
+    if incluir_pfwd:
+        nomes += ['dias_pfwd', 'gdu_acumulado_pfwd']
+    if gdu_alvo is not None:
+        nomes += ['data_gdu_alvo', 'dias_ate_gdu_alvo']
+    if cenarios is not None:
+        texto_cenarios, saida_cenarios = cenarios
+        lista_cenarios = ler_cenarios(texto_cenarios)
+        nomes += list(colunas_cenarios(lista_cenarios, np.full((1, len(lista_cenarios)), np.nan), saida_cenarios))
+    return nomes
+
+def _contar_gdu_alto(colunas_gdu, rastreio, linhas):
+    """Linhas com GDU acumulado (até SFWD ou PFWD) acima de 1200"""
+    gdu_alto = 0
+    with rastreio.fase('estatisticas', linhas):
+        for nome_coluna in ('gdu_acumulado', 'gdu_acumulado_pfwd'):
+            if nome_coluna in colunas_gdu:
+                gdu_alto += int((colunas_gdu[nome_coluna] > 1200).sum())
+    return gdu_alto
+
+def _processar_em_blocos(leitor, tamanho_bloco, output_path, calcular, rastreio, nomes_extras, resumo_grupos=None,
+                         booleanas=()):
+    """
+    Caminho de streaming de processar_arquivo, para planilhas maiores que a memória livre do
+    orçamento: lê tamanho_bloco linhas por vez, calcula o bloco com calcular(tabela, deslocamento)
+    e o acrescenta ao xlsx de resultado, sem manter o arquivo inteiro na memória.
+    nomes_extras são as colunas calculadas do cabeçalho (_nomes_colunas_calculadas), as mesmas
+    em todos os blocos; booleanas são as posições das colunas de texto booleano da planilha
+    inteira (leitura.colunas_booleanas_xlsx). Com um ResumoGrupos, os grupos de cada bloco são
+    somados e o resumo é gravado no fim. Retorna (erros, linhas_validas, gdu_alto).
+    """
+    erros = linhas_validas = gdu_alto = 0
+    inicio = blocos = 0
+    linhas = leitor.linhas()
+    with EscritorXlsx(output_path) as escritor:
+        while True:
+            with rastreio.fase('leitura') as fase:
+                bloco = converter_booleanos(list(itertools.islice(linhas, tamanho_bloco)), booleanas)
+                fase['linhas'] = len(bloco)
+            if not bloco and inicio > 0:
+                break
+
+            tabela = Tabela(leitor.colunas, linhas=bloco)
+            # O progresso das fases do bloco mostra as linhas do arquivo até o fim dele
+            rastreio.linhas_anteriores = inicio
+            colunas_gdu, validas_bloco, erros_bloco = calcular(tabela, inicio)
+            # Um bloco que falhou sai com as colunas acrescentadas vazias (as substituídas mantêm o original)
+            colunas_gdu = {
+                nome: colunas_gdu[nome] if nome in colunas_gdu else np.full(len(bloco), np.nan)
+                for nome in nomes_extras if nome in colunas_gdu or nome not in leitor.colunas
+            }
+            linhas_validas += validas_bloco
+            erros += erros_bloco
+            gdu_alto += _contar_gdu_alto(colunas_gdu, rastreio, len(bloco))
+            if resumo_grupos is not None:
+                with rastreio.fase('resumo', len(bloco)):
+                    resumo_grupos.somar(tabela, colunas_gdu)
+
+            with rastreio.fase('escrita', len(bloco)):
+                acrescentar_linhas_xlsx(escritor, leitor.colunas, bloco, colunas_gdu)
+            inicio += len(bloco)
+            blocos += 1
+            if len(bloco) < tamanho_bloco:
+                break
+
+        if resumo_grupos is not None:
+            with rastreio.fase('escrita'):
+                escritor.escrever_resumo(resumo_grupos.tabela())
+    print(f"{inicio} linhas processadas em {blocos} bloco(s)")
+    return erros, linhas_validas, gdu_alto
+
+def processar_arquivo(filepath, original_filename, output_path, col_plantio, col_sfwd, col_pfwd,
+                      formato_saida='xlsx', metodo_gdu=None, col_estacao=None, coordenadas=None, gdu_alvo=None,
+                      cenarios=None, resumo=None, rastreio=None):
+    """
+    Lê um arquivo enviado (xlsx, CSV ou Parquet), calcula dias e GDU acumulado e grava o
+    resultado em output_path no formato_saida (xlsx, csv ou parquet).
+    Só as colunas de data configuradas são convertidas; as demais células seguem para o
+    resultado como foram lidas (no xlsx, sem inferência de tipos: planilhas largas custam
+    quase o mesmo que as estreitas).
+    O caminho vem de planejamento.planejar: a tabela inteira na memória ou, para planilhas
+    xlsx com saída xlsx que não cabem no orçamento de memória, blocos lidos e gravados em
+    streaming. Os dois caminhos dão os mesmos contadores e as mesmas células (as colunas
+    booleanas são decididas pela planilha inteira antes dos blocos); só um erro inesperado
+    no cálculo difere: na memória o arquivo sai sem as colunas calculadas, em streaming só
+    as linhas do bloco que falhou ficam vazias.
+    metodo_gdu é o nome de um método registrado em metodos_gdu (None = fórmula padrão).
+    col_estacao é a coluna opcional com o nome da estação climática de cada linha; sem ela,
+    coordenadas = (col_latitude, col_longitude, vizinhos) resolve cada linha para a estação mais
+    próxima ou, com vizinhos > 1, para a média ponderada pelo inverso da distância das mais
+    próximas. Sem nenhuma das duas, todas as linhas usam a estação padrão.
+    gdu_alvo (um número ou o nome de uma coluna com o alvo de cada linha) acrescenta a data em
+    que o GDU acumulado desde o plantio atinge o alvo (data_gdu_alvo e dias_ate_gdu_alvo).
+    cenarios = (texto, saida) recalcula o GDU acumulado entre plantio e SFWD em cada cenário de
+    cenarios.ler_cenarios e acrescenta as colunas de resumo ou uma por cenário (saida 'largo').
+    resumo é a lista de colunas de agrupamento da planilha 'Resumo' (ver resumo_grupos; só
+    na saída xlsx).
+    Com um metricas.Rastreio, mede a duração e a memória de cada fase (leitura, datas, gdu,
+    alvo, cenarios, estatisticas, resumo, escrita; no streaming, uma medida de cada por bloco).
+    Retorna os contadores do arquivo (erros, linhas_validas, gdu_alto e, se houver datas ilegíveis,
+    falhas_datas por coluna, estacoes_desconhecidas ou coordenadas_invalidas,
+    estacoes_por_coordenada e alvo_nao_atingido) ou None se ele não pôde ser processado.
+    """
+    clima_index = indice_para_metodo(obter_clima_index(), metodo_gdu)
+    rastreio = rastreio if rastreio is not None else Rastreio()
+
+    try:
+        file_size_kb = os.path.getsize(filepath) / 1024
+        print(f"Arquivo: {original_filename}, Tamanho: {file_size_kb:.2f}KB")
+        formato = detectar_formato(filepath, original_filename)
+        if formato is None:
+            print(f"Erro: formato do arquivo {original_filename} não reconhecido (use xlsx, csv ou parquet)")
+            return None
+        plano = planejar(filepath, formato, streaming_possivel=formato == 'xlsx' and formato_saida == 'xlsx')
+        print(f"Plano de execução de {original_filename}: {plano}")
+        if plano.streaming:
+            leitor = LeitorXlsx(filepath)
+            colunas = leitor.colunas
+        else:
+            print(f"Lendo arquivo {original_filename} ({formato}, somente as colunas de data são convertidas)...")
+            with rastreio.fase('leitura') as fase:
+                tabela = ler_tabela(filepath, formato)
+                fase['linhas'] = len(tabela)
+            colunas = tabela.colunas
+    except Exception as e:
+        print(f"Erro ao carregar o arquivo {original_filename}: {e}")
+        return None
+
+    try:
+        # Verificar se as colunas necessárias existem na planilha
+        if not _verificar_colunas(colunas, original_filename, col_plantio, col_sfwd, col_estacao, coordenadas,
+                                  gdu_alvo, resumo):
+            return None
+
+        # Verificar automaticamente se a coluna PFWD existe e usá-la se existir
+        incluir_pfwd_atual = col_pfwd in colunas
+        if incluir_pfwd_atual:
+            print(f"Coluna '{col_pfwd}' encontrada no arquivo {original_filename}. Incluindo cálculos PFWD.")
+        else:
+            print(f"Coluna '{col_pfwd}' não encontrada no arquivo {original_filename}. Ignorando cálculos PFWD.")
+
+        ocorrencias = _Ocorrencias()
+        resumo_grupos = None
+        if resumo and formato_saida == 'xlsx':
+            resumo_grupos = ResumoGrupos(resumo, incluir_pfwd_atual)
+        elif resumo:
+            print(f"Resumo por grupo ignorado para {original_filename}: a planilha 'Resumo' só existe na saída xlsx")
+
+        def calcular(tabela_linhas, deslocamento=0):
+            return _calcular_colunas(tabela_linhas, clima_index, col_plantio, col_sfwd, col_pfwd, incluir_pfwd_atual,
+                                     metodo_gdu, col_estacao, coordenadas, gdu_alvo, cenarios, rastreio,
+                                     ocorrencias, original_filename, deslocamento)
+
+        if plano.streaming:
+            print(f"Calculando GDU acumulado de {original_filename} em blocos de {plano.tamanho_bloco} linhas...")
+            try:
+                nomes_extras = _nomes_colunas_calculadas(incluir_pfwd_atual, gdu_alvo, cenarios)
+                # Uma passada prévia decide as colunas booleanas pela planilha inteira, como na memória;
+                # sem nenhuma, ela termina logo nas primeiras linhas
+                with rastreio.fase('leitura'):
+                    booleanas = colunas_booleanas_xlsx(filepath)
+                erros, linhas_validas, arquivo_gdu_alto = _processar_em_blocos(
+                    leitor, plano.tamanho_bloco, output_path, calcular, rastreio, nomes_extras, resumo_grupos,
+                    booleanas)
+            except Exception as e:
+                print(f"Erro ao processar em blocos o arquivo {original_filename}: {e}")
+                return None
+        else:
+            print(f"Calculando GDU acumulado para {len(tabela)} linhas...")
+            colunas_gdu, linhas_validas, erros = calcular(tabela)
+
+            # Verificar se há algum GDU acumulado acima de 1200
+            arquivo_gdu_alto = _contar_gdu_alto(colunas_gdu, rastreio, len(tabela))
+
+            tabela_resumo = None
+            if resumo_grupos is not None:
+                # Todos os grupos em uma única agregação sobre os códigos das colunas de grupo
+                with rastreio.fase('resumo', len(tabela)):
+                    resumo_grupos.somar(tabela, colunas_gdu)
+                    tabela_resumo = resumo_grupos.tabela()
+                print(f"Resumo de {original_filename}: {len(tabela_resumo)} grupo(s) por {resumo}")
+
+            # Salvar o resultado no formato pedido (xlsx em streaming, com XlsxWriter constant_memory)
+            try:
+                with rastreio.fase('escrita', len(tabela)):
+                    escrever_tabela(tabela, colunas_gdu, output_path, formato_saida, tabela_resumo)
+            except Exception as e:
+                print(f"Erro ao gravar o resultado do arquivo {original_filename}: {e}")
+                return None
+    finally:
+        if plano.streaming:
+            leitor.fechar()
+
+    print(f"Arquivo {original_filename} processado com sucesso.")
+
+    contadores = {
+        'erros': int(erros),
+        'linhas_validas': int(linhas_validas),
+        'gdu_alto': int(arquivo_gdu_alto),
+    }
+    ocorrencias.registrar(contadores, original_filename)
+    return contadores
+
+def montar_mensagem_status(num_files, total_erros, total_linhas_validas, total_gdu_alto):
+    """Monta a mensagem e o tipo de status exibidos ao usuário para um lote de arquivos"""
+    if num_files == 0:
+        status_message = 'Erro: nenhum arquivo foi processado.'
+        status_type = 'error'
+    elif total_linhas_validas == 0:
+        status_message = 'Erro: nenhuma linha pôde ser calculada em nenhum arquivo.'
+        status_type = 'error'
+    elif total_erros > 0:
+        status_message = f'Cálculo realizado com alguns erros. {total_linhas_validas} linhas processadas com sucesso, {total_erros} com erro em {num_files} arquivos.'
+        # Adiciona aviso de GDU alto se necessário
+        if total_gdu_alto > 0:
+            status_message += f' ATENÇÃO: {total_gdu_alto} linhas com GDU acima de 1200.'
+        status_type = 'warning'
+    else:
+        status_message = f'Cálculo realizado com sucesso! {total_linhas_validas} linhas processadas em {num_files} arquivos.'
+        # Adiciona aviso de GDU alto se necessário
+        if total_gdu_alto > 0:
+            status_message += f' ATENÇÃO: {total_gdu_alto} linhas com GDU acima de 1200.'
+        status_type = 'success'
+    return status_message, status_type
+
+def processar_lote(arquivos, result_folder, col_plantio, col_sfwd, col_pfwd, processos=1, cache=None,
+                   formato_saida='xlsx', job_id=None, metodo_gdu=None, col_estacao=None, coordenadas=None,
+                   gdu_alvo=None, cenarios=None, resumo=None, progresso=None):
+    """
+    Processa uma lista de uploads [(filepath, original_filename, hash_upload), ...] gravando os
+    resultados em result_folder com o nome original e a extensão de formato_saida.
+    Remove os uploads ao final.
+    Com processos > 1 e mais de um arquivo, os arquivos são distribuídos entre processos
+    (leitura, cálculo e escrita são limitados pelo GIL e não escalam com threads).
+    Com um CacheResultados e o hash do upload, resultados já calculados são reaproveitados
+    sem ler nem calcular o arquivo.
+    metodo_gdu escolhe o método de cálculo do GDU (ver metodos_gdu); col_estacao ou
+    coordenadas definem a estação climática de cada linha e gdu_alvo pede a data em que
+    um GDU alvo é atingido, cenarios = (texto, saida) acrescenta o GDU dos cenários climáticos
+    e resumo (colunas de agrupamento) grava a planilha 'Resumo' por grupo (ver processar_arquivo).
+    job_id identifica o envio no trace log de métricas e progresso, se informado, recebe os
+    eventos de progresso.Progresso (arquivo, fase, linhas e tempo restante) durante o lote.
+    Retorna um dicionário com mensagem de status, arquivos gerados e tempos por arquivo.
+    """
+    processed_filenames = []
+    total_erros = 0
+    total_linhas_validas = 0
+    total_gdu_alto = 0
+    tempos = {}
+    falhas_datas = {}
+    estacoes_desconhecidas = {}
+    coordenadas_invalidas = {}
+    alvo_nao_atingido = {}
+    
+    # A resolução das estações entra na chave do cache (com coordenadas, também as das estações)
+    estacao = col_estacao
+    if coordenadas and not col_estacao:
+        estacao = '\x00'.join([*(str(parte) for parte in coordenadas), obter_indice_espacial().versao])
+    
+    resultados = [None] * len(arquivos)
+    chaves = [None] * len(arquivos)
+    tarefas = []
+    for posicao, (filepath, original_filename, hash_upload) in enumerate(arquivos):
+        output_path = os.path.join(result_folder, nome_saida(original_filename, formato_saida))
+        
+        if cache is not None and hash_upload:
+            inicio = time.perf_counter()
+            # A versão do índice do método muda com a base climática e com os parâmetros do método
+            versao = indice_para_metodo(obter_clima_index(), metodo_gdu).versao
+            chaves[posicao] = cache.chave(hash_upload, col_plantio, col_sfwd, col_pfwd, versao, formato_saida,
+                                          estacao, gdu_alvo, cenarios, resumo)
+            contadores = cache.obter(chaves[posicao], output_path, extensao=f'.{formato_saida}')
+            if contadores is not None:
+                print(f"Resultado de {original_filename} reaproveitado do cache.")
+                ARQUIVOS.inc(resultado='cache')
+                resultados[posicao] = (contadores, round(time.perf_counter() - inicio, 3))
+                continue
+        
+        tarefas.append((posicao, (filepath, original_filename, output_path, col_plantio, col_sfwd, col_pfwd,
+                                  formato_saida, metodo_gdu, col_estacao, coordenadas, gdu_alvo, cenarios,
+                                  resumo)))
+    
+    acompanhamento = None
+    if progresso is not None:
+        acompanhamento = Progresso(progresso, [tarefa[0] for _, tarefa in tarefas], len(arquivos),
+                                   len(arquivos) - len(tarefas))
+    for indice, resultado in executar_tarefas([tarefa for _, tarefa in tarefas], processos, {'job': job_id},
+                                              acompanhamento):
+        resultados[tarefas[indice][0]] = resultado
+    
+    # Guarda no cache os resultados recém-calculados
+    if cache is not None:
+        for posicao, tarefa in tarefas:
+            contadores, _ = resultados[posicao]
+            if chaves[posicao] is not None and contadores is not None:
+                cache.guardar(chaves[posicao], tarefa[2], contadores, extensao=f'.{formato_saida}')
+    
+    # Agrega os contadores na ordem original dos arquivos
+    for (_, original_filename, _), (contadores, duracao) in zip(arquivos, resultados):
+        tempos[original_filename] = duracao
+        if contadores is None:
+            continue
+        if contadores.get('falhas_datas'):
+            falhas_datas[original_filename] = contadores['falhas_datas']
+        if contadores.get('estacoes_desconhecidas'):
+            estacoes_desconhecidas[original_filename] = contadores['estacoes_desconhecidas']
+        if contadores.get('coordenadas_invalidas'):
+            coordenadas_invalidas[original_filename] = contadores['coordenadas_invalidas']
+        if contadores.get('alvo_nao_atingido'):
+            alvo_nao_atingido[original_filename] = contadores['alvo_nao_atingido']
+        
+        total_erros += contadores['erros']
+        total_linhas_validas += contadores['linhas_validas']
+        total_gdu_alto += contadores['gdu_alto']
+        processed_filenames.append(nome_saida(original_filename, formato_saida))
+    
+    # Determina a mensagem de status para todos os arquivos processados
+    num_files = len(processed_filenames)
+    print(f"Total de arquivos processados: {num_files}")
+    print(f"Lista de arquivos: {processed_filenames}")
+    status_message, status_type = montar_mensagem_status(num_files, total_erros, total_linhas_validas, total_gdu_alto)
+    
+    # Limpeza imediata dos arquivos de upload (não são mais necessários)
+    rastreio = Rastreio(job=job_id)
+    with rastreio.fase('limpeza'):
+        for filepath, _, _ in arquivos:
+            try:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                    print(f"Arquivo de upload removido: {filepath}")
+            except Exception as e:
+                print(f"Erro ao remover arquivo de upload {filepath}: {e}")
+    rastreio.registrar()
+    
+    return {
+        'status_message': status_message,
+        'status_type': status_type,
+        'filenames': processed_filenames,
+        'tempos': tempos,
+        'falhas_datas': falhas_datas,
+        'estacoes_desconhecidas': estacoes_desconhecidas,
+        'coordenadas_invalidas': coordenadas_invalidas,
+        'alvo_nao_atingido': alvo_nao_atingido,
+    }
@@ -0,0 +1,137 @@
+"""
+Progresso de um lote em processamento, publicado como eventos para o navegador (SSE).
+
+Cada evento traz o arquivo atual e seu índice no lote, a fase, as linhas já concluídas e a
+estimativa de tempo restante. A publicação é barata: um relógio e um dicionário pequeno,
+com no máximo um evento a cada GDU_PROGRESSO_INTERVALO segundos (o fim de cada arquivo é
+sempre publicado). Um evento segurado pelo intervalo é publicado por um timer ao fim dele,
+para uma fase longa logo depois de outra curta não ficar escondida. Quem recebe os eventos
+(FilaJobs.publicar_progresso) só guarda o último.
+"""
+import os
+import threading
+import time
+
+# Intervalo mínimo entre dois eventos publicados (segundos)
+INTERVALO_PROGRESSO = float(os.environ.get('GDU_PROGRESSO_INTERVALO', 0.5))
+
+# Peso da medida mais recente na média móvel de segundos por byte enviado (usada no ETA do primeiro arquivo)
+PESO_MEDIA_VELOCIDADE = 0.3
+
+# Segundos por byte de upload dos últimos arquivos processados neste processo
+_segundos_por_byte = None
+
+def _tamanho(caminho):
+    try:
+        return os.path.getsize(caminho)
+    except OSError:
+        return 0
+
+class Progresso:
+    """
+    Acompanha os arquivos de um lote e publica eventos por publicar(evento).
+    caminhos são os arquivos a processar; concluidos conta os já resolvidos (ex.: pelo cache)
+    entre os total_arquivos do lote.
+    """
+
+    def __init__(self, publicar, caminhos, total_arquivos=None, concluidos=0, intervalo=INTERVALO_PROGRESSO):
+        self._publicar = publicar
+        self.intervalo = intervalo
+        self.tamanhos = [_tamanho(caminho) for caminho in caminhos]
+        self.bytes_concluidos = 0
+        self.inicio = time.perf_counter()
+        self._inicio_arquivo = None
+        self._ultimo = None
+        self._timer = None
+        # O timer publica de outra thread: o evento só é alterado e copiado com o lock
+        self._lock = threading.Lock()
+        # A publicação (que pode gravar em disco) é feita fora do _lock, com um lock só dela;
+        # cada cópia leva um número de sequência e uma cópia mais velha que a última publicada é descartada
+        self._lock_publicacao = threading.Lock()
+        self._sequencia = 0
+        self._publicada = 0
+        self.evento = {
+            'fase': None,
+            'arquivo': None,
+            'arquivo_indice': None,
+            'arquivos': total_arquivos if total_arquivos is not None else len(caminhos),
+            'arquivos_concluidos': concluidos,
+            'linhas': 0,
+            'linhas_arquivo': None,
+            'eta_s': None,
+        }
+
+    def _eta(self):
+        """Segundos restantes pela velocidade deste lote (ou dos últimos arquivos, antes do primeiro terminar)"""
+        restantes = sum(self.tamanhos) - self.bytes_concluidos
+        if self.bytes_concluidos:
+            segundos_por_byte = (time.perf_counter() - self.inicio) / self.bytes_concluidos
+        elif _segundos_por_byte is not None:
+            segundos_por_byte = _segundos_por_byte
+        else:
+            return None
+        decorrido = 0.0 if self._inicio_arquivo is None else time.perf_counter() - self._inicio_arquivo
+        return round(max(restantes * segundos_por_byte - decorrido, 0.0), 1)
+
+    def _emitir(self, forcar=False):
+        with self._lock:
+            agora = time.perf_counter()
+            if not forcar and self._ultimo is not None and agora - self._ultimo < self.intervalo:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.intervalo - (agora - self._ultimo), self._emitir_pendente)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            self._ultimo = agora
+            self.evento['eta_s'] = self._eta()
+            self._sequencia += 1
+            sequencia, evento = self._sequencia, dict(self.evento)
+        with self._lock_publicacao:
+            # O timer não troca a ordem de dois eventos: um evento atrasado não sobrescreve um mais novo
+            if sequencia < self._publicada:
+                return
+            self._publicada = sequencia
+            try:
+                self._publicar(evento)
+            except Exception as e:
+                # O progresso é informativo: uma falha ao publicar não interrompe o processamento
+                print(f"Erro ao publicar progresso: {e}")
+
+    def _emitir_pendente(self):
+        with self._lock:
+            self._timer = None
+        self._emitir(forcar=True)
+
+    def iniciar_arquivo(self, indice, nome):
+        """Arquivo indice (da lista de caminhos) começou a ser processado neste processo"""
+        with self._lock:
+            self._inicio_arquivo = time.perf_counter()
+            self.evento.update(arquivo=nome, arquivo_indice=self.evento['arquivos_concluidos'] + 1,
+                               fase='leitura', linhas_arquivo=None)
+        self._emitir()
+
+    def fase(self, nome, linhas=None):
+        """Observador das fases de metricas.Rastreio"""
+        with self._lock:
+            self.evento['fase'] = nome
+            if linhas is not None:
+                self.evento['linhas_arquivo'] = linhas
+        self._emitir()
+
+    def concluir_arquivo(self, indice, nome, linhas=0, duracao=None):
+        """Arquivo indice terminou (com linhas calculadas); sempre publicado"""
+        global _segundos_por_byte
+        tamanho = self.tamanhos[indice]
+        if duracao and tamanho:
+            velocidade = duracao / tamanho
+            _segundos_por_byte = velocidade if _segundos_por_byte is None else (
+                PESO_MEDIA_VELOCIDADE * velocidade + (1 - PESO_MEDIA_VELOCIDADE) * _segundos_por_byte
+            )
+        with self._lock:
+            self.bytes_concluidos += tamanho
+            self._inicio_arquivo = None
+            self.evento['arquivos_concluidos'] += 1
+            self.evento['linhas'] += linhas
+            self.evento.update(arquivo=nome, arquivo_indice=self.evento['arquivos_concluidos'], fase='concluido',
+                               linhas_arquivo=linhas or None)
+        self._emitir(forcar=True)
@@ -0,0 +1,115 @@
+"""
+Resumo do GDU por grupo de linhas (ex.: por híbrido ou por local), gravado na planilha
+'Resumo' ao lado da planilha 'GDU' do resultado xlsx.
+
+Cada grupo traz o número de linhas, as linhas válidas, o GDU médio até SFWD (espigamento) e
+até PFWD (pendoamento), o intervalo entre pendoamento e espigamento em GDU (ASI: GDU até SFWD
+menos GDU até PFWD, na média das linhas com as duas datas) e as linhas acima de 1200 GDU
+(contadas como o gdu_alto do arquivo: SFWD e PFWD separadamente).
+
+As colunas de grupo são fatoradas como os nomes de estação (pd.factorize: cada valor distinto
+vira um código inteiro) e todas as somas e contagens saem de uma única agregação agrupada por
+esse código. No modo streaming, as somas de cada bloco são combinadas no fim.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+# Limite de GDU contado em gdu_alto (o mesmo dos contadores do arquivo)
+LIMITE_GDU_ALTO = 1200
+
+# Somas e contagens parciais de cada grupo; as médias só são calculadas no fim
+_PARCIAIS = ['linhas', 'linhas_sfwd', 'soma_sfwd', 'linhas_pfwd', 'soma_pfwd', 'linhas_asi', 'soma_asi', 'gdu_alto']
+
+def ler_colunas_grupo(texto):
+    """
+    Colunas de agrupamento de um texto como "Híbrido, Local" (separadas por vírgula ou
+    ponto e vírgula; os nomes podem ter espaços). Retorna None para texto vazio.
+    """
+    colunas = [parte.strip() for parte in re.split(r'[,;]', texto or '') if parte.strip()]
+    if len(set(colunas)) != len(colunas):
+        raise ValueError(f"Coluna de agrupamento repetida em '{texto}'")
+    return colunas or None
+
+def _codigos_grupo(chaves):
+    """Código do grupo de cada linha (ordem de primeira aparição) a partir das colunas de chave"""
+    codigos = None
+    for valores in chaves:
+        codigos_coluna, distintos = pd.factorize(pd.Series(valores, dtype=object), use_na_sentinel=False)
+        if codigos is None:
+            codigos = codigos_coluna
+        else:
+            # Refatorar a combinação mantém os códigos menores que o número de linhas
+            codigos, _ = pd.factorize(codigos * len(distintos) + codigos_coluna)
+    return codigos
+
+def _inserir_chaves(somas, colunas, chaves, codigos):
+    """Coloca à frente das somas os valores das chaves, tirados da primeira linha de cada grupo"""
+    primeiras = np.unique(codigos, return_index=True)[1]
+    for posicao, (col, valores) in enumerate(zip(colunas, chaves)):
+        somas.insert(posicao, col, valores.iloc[primeiras].to_numpy())
+    return somas
+
+class ResumoGrupos:
+    """Acumula as somas por grupo das colunas de GDU de um arquivo (inteiro ou bloco a bloco)"""
+
+    def __init__(self, colunas, incluir_pfwd=True):
+        self.colunas = list(colunas)
+        self.incluir_pfwd = incluir_pfwd
+        self._parciais = []
+
+    def somar(self, tabela, colunas_gdu):
+        """Soma os grupos das linhas da tabela (leitura.Tabela) com as colunas calculadas para ela"""
+        linhas = len(tabela)
+        if not linhas:
+            return
+        chaves = [pd.Series(tabela.valores(col), dtype=object).reset_index(drop=True) for col in self.colunas]
+        codigos = _codigos_grupo(chaves)
+
+        # Um bloco que falhou no cálculo não tem colunas de GDU: as linhas contam, as médias não
+        vazio = np.full(linhas, np.nan)
+        gdu_sfwd = np.asarray(colunas_gdu.get('gdu_acumulado', vazio), dtype=np.float64)
+        gdu_pfwd = np.asarray(colunas_gdu.get('gdu_acumulado_pfwd', vazio), dtype=np.float64)
+        medidas = pd.DataFrame({
+            'sfwd': gdu_sfwd,
+            'pfwd': gdu_pfwd,
+            'asi': gdu_sfwd - gdu_pfwd,
+            'alto': (gdu_sfwd > LIMITE_GDU_ALTO).astype(np.int64) + (gdu_pfwd > LIMITE_GDU_ALTO),
+        })
+        # Uma única passada agrupada: os códigos já estão em ordem de primeira aparição
+        parcial = medidas.groupby(codigos, sort=True).agg(
+            linhas=('sfwd', 'size'),
+            linhas_sfwd=('sfwd', 'count'), soma_sfwd=('sfwd', 'sum'),
+            linhas_pfwd=('pfwd', 'count'), soma_pfwd=('pfwd', 'sum'),
+            linhas_asi=('asi', 'count'), soma_asi=('asi', 'sum'),
+            gdu_alto=('alto', 'sum'),
+        ).reset_index(drop=True)
+        self._parciais.append(_inserir_chaves(parcial, self.colunas, chaves, codigos))
+
+    def tabela(self):
+        """DataFrame do resumo: as colunas de grupo seguidas das contagens e médias de cada grupo"""
+        if not self._parciais:
+            return pd.DataFrame(columns=self.colunas + ['linhas', 'linhas_validas', 'gdu_medio_sfwd'])
+        if len(self._parciais) == 1:
+            somas = self._parciais[0]
+        else:
+            # Os grupos dos blocos são combinados pelos mesmos códigos (as chaves seguem como lidas)
+            parciais = pd.concat(self._parciais, ignore_index=True)
+            chaves = [parciais[col] for col in self.colunas]
+            codigos = _codigos_grupo(chaves)
+            somas = parciais[_PARCIAIS].groupby(codigos, sort=True).sum().reset_index(drop=True)
+            somas = _inserir_chaves(somas, self.colunas, chaves, codigos)
+
+        resumo = somas[self.colunas].copy()
+        resumo['linhas'] = somas['linhas'].astype(np.int64)
+        resumo['linhas_validas'] = somas['linhas_sfwd'].astype(np.int64)
+        medias = [('gdu_medio_sfwd', 'sfwd')]
+        if self.incluir_pfwd:
+            medias += [('gdu_medio_pfwd', 'pfwd'), ('asi_gdu_medio', 'asi')]
+        for nome, medida in medias:
+            contagem = somas[f'linhas_{medida}'].to_numpy(dtype=np.float64)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                resumo[nome] = np.round(somas[f'soma_{medida}'].to_numpy(dtype=np.float64) / contagem, 2)
+        resumo['gdu_alto'] = somas['gdu_alto'].astype(np.int64)
+        return resumo
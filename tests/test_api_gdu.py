@@ -0,0 +1,48 @@
+import json
+
+from api_gdu import _decodificar_bloco, iter_ndjson
+from clima_base import obter_clima_index
+
+def test_decodificar_bloco_linha_com_dois_valores():
+    linhas = ['{"plantio": "2025-01-01"}', '1, 2', '{"plantio": "2025-02-01"}']
+    registros = _decodificar_bloco(linhas)
+    assert registros == [{'plantio': '2025-01-01'}, None, {'plantio': '2025-02-01'}]
+
+def test_ndjson_resposta_alinhada_com_as_entradas():
+    linhas = [
+        '{"plantio": "2025-01-10", "sfwd": "2025-03-10"}',
+        '{"plantio": "2025-01-10", "sfwd": "2025-03-20"}, {"plantio": "2025-01-10", "sfwd": "2025-03-30"}',
+        '{"plantio": "2025-01-10", "sfwd": "2025-04-10"}',
+    ]
+    resposta = ''.join(iter_ndjson(obter_clima_index(), linhas)).splitlines()
+    assert len(resposta) == 3
+    registros = [json.loads(linha) for linha in resposta]
+    assert 'erro' in registros[1]
+    assert registros[0]['dias'] == 59
+    assert registros[2]['dias'] == 90
+
+def test_ndjson_estacao_aninhada_vira_erro_da_linha():
+    linhas = [
+        '{"plantio": "2025-01-10", "sfwd": "2025-03-10"}',
+        '{"plantio": "2025-01-10", "sfwd": "2025-03-10", "estacao": ["A"]}',
+    ]
+    registros = [json.loads(linha) for linha in ''.join(iter_ndjson(obter_clima_index(), linhas)).splitlines()]
+    assert registros[0]['dias'] == 59
+    assert 'erro' in registros[1]
+
+def test_ndjson_data_aninhada_vira_erro_da_linha():
+    linhas = [
+        '{"plantio": [1], "sfwd": "2025-03-10"}',
+        '{"plantio": "2025-01-10", "sfwd": {"dia": 10}}',
+        '[{"a": 1}]',
+        '{"plantio": "2025-01-10", "sfwd": "2025-03-10"}',
+    ]
+    registros = [json.loads(linha) for linha in ''.join(iter_ndjson(obter_clima_index(), linhas)).splitlines()]
+    assert len(registros) == 4
+    assert all('erro' in registro for registro in registros[:3])
+    assert registros[3]['dias'] == 59
+
+def test_decodificar_bloco_nao_troca_registros_de_linha():
+    # '1, 2' e um objeto partido em duas linhas somam três valores em três linhas
+    linhas = ['1, 2', '{"plantio": "2025-01-01"', '"sfwd": "2025-02-01"}']
+    assert _decodificar_bloco(linhas) == [None, None, None]
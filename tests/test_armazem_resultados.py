@@ -0,0 +1,68 @@
+import os
+import time
+
+import armazem_resultados
+from armazem_resultados import ArmazemResultados
+
+def _gravar(armazem, chave, tamanho, modificado):
+    pasta = armazem.pasta_job(chave)
+    with open(os.path.join(pasta, 'resultado.xlsx'), 'wb') as f:
+        f.write(b'x' * tamanho)
+    os.utime(pasta, (modificado, modificado))
+
+def _pastas(caminho):
+    return sorted(nome for nome in os.listdir(caminho) if os.path.isdir(os.path.join(caminho, nome)))
+
+def test_limite_de_disco_soma_as_pastas_de_todos_os_processos(tmp_path):
+    # Dois armazéns na mesma pasta fazem o papel de dois workers do gunicorn
+    worker_a = ArmazemResultados(str(tmp_path), ttl=3600, max_bytes=250)
+    worker_b = ArmazemResultados(str(tmp_path), ttl=3600, max_bytes=250)
+    agora = time.time()
+    chaves = [f'{i:032x}' for i in range(3)]
+
+    _gravar(worker_a, chaves[0], 100, agora)
+    worker_a.registrar(chaves[0], vence_em=agora + 3600 - 30)
+    _gravar(worker_b, chaves[1], 100, agora)
+    worker_b.registrar(chaves[1], vence_em=agora + 3600 - 20)
+    assert worker_b.estatisticas()['bytes'] == 200
+
+    _gravar(worker_b, chaves[2], 100, agora)
+    worker_b.registrar(chaves[2], vence_em=agora + 3600 - 10)
+    assert _pastas(tmp_path) == chaves[1:]
+    assert sorted(os.listdir(tmp_path)) == sorted(chaves[1:] + [c + '.tamanho' for c in chaves[1:]])
+    assert worker_b.estatisticas()['bytes'] == 200
+
+    # O outro worker só atualiza o índice no próximo registro
+    _gravar(worker_a, 'f' * 32, 10, agora)
+    worker_a.registrar('f' * 32)
+    assert worker_a.estatisticas()['bytes'] == 210
+
+def test_tamanho_medido_uma_vez_por_job(tmp_path, monkeypatch):
+    medidas = []
+    medir = armazem_resultados._tamanho_pasta
+    monkeypatch.setattr(armazem_resultados, '_tamanho_pasta', lambda caminho: medidas.append(caminho) or medir(caminho))
+    armazem = ArmazemResultados(str(tmp_path), ttl=3600, max_bytes=1000)
+    chaves = [f'{i:032x}' for i in range(3)]
+    for chave in chaves:
+        _gravar(armazem, chave, 100, time.time())
+        armazem.registrar(chave)
+        armazem.estatisticas()
+    assert medidas == [os.path.join(str(tmp_path), chave) for chave in chaves]
+    assert armazem.estatisticas()['bytes'] == 300
+
+    # Na reinicialização, os tamanhos já gravados são reaproveitados e o que sumiu sai do índice
+    armazem._remover(chaves[0])
+    reiniciado = ArmazemResultados(str(tmp_path), ttl=3600, max_bytes=1000)
+    reiniciado.varrer_inicial()
+    assert len(medidas) == 3
+    assert reiniciado.estatisticas()['bytes'] == 200
+
+def test_varredura_e_registro_nao_iniciam_a_thread(tmp_path):
+    armazem = ArmazemResultados(str(tmp_path), ttl=3600)
+    chave = 'a' * 32
+    _gravar(armazem, chave, 10, time.time())
+    armazem.varrer_inicial()
+    armazem.registrar(chave)
+    assert armazem._thread is None
+    armazem.iniciar()
+    assert armazem._thread.is_alive()
@@ -0,0 +1,56 @@
+import hashlib
+import io
+import os
+
+from werkzeug.datastructures import FileStorage
+
+from cache_resultados import CacheResultados, salvar_com_hash
+
+COLUNAS = ('Data de Plantio', '05. SFWD', '06. PFWD', 'v1')
+
+def test_hash_do_upload_e_calculado_durante_a_gravacao(tmp_path, monkeypatch):
+    # Blocos pequenos: o hash de vários blocos é o mesmo dos bytes inteiros
+    monkeypatch.setattr('cache_resultados.TAMANHO_BLOCO', 7)
+    conteudo = b'planilha de ensaio ' * 10
+    destino = tmp_path / 'upload.xlsx'
+    hash_upload = salvar_com_hash(FileStorage(io.BytesIO(conteudo), 'upload.xlsx'), str(destino))
+    assert hash_upload == hashlib.sha256(conteudo).hexdigest()
+    assert destino.read_bytes() == conteudo
+
+def test_chave_muda_com_cada_opcao_do_calculo():
+    base = CacheResultados.chave('h', *COLUNAS)
+    # Sem opções, a chave é a do formato antigo (entradas já gravadas continuam valendo)
+    assert base == hashlib.sha256('\x00'.join(('h',) + COLUNAS + ('xlsx',)).encode('utf-8')).hexdigest()
+    variantes = [
+        CacheResultados.chave('outro', *COLUNAS),
+        CacheResultados.chave('h', 'Plantio', '05. SFWD', '06. PFWD', 'v1'),
+        CacheResultados.chave('h', 'Data de Plantio', '05. SFWD', '06. PFWD', 'v2'),
+        CacheResultados.chave('h', *COLUNAS, formato_saida='csv'),
+        CacheResultados.chave('h', *COLUNAS, estacao='Estação'),
+        CacheResultados.chave('h', *COLUNAS, gdu_alvo='1200'),
+        CacheResultados.chave('h', *COLUNAS, cenarios=('media', 'resumo')),
+        CacheResultados.chave('h', *COLUNAS, resumo=['Híbrido']),
+        CacheResultados.chave('h', *COLUNAS, resumo=['Híbrido', 'Local']),
+    ]
+    assert len({base, *variantes}) == len(variantes) + 1
+
+def test_guardar_obter_e_limite_lru(tmp_path):
+    cache = CacheResultados(str(tmp_path / 'cache'), max_bytes=250)
+    resultado = tmp_path / 'resultado.xlsx'
+    resultado.write_bytes(b'x' * 100)
+    chaves = [CacheResultados.chave(f'h{i}', *COLUNAS) for i in range(3)]
+
+    assert cache.obter(chaves[0], str(tmp_path / 'copia.xlsx')) is None
+    cache.guardar(chaves[0], str(resultado), {'erros': 1})
+    assert cache.obter(chaves[0], str(tmp_path / 'copia.xlsx')) == {'erros': 1}
+    assert (tmp_path / 'copia.xlsx').read_bytes() == b'x' * 100
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A entrada usada há mais tempo sai primeiro
+    cache.guardar(chaves[1], str(resultado), {'erros': 0})
+    os.utime(os.path.join(cache.pasta, chaves[0] + '.xlsx'), (1, 1))
+    os.utime(os.path.join(cache.pasta, chaves[0] + '.json'), (1, 1))
+    cache.guardar(chaves[2], str(resultado), {'erros': 0})
+    assert cache.obter(chaves[0], str(tmp_path / 'copia.xlsx')) is None
+    assert cache.obter(chaves[1], str(tmp_path / 'copia.xlsx')) == {'erros': 0}
+    assert cache.obter(chaves[2], str(tmp_path / 'copia.xlsx')) == {'erros': 0}
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cenarios import calcular_cenarios, colunas_cenarios, ler_cenarios, matriz_cenarios
+from clima_base import obter_clima_index
+
+def _datas():
+    gerador = np.random.default_rng(1)
+    inicios = pd.Series(pd.Timestamp('2024-12-20') + pd.to_timedelta(gerador.integers(0, 150, 200), unit='D'))
+    fins = inicios + pd.to_timedelta(gerador.integers(0, 90, 200), unit='D')
+    inicios[::40] = pd.NaT
+    return inicios, fins
+
+def test_blocos_de_cenarios_dao_o_mesmo_resultado():
+    clima_index = obter_clima_index()
+    inicios, fins = _datas()
+    series = matriz_cenarios(clima_index, ler_cenarios('+0, +1, -0.5, 2025, +2C'), 'milho_10_30')
+    _, inteira, validas = clima_index.calcular_cenarios(inicios, fins, series)
+    # Um cenário por bloco (orçamento de 1 byte) e blocos de dois cenários
+    for max_bytes in (1, 2 * 8 * (2 * (len(clima_index) + 1) + 2 * len(inicios))):
+        _, blocos, _ = clima_index.calcular_cenarios(inicios, fins, series, max_bytes=max_bytes)
+        np.testing.assert_array_equal(blocos, inteira)
+    assert np.isnan(inteira[~validas]).all()
+
+def test_cenarios_neutros_repetem_o_gdu_da_base():
+    clima_index = obter_clima_index()
+    inicios, fins = _datas()
+    _, gdu, _ = clima_index.calcular(inicios, fins)
+    matriz = calcular_cenarios(clima_index, inicios, fins, ler_cenarios('+0 ano:2025'))
+    # Deslocamento zero é a própria base; o ano da base só difere nos dias que ele não tem
+    np.testing.assert_array_equal(matriz[:, 0], gdu)
+    em_2025 = (inicios.dt.year == 2025).to_numpy() & (fins.dt.year == 2025).to_numpy()
+    np.testing.assert_array_equal(matriz[em_2025, 1], gdu[em_2025])
+    # Um grau a mais em todos os dias soma um GDU por dia do intervalo (dentro da base)
+    mais_um = calcular_cenarios(clima_index, inicios, fins, ler_cenarios('+1'))[:, 0]
+    na_base = ((inicios >= '2024-12-30') & (fins <= '2025-07-28')).to_numpy()
+    np.testing.assert_allclose(mais_um[na_base] - gdu[na_base],
+                               (fins - inicios).dt.days.to_numpy()[na_base] + 1, atol=0.02)
+
+def test_colunas_de_resumo_e_largas():
+    cenarios = ler_cenarios('+1; -1; 2024')
+    matriz = np.array([[10.0, 20.0, 30.0], [np.nan, np.nan, np.nan]])
+    resumo = colunas_cenarios(cenarios, matriz)
+    assert list(resumo) == ['gdu_cenarios_min', 'gdu_cenarios_media', 'gdu_cenarios_p10', 'gdu_cenarios_p50',
+                            'gdu_cenarios_p90', 'gdu_cenarios_max']
+    assert [resumo[nome][0] for nome in resumo] == [10.0, 20.0, 12.0, 20.0, 28.0, 30.0]
+    assert all(np.isnan(resumo[nome][1]) for nome in resumo)
+    assert list(colunas_cenarios(cenarios, matriz, 'largo')) == [
+        'gdu_cenario_+1C', 'gdu_cenario_-1C', 'gdu_cenario_ano_2024']
+    with pytest.raises(ValueError, match='inválido'):
+        ler_cenarios('+1, amanhã')
@@ -0,0 +1,49 @@
+import datetime
+
+from openpyxl import Workbook
+
+import chunk_processor
+from chunk_processor import process_excel_in_chunks
+
+def _planilha(caminho, linhas):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Híbrido', 'Data de Plantio', '05. SFWD', '06. PFWD'])
+    for linha in linhas:
+        sheet.append(list(linha))
+    workbook.save(caminho)
+
+def test_contadores_sao_por_linha(tmp_path):
+    entrada = tmp_path / 'entrada.xlsx'
+    plantio = datetime.datetime(2025, 1, 10)
+    sfwd = plantio + datetime.timedelta(days=60)
+    _planilha(entrada, [
+        ('H0', plantio, sfwd, sfwd),
+        ('H1', plantio, sfwd, None),      # sem PFWD: a linha continua válida
+        ('H2', plantio, 'sem data', sfwd),  # sem SFWD: a linha é um erro
+    ])
+    resultado, erros, linhas_validas, _ = process_excel_in_chunks(str(entrada), chunk_size=2)
+    assert len(resultado) == 3
+    assert (erros, linhas_validas) == (1, 2)
+
+def test_bloco_com_falha_sai_vazio_e_conta_como_erro(tmp_path, monkeypatch):
+    entrada = tmp_path / 'entrada.xlsx'
+    plantio = datetime.datetime(2025, 1, 10)
+    sfwd = plantio + datetime.timedelta(days=60)
+    _planilha(entrada, [(f'H{i}', plantio, sfwd, sfwd) for i in range(5)])
+    calcular = chunk_processor.calcular_gdu_colunas
+    chamadas = []
+
+    def falhar_no_primeiro(*args, **kwargs):
+        chamadas.append(1)
+        if len(chamadas) == 1:
+            raise RuntimeError('falha simulada')
+        return calcular(*args, **kwargs)
+
+    monkeypatch.setattr(chunk_processor, 'calcular_gdu_colunas', falhar_no_primeiro)
+    resultado, erros, linhas_validas, _ = process_excel_in_chunks(str(entrada), chunk_size=2)
+    assert len(resultado) == 5
+    assert (erros, linhas_validas) == (2, 3)
+    assert resultado['gdu_acumulado'][:2].isna().all()
+    assert resultado['gdu_acumulado_pfwd'][:2].isna().all()
+    assert resultado['dias'][2:].tolist() == [60] * 3
@@ -0,0 +1,49 @@
+import datetime
+import json
+import os
+
+from openpyxl import Workbook
+
+import cli
+
+def _planilha(caminho, linhas):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Híbrido', 'Data de Plantio', '05. SFWD'])
+    plantio = datetime.datetime(2025, 1, 10)
+    for i in range(linhas):
+        sheet.append([f'H{i}', plantio, plantio + datetime.timedelta(days=60 + i)])
+    workbook.save(caminho)
+
+def _estados(saida):
+    with open(os.path.join(saida, cli.RESUMO_PADRAO), encoding='utf-8') as f:
+        return {os.path.basename(registro['entrada']): registro['estado'] for registro in json.load(f)['arquivos']}
+
+def test_manifesto_pula_arquivos_com_resultado_atualizado(tmp_path):
+    entradas, saida = tmp_path / 'ensaios', str(tmp_path / 'resultados')
+    entradas.mkdir()
+    _planilha(entradas / 'a.xlsx', 3)
+    _planilha(entradas / 'b.xlsx', 4)
+
+    assert cli.main([str(entradas), '-o', saida]) == 0
+    assert _estados(saida) == {'a.xlsx': 'processado', 'b.xlsx': 'processado'}
+
+    # Nada mudou: os dois são pulados, com os contadores da execução anterior
+    assert cli.main([str(entradas), '-o', saida]) == 0
+    assert _estados(saida) == {'a.xlsx': 'atualizado', 'b.xlsx': 'atualizado'}
+    with open(os.path.join(saida, cli.RESUMO_PADRAO), encoding='utf-8') as f:
+        assert json.load(f)['totais']['linhas_validas'] == 7
+
+    # Uma entrada alterada é reprocessada; a outra continua pulada
+    _planilha(entradas / 'b.xlsx', 5)
+    assert cli.main([str(entradas), '-o', saida]) == 0
+    assert _estados(saida) == {'a.xlsx': 'atualizado', 'b.xlsx': 'processado'}
+
+    # Outro parâmetro de cálculo, um resultado apagado ou --forcar também reprocessam
+    assert cli.main([str(entradas), '-o', saida, '--metodo', 'milho_10_30']) == 0
+    assert _estados(saida) == {'a.xlsx': 'processado', 'b.xlsx': 'processado'}
+    os.remove(os.path.join(saida, 'a.xlsx'))
+    assert cli.main([str(entradas), '-o', saida, '--metodo', 'milho_10_30']) == 0
+    assert _estados(saida) == {'a.xlsx': 'processado', 'b.xlsx': 'atualizado'}
+    assert cli.main([str(entradas), '-o', saida, '--metodo', 'milho_10_30', '--forcar']) == 0
+    assert _estados(saida) == {'a.xlsx': 'processado', 'b.xlsx': 'processado'}
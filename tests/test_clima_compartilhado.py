@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_importar_main_nao_constroi_o_indice_antes_de_publicar():
+    # Com o gunicorn --preload, o main é importado antes de on_starting publicar o índice:
+    # depois da publicação, só deve existir o índice da memória compartilhada
+    codigo = (
+        "import clima_base, main\n"
+        "assert clima_base._clima_index is None\n"
+        "clima_base.publicar_clima_compartilhado()\n"
+        "index = clima_base.obter_clima_index()\n"
+        "assert clima_base._clima_shm is not None\n"
+        "assert index is clima_base._clima_index\n"
+        "assert main.app.test_client().get('/estacoes').status_code == 200\n"
+        "assert clima_base.obter_clima_index() is index\n"
+    )
+    ambiente = {chave: valor for chave, valor in os.environ.items() if chave != 'CLIMA_SHM'}
+    resultado = subprocess.run([sys.executable, '-c', codigo], cwd=RAIZ, env=ambiente,
+                               capture_output=True, text=True, timeout=120)
+    assert resultado.returncode == 0, resultado.stderr
@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from openpyxl.utils.datetime import from_excel
+
+from datas import normalizar_datas
+
+@pytest.mark.parametrize('serial', [1, 2, 59, 59.5, 60, 61, 45667, 45667.25])
+def test_serial_excel_como_o_openpyxl(serial):
+    # O mesmo número gravado como número ou como texto (CSV) vira a data da célula do xlsx
+    for valor in (serial, str(serial)):
+        datas = normalizar_datas([valor], 'plantio').datas
+        assert datas[0] == np.datetime64(from_excel(serial), 'ns')
+
+def test_serial_em_texto_nao_entra_nos_formatos_lembrados():
+    # Uma coluna de seriais em texto lida duas vezes (dois arquivos ou dois blocos)
+    primeira = normalizar_datas(['45667'], 'serial_texto')
+    segunda = normalizar_datas(['45668', '10/01/2025'], 'serial_texto')
+    assert primeira.formatos == ['serial_excel']
+    assert list(segunda.datas.astype('datetime64[D]').astype(str)) == ['2025-01-11', '2025-01-10']
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+import espacial
+from espacial import IndiceEspacial, pesos_idw
+from gdu_engine import ClimaIndex
+
+def _haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * espacial.RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+
+def test_vizinhos_iguais_a_busca_exaustiva(monkeypatch):
+    gerador = np.random.default_rng(2)
+    estacoes_lat, estacoes_lon = gerador.uniform(-30, -10, 40), gerador.uniform(-60, -40, 40)
+    indice = IndiceEspacial(np.arange(40) + 100, estacoes_lat, estacoes_lon)
+    # Pontos repetidos (resolvidos uma vez) e inválidos
+    latitudes = np.concatenate((gerador.uniform(-30, -10, 50), [-20.0, -20.0, np.nan, -15.0]))
+    longitudes = np.concatenate((gerador.uniform(-60, -40, 50), [-50.0, -50.0, -50.0, np.nan]))
+    # Blocos pequenos: várias fatias da matriz de similaridade
+    monkeypatch.setattr(espacial, 'ELEMENTOS_POR_BLOCO', 100)
+
+    codigos, distancias = indice.vizinhos(latitudes, longitudes, k=3)
+    for i in range(52):
+        esperadas = _haversine(latitudes[i], longitudes[i], estacoes_lat, estacoes_lon)
+        ordem = np.argsort(esperadas)[:3]
+        assert codigos[i].tolist() == (ordem + 100).tolist()
+        np.testing.assert_allclose(distancias[i], esperadas[ordem], rtol=1e-6)
+    assert (codigos[52:] == -1).all() and np.isnan(distancias[52:]).all()
+
+    # k maior que o número de estações vira o total
+    assert indice.vizinhos([-20.0], [-50.0], k=100)[0].shape == (1, 40)
+
+def test_media_idw_das_estacoes_vizinhas():
+    # Duas estações com GDU diário constante: 10 e 20 por dia
+    datas = pd.date_range('2025-01-01', periods=30)
+    clima_df = pd.DataFrame({
+        'data': list(datas) * 2,
+        'gdu_diario': [10.0] * 30 + [20.0] * 30,
+        'estacao': ['Norte'] * 30 + ['Sul'] * 30,
+    })
+    clima_index = ClimaIndex.from_dataframe(clima_df)
+    indice = IndiceEspacial([0, 1], [-10.0, -12.0], [-50.0, -50.0])
+
+    # Um ponto a um quarto do caminho: pesos 1/d² dão 9 para 1 à estação Norte
+    codigos, distancias = indice.vizinhos([-10.5], [-50.0], k=2)
+    assert codigos.tolist() == [[0, 1]]
+    inicio, fim = pd.Series([datas[0]]), pd.Series([datas[9]])
+    _, gdu, _ = clima_index.calcular_ponderado(inicio, fim, codigos, pesos_idw(distancias))
+    np.testing.assert_allclose(gdu, [(9 * 100 + 1 * 200) / 10], atol=0.05)
+
+    # Sem uma das estações (código -1), a média usa só a outra
+    _, gdu, _ = clima_index.calcular_ponderado(inicio, fim, [[-1, 1]], pesos_idw(distancias))
+    assert gdu.tolist() == [200.0]
+    # Uma estação no mesmo ponto domina sem dividir por zero
+    assert np.isfinite(pesos_idw(np.array([0.0, 5.0]))).all()
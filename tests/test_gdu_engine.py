@@ -0,0 +1,45 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from clima_base import CLIMA_PATH, CLIMA_SHEET, obter_clima_index
+
+def _gdu_laco_original(clima_df, inicios, fins):
+    """Cálculo linha a linha da versão original: soma do GDU diário de cada dia entre as datas"""
+    gdu_por_dia = {}
+    for _, row in clima_df.iterrows():
+        gdu_por_dia[row['data'].date()] = ((row['temp_min'] + row['temp_max']) / 2) - 10
+
+    resultado = []
+    for data_inicio, data_fim in zip(inicios, fins):
+        if pd.isna(data_inicio) or pd.isna(data_fim):
+            resultado.append(float('nan'))
+            continue
+        data_atual, data_fim = data_inicio.date(), data_fim.date()
+        gdu_acumulado = 0
+        while data_atual <= data_fim:
+            gdu_acumulado += gdu_por_dia.get(data_atual, 0)
+            data_atual += datetime.timedelta(days=1)
+        resultado.append(round(gdu_acumulado, 2))
+    return np.array(resultado)
+
+def test_calcular_igual_ao_laco_original():
+    clima_df = pd.read_excel(CLIMA_PATH, sheet_name=CLIMA_SHEET, engine='openpyxl')
+    clima_df['data'] = pd.to_datetime(clima_df['data'], dayfirst=True)
+
+    # Plantios de antes da base até o fim dela, com ciclos de 0 a 200 dias e algumas datas vazias
+    gerador = np.random.default_rng(0)
+    primeiro, ultimo = clima_df['data'].min(), clima_df['data'].max()
+    dias_base = (ultimo - primeiro).days
+    inicios = pd.Series(primeiro + pd.to_timedelta(gerador.integers(-30, dias_base, 500), unit='D'))
+    fins = inicios + pd.to_timedelta(gerador.integers(0, 200, 500), unit='D')
+    inicios[::50] = pd.NaT
+    fins[7::50] = pd.NaT
+
+    dias, gdu, validas = obter_clima_index().calcular(inicios, fins)
+
+    esperado = _gdu_laco_original(clima_df, inicios, fins)
+    np.testing.assert_allclose(gdu, esperado, atol=1e-9, equal_nan=True)
+    assert np.array_equal(validas, ~np.isnan(esperado))
+    np.testing.assert_array_equal(dias[validas], (fins - inicios).dt.days.to_numpy()[validas])
@@ -0,0 +1,18 @@
+import numpy as np
+
+from leitura import colunas_booleanas, converter_booleanos
+
+def test_colunas_booleanas_pela_coluna_inteira():
+    linhas = [
+        ['true', 'true', np.nan, 'x', np.nan],
+        [np.nan, 'FALSE', 'False', 'true', np.nan],
+        ['false', 'talvez', 'TRUE', 'y', np.nan],
+    ]
+    # A coluna 1 começa booleana, mas o texto 'talvez' a mantém como texto; a 4 está vazia
+    assert colunas_booleanas(iter(linhas), 5) == [0, 2]
+
+    convertidas = converter_booleanos([list(linha) for linha in linhas], [0, 2])
+    assert [linha[0] for linha in convertidas][::2] == [True, False]
+    assert np.isnan(convertidas[1][0])
+    assert [linha[1] for linha in convertidas] == ['true', 'FALSE', 'talvez']
+    assert [linha[2] for linha in convertidas][1:] == [False, True]
@@ -0,0 +1,76 @@
+import pytest
+
+from main import app
+from metodos_gdu import _metodos
+
+@pytest.fixture
+def cliente():
+    return app.test_client()
+
+@pytest.mark.parametrize('rota, dados', [
+    ('/api/gdu', {'plantio': ['2025-01-10'], 'sfwd': ['2025-03-10']}),
+    ('/api/gdu/alvo', {'plantio': ['2025-01-10'], 'alvo': 1000}),
+])
+@pytest.mark.parametrize('metodo', [['padrao'], {'nome': 'padrao'}, 10])
+def test_metodo_invalido_retorna_400_com_os_metodos(cliente, rota, dados, metodo):
+    resposta = cliente.post(rota, json=dict(dados, metodo=metodo))
+    assert resposta.status_code == 400
+    assert all(nome in resposta.get_json()['erro'] for nome in _metodos)
+
+@pytest.mark.parametrize('rota, dados', [
+    ('/api/gdu', {'plantio': ['2025-01-10', '2025-01-10'], 'sfwd': ['2025-03-10', '2025-03-10']}),
+    ('/api/gdu/alvo', {'plantio': ['2025-01-10', '2025-01-10'], 'alvo': 1000}),
+])
+@pytest.mark.parametrize('estacao', [['A', ['B']], ['A', {'nome': 'B'}]])
+def test_estacao_aninhada_retorna_400(cliente, rota, dados, estacao):
+    resposta = cliente.post(rota, json=dict(dados, estacao=estacao))
+    assert resposta.status_code == 400
+    assert 'estacao' in resposta.get_json()['erro']
+
+def test_eventos_acima_do_limite_retornam_503(cliente, monkeypatch, tmp_path):
+    import main
+    from jobs import FilaJobs
+
+    fila = FilaJobs(str(tmp_path))
+    monkeypatch.setattr(main, 'fila_jobs', fila)
+    job = fila.criar([])
+    fila.cancelar(job, 'teste')
+
+    abertas = [cliente.get(f'/jobs/{job.id}/eventos') for _ in range(main.SSE_MAX_CONEXOES)]
+    assert all(resposta.status_code == 200 for resposta in abertas)
+    assert cliente.get(f'/jobs/{job.id}/eventos').status_code == 503
+
+    # Fechar uma conexão libera a vaga
+    abertas.pop().close()
+    resposta = cliente.get(f'/jobs/{job.id}/eventos')
+    assert resposta.status_code == 200
+    assert 'event: fim' in resposta.get_data(as_text=True)
+    for resposta in abertas + [resposta]:
+        resposta.close()
+
+@pytest.mark.parametrize('corpo', [
+    {'plantio': [['x']], 'sfwd': ['01/01/2025']},
+    {'plantio': ['01/01/2025'], 'sfwd': [{'a': 1}]},
+    {'plantio': ['01/01/2025'], 'sfwd': ['01/03/2025'], 'pfwd': [[1]]},
+    [{'a': 1}],
+])
+def test_datas_aninhadas_retornam_400(cliente, corpo):
+    resposta = cliente.post('/api/gdu', json=corpo)
+    assert resposta.status_code == 400
+    assert 'erro' in resposta.get_json()
+
+@pytest.mark.parametrize('corpo', [
+    {'plantio': [['x']], 'alvo': 1200},
+    {'plantio': [{'dia': 1}], 'alvo': 1200},
+    {'plantio': ['2025-01-10'], 'alvo': [True]},
+    {'plantio': ['2025-01-10'], 'alvo': True},
+])
+def test_alvo_com_plantio_aninhado_ou_booleano_retorna_400(cliente, corpo):
+    resposta = cliente.post('/api/gdu/alvo', json=corpo)
+    assert resposta.status_code == 400
+    assert 'erro' in resposta.get_json()
+
+def test_alvo_em_lista_com_numeros_e_vazios(cliente):
+    resposta = cliente.post('/api/gdu/alvo', json={'plantio': ['2025-01-10', '2025-01-10'], 'alvo': [500, None]})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['situacao'] == ['atingido', 'invalido']
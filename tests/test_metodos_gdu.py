@@ -0,0 +1,43 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import metodos_gdu
+from clima_base import obter_clima_index
+from metodos_gdu import MetodoGDU, carregar_metodos_json, indice_para_metodo, obter_metodo
+
+def test_regras_do_gdu_diario():
+    temp_min, temp_max = np.array([5.0, 8.0, 22.0, np.nan]), np.array([9.0, 20.0, 40.0, 25.0])
+    np.testing.assert_allclose(obter_metodo().gdu_diario(temp_min, temp_max), [-3.0, 4.0, 21.0, np.nan])
+    np.testing.assert_allclose(obter_metodo('base10_sem_negativos').gdu_diario(temp_min, temp_max),
+                               [0.0, 4.0, 21.0, np.nan])
+    # 10/30: mínima e máxima limitadas entre 10 e 30 antes da média
+    np.testing.assert_allclose(obter_metodo('milho_10_30').gdu_diario(temp_min, temp_max), [0.0, 5.0, 16.0, np.nan])
+
+def test_registro_por_json_e_nomes_invalidos(monkeypatch):
+    monkeypatch.setattr(metodos_gdu, '_metodos', OrderedDict(metodos_gdu._metodos))
+    carregar_metodos_json('{"sorgo": {"base": 8, "teto": 38, "limitar_base": true, "descricao": "Sorgo"}}')
+    sorgo = obter_metodo('sorgo')
+    assert sorgo.chave == (8.0, 38.0, True, False)
+    assert 'sorgo' in [metodo['nome'] for metodo in metodos_gdu.listar_metodos()]
+    assert obter_metodo('') is obter_metodo(None) is obter_metodo(metodos_gdu.METODO_PADRAO)
+
+    with pytest.raises(ValueError, match='teto'):
+        MetodoGDU('invertido', base=30, teto=10)
+    for nome in ('inexistente', ['padrao'], {'nome': 'padrao'}):
+        with pytest.raises(ValueError, match='desconhecido'):
+            obter_metodo(nome)
+
+def test_indices_derivados_ficam_em_cache(monkeypatch):
+    monkeypatch.setattr(metodos_gdu, '_cache_indices', OrderedDict())
+    monkeypatch.setattr(metodos_gdu, 'TAMANHO_CACHE_METODOS', 1)
+    clima_index = obter_clima_index()
+    # O método padrão é o próprio índice da base
+    assert indice_para_metodo(clima_index) is clima_index
+    milho = indice_para_metodo(clima_index, 'milho_10_30')
+    assert milho is not clima_index
+    assert indice_para_metodo(clima_index, 'milho_10_30') is milho
+    # Acima do limite, o índice usado há mais tempo sai do cache e é recalculado
+    indice_para_metodo(clima_index, 'base10_sem_negativos')
+    assert indice_para_metodo(clima_index, 'milho_10_30') is not milho
@@ -0,0 +1,50 @@
+from openpyxl import Workbook
+
+import planejamento
+from planejamento import planejar, sondar_dimensoes, tamanho_bloco
+
+def _planilha(caminho, linhas, colunas):
+    workbook = Workbook()
+    sheet = workbook.active
+    for i in range(linhas + 1):
+        sheet.append([f'c{i}_{j}' for j in range(colunas)])
+    workbook.save(caminho)
+
+def test_tamanho_bloco_pela_memoria_livre():
+    # 4 colunas de xlsx: 320 bytes por linha; um quarto de 100MB cabe em 81920 linhas
+    assert tamanho_bloco(4, 'xlsx', 100) == planejamento.BLOCO_MAXIMO
+    assert tamanho_bloco(4, 'xlsx', 10) == int(10 * 1024 * 1024 * planejamento.FRACAO_BLOCO / 320)
+    # Sem memória livre, o bloco não fica abaixo do mínimo; sem orçamento, usa o máximo
+    assert tamanho_bloco(4, 'xlsx', -50) == planejamento.BLOCO_MINIMO
+    assert tamanho_bloco(4, 'xlsx', None) == planejamento.BLOCO_MAXIMO
+
+def test_dimensoes_lidas_sem_ler_os_dados(tmp_path):
+    planilha = tmp_path / 'ensaio.xlsx'
+    _planilha(planilha, 30, 5)
+    assert sondar_dimensoes(str(planilha), 'xlsx') == (30, 5, 'dimensao')
+
+    csv = tmp_path / 'ensaio.csv'
+    csv.write_text('a;b;c\n' + '1;2;3\n' * 99, encoding='utf-8')
+    assert sondar_dimensoes(str(csv), 'csv') == (100, 3, 'dimensao')
+
+    # Sem dimensões legíveis, a estimativa vem do tamanho do arquivo
+    quebrado = tmp_path / 'quebrado.xlsx'
+    quebrado.write_bytes(b'x' * 3000)
+    assert sondar_dimensoes(str(quebrado), 'xlsx') == (50, planejamento.COLUNAS_ESTIMADAS, 'tamanho')
+
+def test_planejar_escolhe_memoria_ou_streaming(tmp_path, monkeypatch):
+    planilha = tmp_path / 'ensaio.xlsx'
+    _planilha(planilha, 1000, 10)
+    # 1000 x 10 células de xlsx: ~0,76MB estimados; o processo já usa 100MB
+    monkeypatch.setattr(planejamento, 'uso_memoria', lambda: (100.0, None))
+
+    plano = planejar(str(planilha), 'xlsx', orcamento_mb=200)
+    assert (plano.modo, plano.linhas, plano.colunas) == ('memoria', 1000, 10)
+    assert plano.disponivel_mb == 100.0
+
+    plano = planejar(str(planilha), 'xlsx', orcamento_mb=100.5)
+    assert plano.streaming
+    assert plano.tamanho_bloco == tamanho_bloco(10, 'xlsx', 0.5)
+
+    # Formato sem leitura em blocos: segue na memória mesmo acima do orçamento
+    assert planejar(str(planilha), 'xlsx', streaming_possivel=False, orcamento_mb=100.5).modo == 'memoria'
@@ -0,0 +1,130 @@
+import datetime
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import planejamento
+from clima_base import obter_clima_index
+from leitura import LeitorXlsx
+from metricas import Rastreio
+from processamento import (_calcular_colunas, _nomes_colunas_calculadas, _Ocorrencias, _processar_em_blocos,
+                           processar_arquivo)
+from resumo_grupos import ResumoGrupos
+
+def _planilha(caminho, linhas):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Híbrido', 'Data de Plantio', '05. SFWD', '06. PFWD'])
+    for i in range(linhas):
+        plantio = datetime.datetime(2025, 1, 10)
+        sheet.append([f'H{i % 3}', plantio, plantio + datetime.timedelta(days=60 + i),
+                      plantio + datetime.timedelta(days=55 + i)])
+    workbook.save(caminho)
+
+def test_bloco_com_falha_mantem_cabecalho_e_sai_vazio(tmp_path):
+    entrada, saida = tmp_path / 'entrada.xlsx', tmp_path / 'saida.xlsx'
+    _planilha(entrada, 10)
+    rastreio, ocorrencias = Rastreio(), _Ocorrencias()
+
+    def calcular(tabela, deslocamento=0):
+        # O primeiro bloco falha como em _calcular_colunas: sem colunas e todas as linhas com erro
+        if deslocamento == 0:
+            return {}, 0, len(tabela)
+        return _calcular_colunas(tabela, obter_clima_index(), 'Data de Plantio', '05. SFWD', '06. PFWD', True,
+                                 None, None, None, None, None, rastreio, ocorrencias, 'entrada.xlsx', deslocamento)
+
+    leitor = LeitorXlsx(str(entrada))
+    try:
+        erros, linhas_validas, gdu_alto = _processar_em_blocos(
+            leitor, 4, str(saida), calcular, rastreio, _nomes_colunas_calculadas(True, None, None),
+            ResumoGrupos(['Híbrido']))
+    finally:
+        leitor.fechar()
+
+    assert (erros, linhas_validas) == (4, 6)
+    assert isinstance(gdu_alto, int)
+    linhas = list(load_workbook(saida, read_only=True)['GDU'].iter_rows(values_only=True))
+    assert linhas[0][4:] == ('dias', 'gdu_acumulado', 'dias_pfwd', 'gdu_acumulado_pfwd')
+    assert all(linha[4:] == (None, None, None, None) for linha in linhas[1:5])
+    assert all(linha[4] == 60 + i for i, linha in enumerate(linhas[5:], start=4))
+    resumo = list(load_workbook(saida, read_only=True)['Resumo'].iter_rows(values_only=True))
+    assert [linha[1] for linha in resumo[1:]] == [4, 3, 3]
+
+def test_streaming_informa_as_linhas_acumuladas_ao_observador(tmp_path, monkeypatch):
+    entrada = tmp_path / 'entrada.xlsx'
+    _planilha(entrada, 10)
+    # Orçamento mínimo e blocos de 4 linhas forçam o modo streaming
+    monkeypatch.setattr(planejamento, 'ORCAMENTO_MEMORIA_MB', 1)
+    monkeypatch.setattr(planejamento, 'BLOCO_MINIMO', 4)
+    monkeypatch.setattr(planejamento, 'BLOCO_MAXIMO', 4)
+    eventos = []
+    rastreio = Rastreio(observador=lambda fase, linhas: eventos.append((fase, linhas)))
+
+    contadores = processar_arquivo(str(entrada), 'entrada.xlsx', str(tmp_path / 'saida.xlsx'), 'Data de Plantio',
+                                   '05. SFWD', '06. PFWD', rastreio=rastreio)
+
+    assert contadores['linhas_validas'] == 10
+    assert [linhas for fase, linhas in eventos if fase == 'gdu'] == [4, 8, 10]
+    assert [medida['linhas'] for medida in rastreio.fases if medida['fase'] == 'gdu'] == [4, 4, 2]
+
+def _planilha_booleana(caminho, linhas):
+    """Planilha com uma coluna inteiramente booleana e outra que só é booleana nas primeiras linhas"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['Híbrido', 'Conf', 'Marcado', 'Data de Plantio', '05. SFWD', '06. PFWD'])
+    for i in range(linhas):
+        plantio = datetime.datetime(2025, 1, 10)
+        sheet.append([f'H{i % 3}', 'true' if i % 2 else 'false', 'true' if i < 20 else 'sim', plantio,
+                      plantio + datetime.timedelta(days=60 + i), plantio + datetime.timedelta(days=55 + i)])
+    workbook.save(caminho)
+
+def _celulas(caminho):
+    workbook = load_workbook(caminho, read_only=True)
+    return {sheet.title: list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets}
+
+def _processar(entrada, saida, monkeypatch, bloco=None, **opcoes):
+    """Processa na memória (bloco=None) ou em streaming com blocos de bloco linhas"""
+    with monkeypatch.context() as contexto:
+        if bloco is not None:
+            contexto.setattr(planejamento, 'ORCAMENTO_MEMORIA_MB', 1)
+            contexto.setattr(planejamento, 'BLOCO_MINIMO', bloco)
+            contexto.setattr(planejamento, 'BLOCO_MAXIMO', bloco)
+        else:
+            contexto.setattr(planejamento, 'ORCAMENTO_MEMORIA_MB', None)
+        return processar_arquivo(str(entrada), 'entrada.xlsx', str(saida), 'Data de Plantio', '05. SFWD',
+                                 '06. PFWD', **opcoes)
+
+def test_streaming_decide_colunas_booleanas_pela_planilha_inteira(tmp_path, monkeypatch):
+    entrada = tmp_path / 'entrada.xlsx'
+    _planilha_booleana(entrada, 50)
+    memoria = _processar(entrada, tmp_path / 'memoria.xlsx', monkeypatch)
+    streaming = _processar(entrada, tmp_path / 'streaming.xlsx', monkeypatch, bloco=8)
+
+    assert memoria == streaming
+    celulas = _celulas(tmp_path / 'memoria.xlsx')
+    assert celulas == _celulas(tmp_path / 'streaming.xlsx')
+    assert {linha[1] for linha in celulas['GDU'][1:]} == {True, False}
+    assert celulas['GDU'][1][2] == 'true'
+
+@pytest.mark.parametrize('opcoes', [
+    {},
+    {'gdu_alvo': '900', 'resumo': ['Híbrido']},
+    {'cenarios': ('+1, -1, 2025', 'resumo')},
+    {'cenarios': ('+1, 2025', 'largo'), 'gdu_alvo': '1200', 'resumo': ['Híbrido', 'Conf']},
+])
+def test_streaming_e_memoria_dao_o_mesmo_resultado(tmp_path, monkeypatch, opcoes):
+    entrada = tmp_path / 'entrada.xlsx'
+    _planilha_booleana(entrada, 50)
+    # Datas em texto e células ilegíveis também passam pela mesma leitura nos dois caminhos
+    workbook = load_workbook(entrada)
+    sheet = workbook.active
+    sheet['D5'] = '10/01/2025'
+    sheet['E9'] = '2025-03-20'
+    sheet['E30'] = 'sem data'
+    workbook.save(entrada)
+
+    memoria = _processar(entrada, tmp_path / 'memoria.xlsx', monkeypatch, **opcoes)
+    streaming = _processar(entrada, tmp_path / 'streaming.xlsx', monkeypatch, bloco=7, **opcoes)
+
+    assert memoria == streaming
+    assert _celulas(tmp_path / 'memoria.xlsx') == _celulas(tmp_path / 'streaming.xlsx')
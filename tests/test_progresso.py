@@ -0,0 +1,24 @@
+from progresso import Progresso
+
+def test_publica_sem_segurar_o_lock_do_evento():
+    publicados = []
+
+    def publicar(evento):
+        # Quem publica (FilaJobs grava em disco) pode demorar: o estado do progresso fica livre
+        assert not progresso._lock.locked()
+        publicados.append(evento)
+
+    progresso = Progresso(publicar, [], total_arquivos=1, intervalo=0)
+    progresso.fase('leitura', 10)
+    progresso.fase('gdu')
+    assert [evento['fase'] for evento in publicados] == ['leitura', 'gdu']
+    assert publicados[0]['linhas_arquivo'] == 10
+
+def test_evento_atrasado_nao_sobrescreve_um_mais_novo():
+    publicados = []
+    progresso = Progresso(publicados.append, [], total_arquivos=1, intervalo=0)
+    progresso.fase('leitura')
+    # Outra thread já publicou uma cópia feita depois da próxima: a próxima chega atrasada e é descartada
+    progresso._publicada = progresso._sequencia + 2
+    progresso.fase('gdu')
+    assert [evento['fase'] for evento in publicados] == ['leitura']